@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# Benchmark gff_index.AnnotationIndex point and range queries against a
+# linear scan of the same records.
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+import gff
+import gff_index
+import bench_reader
+
+def linear_overlap(records, seqid, start, end):
+    return [rec for rec in records
+            if rec.seqid == seqid and rec.start <= end and rec.end >= start]
+
+def time_queries(query, regions):
+    start = time.time()
+    hits = 0
+    for seqid, region_start, region_end in regions:
+        hits += len(query(seqid, region_start, region_end))
+    return time.time() - start, hits
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare indexed and linear GFF region queries")
+    ap.add_argument('--lines', type=int, default=500000,
+                    help='Number of synthetic GTF lines (default: 500000)')
+    ap.add_argument('--gtf', help='Benchmark an existing GTF instead of a synthetic one')
+    ap.add_argument('--queries', type=int, default=10000,
+                    help='Number of indexed queries of each kind (default: 10000)')
+    ap.add_argument('--linear-queries', type=int, default=20,
+                    help='Number of linear-scan queries of each kind (default: 20)')
+    ap.add_argument('--span', type=int, default=100000,
+                    help='Length of range queries (default: 100000)')
+    args = ap.parse_args()
+
+    path = args.gtf
+    if not path:
+        fd, path = tempfile.mkstemp(suffix=".gtf")
+        os.close(fd)
+        print >>sys.stderr, "Writing synthetic GTF to %s..." % path
+        bench_reader.write_synthetic_gtf(path, args.lines)
+
+    try:
+        records = gff.ChunkedReader(open(path)).read_recs()
+    finally:
+        if not args.gtf:
+            os.remove(path)
+
+    start = time.time()
+    index = gff_index.AnnotationIndex(records)
+    print "Indexed %d records in %.2f seconds" % (len(index), time.time() - start)
+
+    rng = random.Random(0)
+    seqids = index.seqids()
+    max_end = max([rec.end for rec in records])
+    def regions(count, span):
+        result = []
+        for i in range(count):
+            region_start = rng.randint(1, max_end)
+            result.append((rng.choice(seqids), region_start, region_start + span))
+        return result
+
+    linear = lambda seqid, s, e: linear_overlap(records, seqid, s, e)
+    print "\t".join(["query", "method", "queries", "seconds", "queries/s", "hits"])
+    for name, span in (("point", 0), ("range", args.span)):
+        for method, query, count in (("index", index.overlap, args.queries),
+                                     ("linear", linear, args.linear_queries)):
+            elapsed, hits = time_queries(query, regions(count, span))
+            print "%s\t%s\t%d\t%.3f\t%.0f\t%d" % (name, method, count, elapsed,
+                                                  count / max(elapsed, 1e-9), hits)
+
+if __name__ == '__main__':
+    main()
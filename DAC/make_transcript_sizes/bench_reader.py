@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# Benchmark gff.Reader against gff.ChunkedReader on a synthetic GTF.
+#
+# Each reader runs in its own child process so that peak RSS can be
+# measured independently. Two workloads are timed: "sizes" mirrors
+# transcripts.py (read transcript_id of every exon and sum exon lengths)
+# and "retain" keeps every record in memory like Reader.read_recs().
+
+import os
+import sys
+import time
+import random
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from collections import defaultdict
+
+import gff
+
+READERS = {"Reader": gff.Reader, "ChunkedReader": gff.ChunkedReader}
+
+def write_synthetic_gtf(path, num_lines, seed=0):
+    """Writes a GENCODE-like GTF with about num_lines records to path."""
+    rng = random.Random(seed)
+    out = open(path, "w")
+    out.write("##description: synthetic benchmark annotation\n")
+    out.write("##provider: bench_reader.py\n")
+    written = 0
+    gene = 0
+    while written < num_lines:
+        gene += 1
+        chrom = "chr%d" % (gene % 22 + 1)
+        gene_start = rng.randint(1, 200000000)
+        gene_id = "ENSMUSG%011d.1" % gene
+        gene_attrs = 'gene_id "%s"; gene_type "protein_coding"; ' \
+            'gene_status "KNOWN"; gene_name "Gm%d"; level 2; ' \
+            'havana_gene "OTTMUSG%011d.1";' % (gene_id, gene, gene)
+        out.write("%s\tHAVANA\tgene\t%d\t%d\t.\t+\t.\t%s\n" %
+                  (chrom, gene_start, gene_start + 50000, gene_attrs))
+        written += 1
+        for transcript in range(rng.randint(1, 4)):
+            transcript_id = "ENSMUST%011d.%d" % (gene, transcript + 1)
+            attrs = '%s transcript_id "%s"; transcript_type "protein_coding"; ' \
+                'transcript_status "KNOWN"; transcript_name "Gm%d-%03d"; ' \
+                'tag "basic"; tag "CCDS";' % (gene_attrs, transcript_id, gene,
+                                              transcript + 1)
+            out.write("%s\tHAVANA\ttranscript\t%d\t%d\t.\t+\t.\t%s\n" %
+                      (chrom, gene_start, gene_start + 50000, attrs))
+            written += 1
+            start = gene_start
+            for exon in range(rng.randint(2, 12)):
+                end = start + rng.randint(50, 400)
+                out.write("%s\tHAVANA\texon\t%d\t%d\t.\t+\t.\t%s exon_number %d;\n"
+                          % (chrom, start, end, attrs, exon + 1))
+                written += 1
+                start = end + rng.randint(100, 3000)
+    out.close()
+    return written
+
+def _run_workload(reader_name, path, workload, results):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    reader = READERS[reader_name](open(path))
+    if workload == "retain":
+        records = reader.read_recs()
+        count = len(records)
+    else:
+        count = 0
+        transcript_lengths = defaultdict(int)
+        for record in reader:
+            count += 1
+            if record.type == "exon":
+                transcript_id = record.attributes["transcript_id"][0]
+                transcript_lengths[transcript_id] += record.end - record.start + 1
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((count, elapsed, peak - baseline))
+
+def run(reader_name, path, workload):
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process(target=_run_workload,
+                                    args=(reader_name, path, workload, results))
+    child.start()
+    count, elapsed, rss_kb = results.get()
+    child.join()
+    return count, elapsed, rss_kb
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare GFF reader throughput and peak RSS")
+    ap.add_argument('--lines', type=int, default=3000000,
+                    help='Number of synthetic GTF lines (default: 3000000)')
+    ap.add_argument('--gtf',
+                    help='Benchmark an existing GTF instead of a synthetic one')
+    ap.add_argument('--workload', choices=['sizes', 'retain', 'both'], default='both')
+    args = ap.parse_args()
+
+    path = args.gtf
+    if not path:
+        fd, path = tempfile.mkstemp(suffix=".gtf")
+        os.close(fd)
+        print >>sys.stderr, "Writing synthetic GTF to %s..." % path
+        write_synthetic_gtf(path, args.lines)
+
+    try:
+        workloads = ['sizes', 'retain'] if args.workload == 'both' else [args.workload]
+        print "\t".join(["workload", "reader", "records", "seconds",
+                         "records/s", "peak_rss_mb"])
+        for workload in workloads:
+            for reader_name in ("Reader", "ChunkedReader"):
+                count, elapsed, rss_kb = run(reader_name, path, workload)
+                print "%s\t%s\t%d\t%.2f\t%.0f\t%.1f" % (workload, reader_name,
+                                                        count, elapsed,
+                                                        count / elapsed,
+                                                        rss_kb / 1024.0)
+    finally:
+        if not args.gtf:
+            os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -26,11 +26,16 @@
 
 import sys
 import re
+import multiprocessing
+from cStringIO import StringIO
 from urllib import quote as url_quote, unquote as url_unquote
-from collections import defaultdict
+from array import array
+from collections import defaultdict, deque, MutableMapping
 
-__all__ = ["Record", "Reader", "Writer", "FormatError",
-           "Metadatum", "SequenceRegion"]
+__all__ = ["Record", "CompactRecord", "Reader", "ChunkedReader", "Writer",
+           "FormatError", "Metadatum", "SequenceRegion", "LazyAttributes",
+           "Categorical", "Columns", "load_columns", "BatchWriter",
+           "ParallelReader", "FastaIndex"]
 
 class Record:
     """A record from a GFF file.
@@ -117,6 +122,68 @@ class Record:
                              self.score, self.strand, self.phase, 
                              self.attributes)))
 
+class CompactRecord(object):
+    """A memory-lean GFF record produced by ChunkedReader.
+
+    Has the same fields and methods as Record, but uses __slots__ instead
+    of a per-instance __dict__ and keeps the raw attributes column until
+    the attributes field is first accessed.
+    """
+
+    __slots__ = ("seqid", "source", "type", "start", "end",
+                 "score", "strand", "phase",
+                 "_attributes", "_attributes_string", "_attributes_parser")
+
+    def __init__(self, seqid, source, type, start, end,
+                 score=None, strand=None, phase=None,
+                 attributes_string=None, attributes_parser=None):
+        self.seqid = seqid
+        self.source = source
+        self.type = type
+        self.start = start
+        self.end = end
+        self.score = score
+        self.strand = strand
+        self.phase = phase
+        self._attributes = None
+        self._attributes_string = attributes_string
+        self._attributes_parser = attributes_parser
+
+    def _get_attributes(self):
+        if self._attributes is None:
+            if self._attributes_string is not None:
+                self._attributes = \
+                    self._attributes_parser(self._attributes_string)
+            else:
+                self._attributes = {}
+            self._attributes_string = None
+        return self._attributes
+
+    def _set_attributes(self, attributes):
+        self._attributes = attributes or {}
+        self._attributes_string = None
+
+    attributes = property(_get_attributes, _set_attributes)
+
+    def copy(self):
+        """Returns a copy of this GFF record as a Record"""
+        return self.to_record().copy()
+
+    def to_record(self):
+        """Returns this record as a plain Record sharing its attributes"""
+        return Record(self.seqid,
+                      self.source,
+                      self.type,
+                      self.start,
+                      self.end,
+                      score=self.score,
+                      strand=self.strand,
+                      phase=self.phase,
+                      attributes=self.attributes)
+
+    is_valid = Record.is_valid.im_func
+    __repr__ = Record.__repr__.im_func
+
 class Metadatum:
     def __init__(self, name, value=None):
         self.name = name
@@ -150,15 +217,18 @@ class Reader:
         self._metadata = []
         self._comments = []
         self._sequence_regions = []
-        self._fasta_string = ""
+
+        # FASTA section (version 3 only). Sequences are not read with the
+        # records: the section's byte offset is recorded instead, or for
+        # streams that cannot seek, the text already read from it
+        self._in_fasta = False
+        self._fasta_offset = None
+        self._fasta_buffered = None
+        self._fasta_string = None
+        self._fasta_index = None
 
         # Create record parser table
-        self._record_parsers = {"1": self._parse_record_v1,
-                                "2": self._parse_record_v2,
-                                "2.1": self._parse_record_v2,
-                                "2.2": self._parse_record_v2,
-                                "2.5": self._parse_record_v2,
-                                "3": self._parse_record_v3}
+        self._record_parsers = self._get_record_parsers()
 
         #  Set default record parser
         if version not in self._record_parsers:
@@ -169,6 +239,14 @@ class Reader:
         self._next_rec = None
         self._stage_rec()
 
+    def _get_record_parsers(self):
+        return {"1": self._parse_record_v1,
+                "2": self._parse_record_v2,
+                "2.1": self._parse_record_v2,
+                "2.2": self._parse_record_v2,
+                "2.5": self._parse_record_v2,
+                "3": self._parse_record_v3}
+
     def get_version(self):
         """Returns the format version used for parsing."""
         return self._version or self._default_version
@@ -192,7 +270,73 @@ class Reader:
     def get_fasta_string(self):
         """Returns a string of FASTA formatted sequences found at the end of
         the GFF file (version 3 only)"""
-        return self._fasta_string
+        if not self._in_fasta:
+            return ""
+        if self._fasta_offset is None:
+            # The stream cannot be re-read, so keep what was read
+            if self._fasta_string is None:
+                self._fasta_string = self._fasta_stream().read()
+            return self._fasta_string
+        return self._fasta_stream().read()
+
+    def has_fasta(self):
+        """Returns True if a FASTA section has been reached (version 3 only)."""
+        return self._in_fasta
+
+    def get_fasta_offset(self):
+        """Returns the byte offset of the FASTA section in the stream, or
+        None if there is none or the stream does not support tell()."""
+        return self._fasta_offset
+
+    def iter_fasta(self):
+        """Yields (name, sequence) for each sequence in the FASTA section
+        (version 3 only).
+
+        Sequences are read from the stream one at a time rather than held
+        in memory together. name is the first word of the header line.
+        Unless the stream supports seek(), the section can only be read
+        once, by this or get_fasta_string().
+        """
+        if not self._in_fasta:
+            return
+        if self._fasta_offset is None and self._fasta_string is not None:
+            stream = StringIO(self._fasta_string)
+        else:
+            stream = self._fasta_stream()
+        name = None
+        chunks = []
+        for line in iter(stream.readline, ""):
+            if line.startswith(">"):
+                if name is not None:
+                    yield name, "".join(chunks)
+                name = _fasta_name(line)
+                chunks = []
+            else:
+                chunks.append(line.strip())
+        if name is not None:
+            yield name, "".join(chunks)
+
+    def get_fasta_index(self):
+        """Returns a FastaIndex of the FASTA section (version 3 only).
+
+        The index is built on first use by scanning the section and needs a
+        stream that supports seek(). Returns None if there is no section.
+        """
+        if self._fasta_index is None and self._in_fasta:
+            if self._fasta_offset is None:
+                raise IOError, "Indexing the FASTA section needs a stream " \
+                    "that supports seek()"
+            self._fasta_index = FastaIndex.build(self._fasta_stream(),
+                                                 self._fasta_offset)
+        return self._fasta_index
+
+    def fetch_fasta(self, name, start=1, end=None):
+        """Returns bases start to end (1-based, inclusive) of the FASTA
+        sequence name, reading only those bases from the stream."""
+        index = self.get_fasta_index()
+        if index is None:
+            raise KeyError(name)
+        return index.fetch(self._stream, name, start, end)
 
     def are_references_resolved(self):
         """Returns True if record references have all been resolved."""
@@ -221,8 +365,33 @@ class Reader:
             self._next_rec = None
             return rec
 
+    def _start_fasta(self, buffered):
+        """Marks the start of the FASTA section.
+
+        buffered is the text of the section that has already been read
+        from the stream, from the first header line up to the stream's
+        current position.
+        """
+        self._in_fasta = True
+        try:
+            self._fasta_offset = self._stream.tell() - len(buffered)
+        except (AttributeError, IOError):
+            self._fasta_buffered = buffered
+
+    def _fasta_stream(self):
+        """Returns the stream positioned at the start of the FASTA section."""
+        if self._fasta_offset is not None:
+            self._stream.seek(self._fasta_offset)
+            return self._stream
+        if self._fasta_buffered is None:
+            raise IOError, "FASTA section of a stream without seek() " \
+                "can only be read once"
+        stream = _PrefixedStream(self._fasta_buffered, self._stream)
+        self._fasta_buffered = None
+        return stream
+
     def _stage_rec(self):
-        while self._next_rec is None:
+        while self._next_rec is None and not self._in_fasta:
             line = self._stream.readline()
 
             # Stop when EOF reached
@@ -239,7 +408,7 @@ class Reader:
                 pass
             # Check for beginning of FASTA region for v3 formats
             elif line.startswith(">") and self._version == "3":
-                self._fasta_string = line + self._stream.read()
+                self._start_fasta(line)
             else:
                 self._next_rec = self._record_parser(line)
 
@@ -342,9 +511,9 @@ class Reader:
             raise FormatError, "Invalid number of fields (should be 9)"
 
         try:
-            return Record(seqid=url_unquote(fields[0]),
-                          source=url_unquote(fields[1]),
-                          type=url_unquote(fields[2]),
+            return Record(seqid=unquote_intern(fields[0]),
+                          source=unquote_intern(fields[1]),
+                          type=unquote_intern(fields[2]),
                           start=int(fields[3]),
                           end=int(fields[4]),
                           score=parse_maybe_empty(fields[5], float),
@@ -355,19 +524,431 @@ class Reader:
             raise FormatError, "GFF field format error: " + e.message
 
     def _parse_attributes_v3(self, s):
-        attributes = {}
-
-        for pair_string in s.split(";"):
-            try:
-                tag, value = pair_string.split("=")
-                attributes[url_unquote(tag)] = map(url_unquote,
-                                                   value.split(","))
-            except ValueError:
-                raise FormatError("Invalid attributes string: " + s)
-        return attributes
+        return parse_attributes_v3(s)
 
     def _parse_attributes_v2(self, s):
-        return parse_attributes_v2_faster(s)
+        return LazyAttributes(s)
+
+def _fasta_name(header):
+    """Returns the sequence name, the first word, of a FASTA header line."""
+    words = header[1:].split(None, 1)
+    if words:
+        return words[0]
+    return ""
+
+class _PrefixedStream:
+    """Read-only stream of a string followed by the rest of another stream."""
+
+    def __init__(self, prefix, stream):
+        self._prefix = StringIO(prefix)
+        self._stream = stream
+
+    def readline(self):
+        line = self._prefix.readline()
+        if line.endswith("\n"):
+            return line
+        return line + self._stream.readline()
+
+    def read(self, size=-1):
+        data = self._prefix.read() if size < 0 else self._prefix.read(size)
+        if size < 0:
+            return data + self._stream.read()
+        if len(data) < size:
+            data += self._stream.read(size - len(data))
+        return data
+
+class FastaIndex:
+    """A .fai style index of FASTA sequences for random access.
+
+    Each entry is (length, offset, line_bases, line_width) like a samtools
+    faidx line: the sequence length, the byte offset of its first base,
+    and the number of bases and bytes in each of its full lines.
+    """
+
+    def __init__(self, entries=None):
+        self._names = []
+        self._entries = {}
+        for name, entry in entries or []:
+            self.add(name, *entry)
+
+    def add(self, name, length, offset, line_bases, line_width):
+        if name not in self._entries:
+            self._names.append(name)
+        self._entries[name] = (length, offset, line_bases, line_width)
+
+    def names(self):
+        return list(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __getitem__(self, name):
+        return self._entries[name]
+
+    @classmethod
+    def build(cls, stream, offset=0):
+        """Indexes a FASTA stream whose first byte is at offset.
+
+        Lines are read one at a time, so memory does not grow with the
+        length of the sequences.
+        """
+        index = cls()
+        name = None
+        for line in iter(stream.readline, ""):
+            if line.startswith(">"):
+                if name is not None:
+                    index.add(name, length, seq_offset, line_bases, line_width)
+                name = _fasta_name(line)
+                length = 0
+                seq_offset = offset + len(line)
+                line_bases = line_width = 0
+            elif name is not None:
+                bases = len(line.rstrip("\r\n"))
+                if not line_bases:
+                    seq_offset = offset
+                    line_bases = bases
+                    line_width = len(line)
+                length += bases
+            offset += len(line)
+        if name is not None:
+            index.add(name, length, seq_offset, line_bases, line_width)
+        return index
+
+    @classmethod
+    def read(cls, stream):
+        """Reads an index written by write() or samtools faidx."""
+        index = cls()
+        for line in stream:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5:
+                raise FormatError, "Invalid FASTA index line: " + line
+            index.add(fields[0], *[int(field) for field in fields[1:5]])
+        return index
+
+    def write(self, stream):
+        """Writes the index in samtools .fai format."""
+        for name in self._names:
+            print >>stream, "\t".join([name] + [str(value) for value in
+                                                self._entries[name]])
+
+    def fetch(self, stream, name, start=1, end=None):
+        """Returns bases start to end (1-based, inclusive) of sequence name
+        read from stream, which must support seek()."""
+        length, offset, line_bases, line_width = self._entries[name]
+        if end is None or end > length:
+            end = length
+        start = max(start, 1)
+        if end < start:
+            return ""
+        def position(base):
+            return offset + base // line_bases * line_width + base % line_bases
+        first = position(start - 1)
+        stream.seek(first)
+        data = stream.read(position(end - 1) + 1 - first)
+        return data.replace("\n", "").replace("\r", "")
+
+# Default number of bytes ChunkedReader reads from its stream at a time
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+class ChunkedReader(Reader):
+    """Reads a GFF formatted file in large blocks.
+
+    Behaves like Reader, but reads the stream block_size bytes at a time,
+    splits each block into lines in bulk and yields CompactRecord
+    instances whose attributes are only parsed when first accessed.
+    Because of this, a malformed attributes column raises FormatError
+    when the record's attributes are accessed rather than when the record
+    is read.
+    """
+
+    def __init__(self, stream, version="2", block_size=DEFAULT_BLOCK_SIZE):
+        self._block_size = block_size
+        self._partial_line = ""
+        self._pending_recs = deque()
+        self._eof = False
+        Reader.__init__(self, stream, version)
+
+    def _get_record_parsers(self):
+        return {"1": self._parse_compact_v1,
+                "2": self._parse_compact_v2,
+                "2.1": self._parse_compact_v2,
+                "2.2": self._parse_compact_v2,
+                "2.5": self._parse_compact_v2,
+                "3": self._parse_compact_v3}
+
+    def next(self):
+        pending_recs = self._pending_recs
+        while not pending_recs:
+            if not self._read_block():
+                raise StopIteration
+        return pending_recs.popleft()
+
+    def _stage_rec(self):
+        while not self._pending_recs and self._read_block():
+            pass
+
+    def _read_block(self):
+        """Parses the next block of the stream, returning False at EOF."""
+        if self._eof:
+            return False
+
+        block = self._stream.read(self._block_size)
+        if block:
+            lines = (self._partial_line + block).split("\n")
+            self._partial_line = lines.pop()
+        else:
+            self._eof = True
+            lines = [self._partial_line]
+            self._partial_line = ""
+
+        append_rec = self._pending_recs.append
+        record_parser = self._record_parser
+        for index, line in enumerate(lines):
+            # Skip over blank lines
+            if not line:
+                continue
+            first = line[0]
+            if first == "#":
+                if line.startswith("##"):
+                    self._parse_directive(line + "\n")
+                    record_parser = self._record_parser
+                else:
+                    self._parse_comment(line + "\n")
+            # Check for beginning of FASTA region for v3 formats
+            elif first == ">" and self._version == "3":
+                buffered = "\n".join(lines[index:])
+                if block:
+                    buffered += "\n" + self._partial_line
+                    self._partial_line = ""
+                self._start_fasta(buffered)
+                self._eof = True
+                break
+            else:
+                append_rec(record_parser(line))
+        return True
+
+    def _parse_compact_v1(self, line):
+        fields = line.split('\t', 8)
+
+        if len(fields) == 8:
+            attributes_string = None
+        elif len(fields) == 9:
+            attributes_string = fields[8]
+        else:
+            raise FormatError, "Invalid number of fields (should be 8 or 9)"
+
+        try:
+            return CompactRecord(fields[0], fields[1], fields[2],
+                                 int(fields[3]), int(fields[4]),
+                                 float(fields[5]),
+                                 parse_maybe_empty(fields[6]),
+                                 parse_maybe_empty(fields[7], int),
+                                 attributes_string, parse_attributes_v1)
+        except ValueError, e:
+            raise FormatError, "GFF field format error: " + e.message
+
+    def _parse_compact_v2(self, line):
+        fields = line.split('\t', 8)
+
+        if len(fields) == 9:
+            attributes_string = fields[8]
+        elif len(fields) == 8:
+            attributes_string = None
+        else:
+            raise FormatError, "Invalid number of fields (should be 8 or 9)"
+
+        score, strand, phase = fields[5:8]
+        try:
+            return CompactRecord(fields[0], fields[1], fields[2],
+                                 int(fields[3]), int(fields[4]),
+                                 None if score == '.' else float(score),
+                                 None if strand == '.' else strand,
+                                 None if phase == '.' else int(phase),
+                                 attributes_string, LazyAttributes)
+        except ValueError, e:
+            raise FormatError, "GFF field format error: " + e.message
+
+    def _parse_compact_v3(self, line):
+        self._references_resolved = False
+
+        fields = line.split('\t')
+
+        if len(fields) != 9:
+            raise FormatError, "Invalid number of fields (should be 9)"
+
+        try:
+            return CompactRecord(unquote_intern(fields[0]),
+                                 unquote_intern(fields[1]),
+                                 unquote_intern(fields[2]),
+                                 int(fields[3]), int(fields[4]),
+                                 parse_maybe_empty(fields[5], float),
+                                 parse_maybe_empty(fields[6]),
+                                 parse_maybe_empty(fields[7], int),
+                                 fields[8], parse_attributes_v3)
+        except ValueError, e:
+            raise FormatError, "GFF field format error: " + e.message
+
+def parse_attributes_v1(s):
+    return {"group": [s]}
+
+def parse_attributes_v3(s):
+    return dict(parse_attribute_pairs_v3(s))
+
+def parse_attribute_pairs_v3(s):
+    """Returns v3 attributes as a list of (tag, values) in string order."""
+    pairs = []
+
+    # Most attribute strings have no escapes at all
+    escaped = "%" in s
+    for pair_string in s.split(";"):
+        try:
+            tag, value = pair_string.split("=")
+            if escaped:
+                pairs.append((url_unquote(tag),
+                              map(url_unquote, value.split(","))))
+            else:
+                pairs.append((intern(tag), value.split(",")))
+        except ValueError:
+            raise FormatError("Invalid attributes string: " + s)
+    return pairs
+
+def unquote_intern(s):
+    """URL-unquotes s if it has escapes and returns it interned.
+
+    Used for the seqid, source and type columns, which repeat a lot.
+    """
+    if "%" in s:
+        s = url_unquote(s)
+    return intern(s)
+
+# Default number of bytes ParallelReader hands to a worker at a time
+DEFAULT_PARALLEL_BLOCK_SIZE = 1024 * 1024
+
+class _WorkerReader(Reader):
+    """Reader used by ParallelReader workers.
+
+    Keeps v3 attributes as (tag, values) pairs in the order they were
+    parsed, so that the dict built from them after unpickling iterates in
+    the same order as one built by Reader.
+    """
+
+    def _parse_attributes_v3(self, s):
+        return parse_attribute_pairs_v3(s)
+
+def _parse_records_block(args):
+    """Parses a block of record lines in a ParallelReader worker."""
+    version, block = args
+    return _WorkerReader(StringIO(block), version).read_recs()
+
+class ParallelReader(Reader):
+    """Reads a GFF formatted file, parsing records in worker processes.
+
+    The stream is read in blocks of whole lines. Directives, comments and
+    the v3 FASTA section are handled in this process, while runs of record
+    lines are parsed by a multiprocessing pool. Records are returned in
+    file order and are the same as Reader's. Call close() to stop the
+    workers if the stream is not read to the end.
+    """
+
+    def __init__(self, stream, version="2", processes=None,
+                 block_size=DEFAULT_PARALLEL_BLOCK_SIZE):
+        self._block_size = block_size
+        self._partial_line = ""
+        self._eof = False
+        self._pending_recs = deque()
+        self._pending_blocks = deque()
+        self._pool = multiprocessing.Pool(processes)
+        self._max_pending_blocks = 2 * (processes or
+                                        multiprocessing.cpu_count())
+        Reader.__init__(self, stream, version)
+
+    def close(self):
+        """Stops the worker processes."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def next(self):
+        pending_recs = self._pending_recs
+        while not pending_recs:
+            if not self._fill():
+                raise StopIteration
+        return pending_recs.popleft()
+
+    def _stage_rec(self):
+        while not self._pending_recs and self._fill():
+            pass
+
+    def _fill(self):
+        """Queues more records, returning False once none are left."""
+        while not self._eof and \
+                len(self._pending_blocks) < self._max_pending_blocks:
+            self._read_block()
+        if self._pending_blocks:
+            recs = self._pending_blocks.popleft().get()
+            for rec in recs:
+                if type(rec.attributes) is list:
+                    rec.attributes = dict(rec.attributes)
+            self._pending_recs.extend(recs)
+            return True
+        self.close()
+        return False
+
+    def _parser_version(self):
+        if self._version in self._record_parsers:
+            return self._version
+        return self._default_version
+
+    def _submit(self, block):
+        if block:
+            if self._parser_version() == "3":
+                self._references_resolved = False
+            self._pending_blocks.append(self._pool.apply_async(
+                _parse_records_block, ((self._parser_version(), block),)))
+
+    def _read_block(self):
+        block = self._stream.read(self._block_size)
+        if block:
+            block = self._partial_line + block
+            cut = block.rfind("\n") + 1
+            self._partial_line = block[cut:]
+            block = block[:cut]
+        else:
+            self._eof = True
+            block = self._partial_line
+            self._partial_line = ""
+
+        # Blocks without directives, comments or FASTA go straight to the
+        # workers; others are split around those lines
+        if not (block.startswith(("#", ">")) or "\n#" in block or
+                "\n>" in block):
+            self._submit(block)
+            return
+
+        records = []
+        lines = list(StringIO(block))
+        for index, line in enumerate(lines):
+            if line.startswith("#"):
+                self._submit("".join(records))
+                records = []
+                if line.startswith("##"):
+                    self._parse_directive(line)
+                else:
+                    self._parse_comment(line)
+            elif line.startswith(">") and self._version == "3":
+                self._submit("".join(records))
+                records = []
+                self._start_fasta("".join(lines[index:]) + self._partial_line)
+                self._partial_line = ""
+                self._eof = True
+                break
+            else:
+                records.append(line)
+        self._submit("".join(records))
 
 def parse_attributes_v2(s):
     attributes = {}
@@ -517,6 +1098,238 @@ def parse_attributes_v2_faster(s):
         raise FormatError, "Invalid attributes string: " + s
     return d
 
+# Matches a subset of well-formed v2 attributes strings: those whose
+# values are unquoted or quoted without escapes and that have no comment
+simple_attributes_v2_pat = re.compile(r'''
+                                      (?:\s*[A-Za-z][A-Za-z0-9_]* # tag
+                                      (?:\s+(?:"[^"\\]*"|[^;#"\s]+))+ # values
+                                      \s*;\s*)* # separator
+                                      \Z''',
+                                      re.X)
+
+# Tags that LazyAttributes can look up without parsing the whole string
+FAST_ATTRIBUTE_TAGS = ("gene_id", "transcript_id")
+fast_attribute_pats = dict([(tag, re.compile(r'(?:^|;)\s*%s\s+"([^"\\]*)"\s*;'
+                                             % tag))
+                            for tag in FAST_ATTRIBUTE_TAGS])
+
+class LazyAttributes(MutableMapping):
+    """A mapping of v2 attribute tags to value lists, parsed on demand.
+
+    Keeps the raw attributes string and only parses it with
+    parse_attributes_v2_faster when it is first used. The tags in
+    FAST_ATTRIBUTE_TAGS are looked up directly in the string when they
+    occur once with a single quoted value and the string is plainly
+    well-formed, so reading e.g. transcript_id does not build the full
+    dict. A malformed string raises FormatError whenever any tag is
+    looked up.
+    """
+
+    def __init__(self, s):
+        self._string = s
+        self._values = None
+        self._complete = False
+        # Whether the string matches simple_attributes_v2_pat, checked on
+        # the first fast lookup
+        self._simple = None
+
+    def _parse(self):
+        if not self._complete:
+            values = parse_attributes_v2_faster(self._string)
+            # Keep the value lists already handed out by fast lookups
+            if self._values:
+                values.update(self._values)
+            self._values = values
+            self._complete = True
+        return self._values
+
+    def _fast_lookup(self, tag):
+        s = self._string
+        # Anything unusual is left to the full parser, which also
+        # raises FormatError for malformed strings
+        if self._simple is None:
+            self._simple = simple_attributes_v2_pat.match(s) is not None
+        if not self._simple:
+            return None
+        # A repeated tag has several values. Each tag is counted at most
+        # once: a hit is kept in _values, a miss runs the full parse.
+        if s.count(tag) != 1:
+            return None
+        match = fast_attribute_pats[tag].search(s)
+        if match is None:
+            return None
+        if self._values is None:
+            self._values = {}
+        values = self._values[tag] = [match.group(1)]
+        return values
+
+    def __getitem__(self, tag):
+        if not self._complete:
+            if self._values and tag in self._values:
+                return self._values[tag]
+            if tag in fast_attribute_pats:
+                values = self._fast_lookup(tag)
+                if values is not None:
+                    return values
+        return self._parse()[tag]
+
+    def __setitem__(self, tag, values):
+        self._parse()[tag] = values
+
+    def __delitem__(self, tag):
+        del self._parse()[tag]
+
+    def __iter__(self):
+        return iter(self._parse())
+
+    def __len__(self):
+        return len(self._parse())
+
+    def __nonzero__(self):
+        # A well-formed, non-empty attributes string starts with a tag
+        if self._complete:
+            return bool(self._values)
+        stripped = self._string.lstrip()
+        if stripped[:1].isalpha():
+            return True
+        return bool(self._parse())
+
+    def __repr__(self):
+        return repr(self._parse())
+
+    def __getstate__(self):
+        return (self._string, self._values, self._complete, self._simple)
+
+    def __setstate__(self, state):
+        self._string, self._values, self._complete, self._simple = state
+
+class Categorical:
+    """An integer-coded column.
+
+    Fields:
+       codes   numpy int32 array; index into labels, or -1 for no value
+       labels  list of distinct values in order of first appearance
+    """
+
+    def __init__(self, codes, labels):
+        self.codes = codes
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.codes)
+
+    def values(self):
+        """Returns the decoded column as a list (None for missing values)."""
+        labels = self.labels
+        return [labels[code] if code >= 0 else None for code in self.codes]
+
+class Columns:
+    """The records of a GFF file stored column by column as numpy arrays.
+
+    Fields:
+       seqid      Categorical
+       type       Categorical
+       start      int64 array
+       end        int64 array
+       strand     int8 array; 1 for '+', -1 for '-', 0 when unknown
+       attribute  Categorical of the first value of one attribute tag
+       attribute_name
+    """
+
+    def __init__(self, seqid, type, start, end, strand,
+                 attribute, attribute_name):
+        self.seqid = seqid
+        self.type = type
+        self.start = start
+        self.end = end
+        self.strand = strand
+        self.attribute = attribute
+        self.attribute_name = attribute_name
+
+    def __len__(self):
+        return len(self.start)
+
+    def type_mask(self, types):
+        """Returns a boolean array selecting records with one of types."""
+        import numpy as np
+        codes = [code for code, label in enumerate(self.type.labels)
+                 if label in types]
+        return np.in1d(self.type.codes, codes)
+
+    def lengths(self):
+        """Returns end - start + 1 for every record."""
+        return self.end - self.start + 1
+
+    def sum_lengths(self, types):
+        """Sums record lengths by attribute value over records of types.
+
+        Returns (labels, sums) with labels in order of first appearance
+        among the selected records.
+        """
+        import numpy as np
+        mask = self.type_mask(types)
+        codes = self.attribute.codes[mask]
+        if len(codes) and codes.min() < 0:
+            raise KeyError(self.attribute_name)
+        sums = np.zeros(len(self.attribute.labels), dtype=np.int64)
+        np.add.at(sums, codes, self.lengths()[mask])
+        present, first_index = np.unique(codes, return_index=True)
+        order = present[np.argsort(first_index, kind="mergesort")]
+        labels = self.attribute.labels
+        return [labels[code] for code in order], sums[order]
+
+_strand_codes = {"+": 1, "-": -1}
+
+def load_columns(stream, attribute="transcript_id", version="2",
+                 attribute_types=None):
+    """Reads a GFF file into a Columns object.
+
+    Requires numpy. The attribute column holds the first value of the
+    given attribute tag for each record. If attribute_types is given, the
+    tag is only looked up for records of those types, and the others
+    hold no value. Records are still parsed one at a time, so this is
+    slower than a loop over a Reader; the vectorized reductions only pay
+    off when the columns are read back from a gff_cache.ColumnCache.
+    """
+    import numpy as np
+
+    seqid_codes, seqid_labels = array('i'), {}
+    type_codes, type_labels = array('i'), {}
+    attribute_codes, attribute_labels = array('i'), {}
+    starts, ends, strands = array('l'), array('l'), array('b')
+
+    for rec in ChunkedReader(stream, version):
+        seqid_codes.append(seqid_labels.setdefault(rec.seqid,
+                                                   len(seqid_labels)))
+        type_codes.append(type_labels.setdefault(rec.type, len(type_labels)))
+        starts.append(rec.start)
+        ends.append(rec.end)
+        strands.append(_strand_codes.get(rec.strand, 0))
+        if attribute_types is None or rec.type in attribute_types:
+            values = rec.attributes.get(attribute)
+        else:
+            values = None
+        if values:
+            attribute_codes.append(
+                attribute_labels.setdefault(values[0], len(attribute_labels)))
+        else:
+            attribute_codes.append(-1)
+
+    def categorical(codes, labels):
+        ordered = [None] * len(labels)
+        for label, code in labels.iteritems():
+            ordered[code] = label
+        return Categorical(np.frombuffer(codes, dtype=np.intc).astype(np.int32),
+                           ordered)
+
+    return Columns(categorical(seqid_codes, seqid_labels),
+                   categorical(type_codes, type_labels),
+                   np.frombuffer(starts, dtype=np.int_).astype(np.int64),
+                   np.frombuffer(ends, dtype=np.int_).astype(np.int64),
+                   np.frombuffer(strands, dtype=np.int8).copy(),
+                   categorical(attribute_codes, attribute_labels),
+                   attribute)
+
 def is_integer(x):
     """Returns true if x is of integer type (int or long)."""
     return type(x) in (int, long)
@@ -551,17 +1364,22 @@ class Writer:
     def __init__(self, stream, version="2", metadata=[]):
         self.stream = stream
 
-        # Create record writer table
-        self._record_writers = {"1": self._write_rec_v1,
-                                "2": self._write_rec_v2,
-                                "2.1": self._write_rec_gtf,
-                                "2.2": self._write_rec_gtf,
-                                "2.5": self._write_rec_gtf,
-                                "3": self._write_rec_v3}
+        # Create record formatter table
+        self._record_formatters = {"1": self._format_rec_v1,
+                                   "2": self._format_rec_v2,
+                                   "2.1": self._format_rec_gtf,
+                                   "2.2": self._format_rec_gtf,
+                                   "2.5": self._format_rec_gtf,
+                                   "3": self._format_rec_v3}
+
+        # Attribute orders by attribute keys (in iteration order), so that
+        # records sharing a set of tags only sort them once
+        self._v2_attribute_orders = {}
+        self._gtf_attribute_orders = {}
 
         # Set version
         try:
-            self._record_writer = self._record_writers[version]
+            self._record_formatter = self._record_formatters[version]
             self.version = version
             self.write_metadatum(Metadatum("gff-version", version))
         except KeyError:
@@ -573,24 +1391,27 @@ class Writer:
     def write_metadatum(self, metadatum):
         """Writes a metadatum line."""
         if metadatum.value is not None:
-            print >>self.stream, "##%s %s" % (metadatum.name, metadatum.value)
+            self._write_line("##%s %s" % (metadatum.name, metadatum.value))
         else:
-            print >>self.stream, "##%s" % metadatum.name
+            self._write_line("##%s" % metadatum.name)
 
     def write_comment(self, comment):
         """Writes a comment line."""
-        print >>self.stream, "#%s" % comment
+        self._write_line("#%s" % comment)
 
     def write(self, rec):
         """Writes a single record."""
-        self._record_writer(rec)
+        self._write_line(self._record_formatter(rec))
 
     def write_recs(self, recs):
         """Writes a list of records."""
         for rec in recs:
             self.write(rec)
 
-    def _write_rec_v1(self, rec):
+    def _write_line(self, line):
+        print >>self.stream, line
+
+    def _format_rec_v1(self, rec):
         fields = [rec.seqid,
                   rec.source,
                   rec.type,
@@ -601,53 +1422,85 @@ class Writer:
                   format_maybe_empty(rec.phase)]
         if rec.attributes.get('group') is not None:
             fields.append(rec.attributes['group'][0])
-        print >>self.stream, '\t'.join(fields)
-
-    def _write_rec_v2(self, rec, attribute_order=None):
-        fields = [rec.seqid,
-                  rec.source,
-                  rec.type,
-                  str(rec.start),
-                  str(rec.end),
-                  format_maybe_empty(rec.score),
-                  format_maybe_empty(rec.strand),
-                  format_maybe_empty(rec.phase)]
-        if rec.attributes:
-            if attribute_order is None:
-                attribute_order = sorted(rec.attributes.keys())
-            fields.append(self._format_attributes_v2(rec.attributes,
-                                                     attribute_order))
-        print >>self.stream, '\t'.join(fields)
-
-    def _write_rec_v3(self, rec):
-        fields = [_seqid_pat.sub(url_quote, rec.seqid),
-                  _source_pat.sub(url_quote, rec.source),
-                  _type_pat.sub(url_quote, rec.type),
-                  str(rec.start),
-                  str(rec.end),
-                  format_maybe_empty(rec.score),
-                  format_maybe_empty(rec.strand),
-                  format_maybe_empty(rec.phase),
-                  format_maybe_empty(self._format_attributes_v3(rec.attributes))]
-        print >>self.stream, '\t'.join(fields)
-
-    def _write_rec_gtf(self, rec):
-        # The required GTF attributes
-        gtf_attributes = ["gene_id", "transcript_id"]
-        
-        # Make sure that this record has the required GTF attributes
-        if not all([attr in rec.attributes for attr in gtf_attributes]):
-            gtf_rec = rec.copy()
-            for attr in gtf_attributes:
-                gtf_rec.attributes.setdefault(attr, [""])
-        else:
-            gtf_rec = rec
-
-        attribute_order = gtf_attributes + list(set(gtf_rec.attributes) -
-                                                set(gtf_attributes))
+        return '\t'.join(fields)
+
+    def _format_rec_v2(self, rec):
+        line = _v2_line_format % (rec.seqid,
+                                  rec.source,
+                                  rec.type,
+                                  rec.start,
+                                  rec.end,
+                                  _format_maybe_empty(rec.score),
+                                  _format_maybe_empty(rec.strand),
+                                  _format_maybe_empty(rec.phase))
+        attributes = rec.attributes
+        if attributes:
+            attribute_order = self._v2_attribute_order(attributes)
+            line += '\t' + self._format_attributes_v2(attributes,
+                                                      attribute_order)
+        return line
+
+    def _format_rec_v3(self, rec):
+        return _v3_line_format % (_seqid_pat.sub(url_quote_sub, rec.seqid),
+                                  _source_pat.sub(url_quote_sub, rec.source),
+                                  _type_pat.sub(url_quote_sub, rec.type),
+                                  rec.start,
+                                  rec.end,
+                                  _format_maybe_empty(rec.score),
+                                  _format_maybe_empty(rec.strand),
+                                  _format_maybe_empty(rec.phase),
+                                  format_maybe_empty(
+                                      self._format_attributes_v3(rec.attributes)))
+
+    def _format_rec_gtf(self, rec):
         # GTF is just GFF v2 with some required attributes that go in
-        # a specific order
-        self._write_rec_v2(gtf_rec, attribute_order)
+        # a specific order; missing ones are written with an empty value
+        attributes = rec.attributes
+        attribute_order = self._gtf_attribute_order(attributes)
+        if not all([tag in attributes for tag in _gtf_attributes]):
+            attributes = dict(attributes)
+            for tag in _gtf_attributes:
+                attributes.setdefault(tag, _empty_value)
+        return _v2_line_format % (rec.seqid,
+                                  rec.source,
+                                  rec.type,
+                                  rec.start,
+                                  rec.end,
+                                  _format_maybe_empty(rec.score),
+                                  _format_maybe_empty(rec.strand),
+                                  _format_maybe_empty(rec.phase)) + \
+            '\t' + self._format_attributes_v2(attributes, attribute_order)
+
+    def _v2_attribute_order(self, attributes):
+        keys = tuple(attributes)
+        try:
+            return self._v2_attribute_orders[keys]
+        except KeyError:
+            if len(self._v2_attribute_orders) >= _MAX_ATTRIBUTE_ORDERS:
+                self._v2_attribute_orders.clear()
+            order = self._v2_attribute_orders[keys] = sorted(keys)
+            return order
+
+    def _gtf_attribute_order(self, attributes):
+        keys = tuple(attributes)
+        try:
+            return self._gtf_attribute_orders[keys]
+        except KeyError:
+            if len(self._gtf_attribute_orders) >= _MAX_ATTRIBUTE_ORDERS:
+                self._gtf_attribute_orders.clear()
+            # The order of the other tags comes from a set built from the
+            # record's attributes dict, with any missing required tags
+            # added to a copy of it, as in Record.copy()
+            if isinstance(attributes, LazyAttributes):
+                attributes = attributes._parse()
+            if not all([tag in attributes for tag in _gtf_attributes]):
+                attributes = dict([(tag, None) for tag in keys])
+                for tag in _gtf_attributes:
+                    attributes.setdefault(tag, None)
+            order = _gtf_attributes + list(set(attributes) -
+                                           set(_gtf_attributes))
+            self._gtf_attribute_orders[keys] = order
+            return order
         
     def _format_attributes_v3(self, attributes):
         return ';'.join(["%s=%s" % (_tag_pat.sub(url_quote_sub, tag),
@@ -659,5 +1512,96 @@ class Writer:
         return ' '.join([tag] + map(quote, values)) + ";"
 
     def _format_attributes_v2(self, attributes, attribute_order):
-        return ' '.join([self._format_attribute_v2(tag, attributes[tag])
-                         for tag in attribute_order])
+        parts = []
+        for tag in attribute_order:
+            values = attributes[tag]
+            if len(values) == 1:
+                parts.append('%s "%s";' % (tag, values[0]))
+            else:
+                parts.append(self._format_attribute_v2(tag, values))
+        return ' '.join(parts)
+
+_v2_line_format = '\t'.join(['%s'] * 8)
+_v3_line_format = '\t'.join(['%s'] * 9)
+
+def _format_maybe_empty(value):
+    if value is None or value == "":
+        return '.'
+    else:
+        return value
+
+# The required GTF attributes
+_gtf_attributes = ["gene_id", "transcript_id"]
+_empty_value = [""]
+
+# Limit on the number of cached attribute orders per Writer
+_MAX_ATTRIBUTE_ORDERS = 10000
+
+# Default number of lines BatchWriter buffers before writing them out
+DEFAULT_BATCH_LINES = 16384
+
+class _Row(object):
+    """Record-like view of one row of a columnar batch."""
+
+    __slots__ = ("seqid", "source", "type", "start", "end",
+                 "score", "strand", "phase", "attributes")
+
+class BatchWriter(Writer):
+    """Writes a GFF formatted file in large buffered writes.
+
+    Produces the same output as Writer, but joins formatted lines in a
+    buffer that is written to the stream batch_lines lines at a time.
+    Call flush() when done writing.
+    """
+
+    def __init__(self, stream, version="2", metadata=[],
+                 batch_lines=DEFAULT_BATCH_LINES):
+        self._lines = []
+        self.batch_lines = batch_lines
+        Writer.__init__(self, stream, version, metadata)
+
+    def write_recs(self, recs):
+        """Writes an iterable of records."""
+        format_rec = self._record_formatter
+        lines = self._lines
+        append_line = lines.append
+        batch_lines = self.batch_lines
+        for rec in recs:
+            append_line(format_rec(rec))
+            if len(lines) >= batch_lines:
+                self.flush()
+
+    def write_columns(self, columns):
+        """Writes records given as a mapping of field name to sequence.
+
+        The seqid, source, type, start and end sequences are required;
+        score, strand, phase and attributes default to empty values.
+        """
+        length = len(columns["seqid"])
+        empty = [None] * length
+        row = _Row()
+        def rows():
+            for values in zip(columns["seqid"], columns["source"],
+                              columns["type"], columns["start"],
+                              columns["end"],
+                              columns.get("score", empty),
+                              columns.get("strand", empty),
+                              columns.get("phase", empty),
+                              columns.get("attributes") or [{}] * length):
+                (row.seqid, row.source, row.type, row.start, row.end,
+                 row.score, row.strand, row.phase, row.attributes) = values
+                yield row
+        self.write_recs(rows())
+
+    def flush(self):
+        """Writes out buffered lines and flushes the stream."""
+        if self._lines:
+            self._lines.append("")
+            self.stream.write("\n".join(self._lines))
+            del self._lines[:]
+        self.stream.flush()
+
+    def _write_line(self, line):
+        self._lines.append(line)
+        if len(self._lines) >= self.batch_lines:
+            self.flush()
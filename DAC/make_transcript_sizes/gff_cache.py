@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# On-disk cache of gff.Columns for annotation files that are parsed over
+# and over (e.g. the same GENCODE release by make_transcript_sizes).
+#
+# Each cache entry is a directory of .npy files that are memory-mapped on
+# load. Entries are keyed by the MD5 checksum of the source file together
+# with the parse options; a per-cache index maps a file's path, size and
+# mtime to its checksum so that unchanged files are not re-hashed. The
+# least recently used entries are evicted once the cache grows past its
+# byte budget.
+
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+import gff
+
+__all__ = ["ColumnCache", "DEFAULT_CACHE_DIR", "DEFAULT_MAX_BYTES"]
+
+# Bump when the on-disk layout changes so old entries are never loaded
+CACHE_FORMAT = "1"
+
+DEFAULT_CACHE_DIR = os.environ.get("GFF_CACHE_DIR",
+                                   os.path.expanduser("~/.cache/gff_columns"))
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+
+INDEX_FILE = "index.json"
+META_FILE = "meta.json"
+
+_CATEGORICALS = ("seqid", "type", "attribute")
+_ARRAYS = ("start", "end", "strand")
+
+def file_md5(path, block_size=4 * 1024 * 1024):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            md5.update(block)
+    return md5.hexdigest()
+
+def _mkdirs(path):
+    try:
+        os.makedirs(path)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+class ColumnCache:
+    """A directory of memory-mappable gff.Columns keyed by file checksum."""
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        _mkdirs(self.cache_dir)
+
+    def load(self, path, attribute="transcript_id", version="2", opener=open,
+             attribute_types=None):
+        """Returns gff.Columns for path, parsing it only on a cache miss.
+
+        opener is called with path to get the text stream to parse, so
+        that e.g. gzipped files can be cached by their compressed checksum.
+        attribute_types is passed on to gff.load_columns.
+        """
+        key = self._key(path, attribute, version, attribute_types)
+        entry = os.path.join(self.cache_dir, key)
+        columns = self._read_entry(entry)
+        if columns is not None:
+            return columns
+
+        stream = opener(path)
+        try:
+            columns = gff.load_columns(stream, attribute, version,
+                                       attribute_types)
+        finally:
+            stream.close()
+        self._write_entry(entry, columns, path)
+        self.evict(keep=key)
+        return self._read_entry(entry) or columns
+
+    def invalidate(self, path=None):
+        """Removes cache entries built from path, or every entry."""
+        source = os.path.realpath(path) if path else None
+        for key, meta in self._entries():
+            if source is None or meta.get("source") == source:
+                shutil.rmtree(os.path.join(self.cache_dir, key), True)
+        index = self._read_index()
+        if source is None:
+            index = {}
+        else:
+            index.pop(source, None)
+        self._write_index(index)
+
+    def evict(self, keep=None):
+        """Removes least recently used entries until under max_bytes."""
+        entries = []
+        total = 0
+        for key, meta in self._entries():
+            entry = os.path.join(self.cache_dir, key)
+            size = sum(os.path.getsize(os.path.join(entry, name))
+                       for name in os.listdir(entry))
+            used = os.path.getmtime(os.path.join(entry, META_FILE))
+            entries.append((used, key, size))
+            total += size
+        entries.sort()
+        for used, key, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, key), True)
+            total -= size
+
+    def entries(self):
+        """Returns a list of (key, metadata) for each cache entry."""
+        return list(self._entries())
+
+    def _entries(self):
+        for key in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self.cache_dir, key, META_FILE)
+            try:
+                with open(meta_path) as f:
+                    yield key, json.load(f)
+            except (IOError, ValueError):
+                continue
+
+    def _key(self, path, attribute, version, attribute_types=None):
+        source = os.path.realpath(path)
+        stat = os.stat(source)
+        index = self._read_index()
+        known = index.get(source)
+        if known and known["size"] == stat.st_size and \
+                known["mtime"] == stat.st_mtime:
+            checksum = known["md5"]
+        else:
+            checksum = file_md5(source)
+            index[source] = {"size": stat.st_size, "mtime": stat.st_mtime,
+                             "md5": checksum}
+            self._write_index(index)
+        if attribute_types is not None:
+            attribute_types = ",".join(sorted(attribute_types))
+        return hashlib.md5("\t".join((CACHE_FORMAT, checksum, str(attribute),
+                                      str(version),
+                                      str(attribute_types)))).hexdigest()
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_FILE)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        # Write then rename so that processes sharing the cache never see
+        # a partial index
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".index")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.rename(tmp, os.path.join(self.cache_dir, INDEX_FILE))
+
+    def _read_entry(self, entry):
+        import numpy as np
+        meta_path = os.path.join(entry, META_FILE)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (IOError, ValueError):
+            return None
+        try:
+            def load(name):
+                return np.load(os.path.join(entry, name + ".npy"),
+                               mmap_mode='r')
+            categoricals = dict(
+                (name, gff.Categorical(load(name + "_codes"),
+                                       load(name + "_labels").tolist()))
+                for name in _CATEGORICALS)
+            arrays = dict((name, load(name)) for name in _ARRAYS)
+        except (IOError, ValueError):
+            return None
+        # Mark the entry as recently used for eviction
+        os.utime(meta_path, None)
+        return gff.Columns(categoricals["seqid"], categoricals["type"],
+                           arrays["start"], arrays["end"], arrays["strand"],
+                           categoricals["attribute"], meta["attribute"])
+
+    def _write_entry(self, entry, columns, path):
+        import numpy as np
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=".entry")
+        try:
+            for name in _CATEGORICALS:
+                categorical = getattr(columns, name)
+                np.save(os.path.join(tmp, name + "_codes.npy"),
+                        categorical.codes)
+                labels = np.array(categorical.labels or [""])[
+                    :len(categorical.labels)]
+                np.save(os.path.join(tmp, name + "_labels.npy"), labels)
+            for name in _ARRAYS:
+                np.save(os.path.join(tmp, name + ".npy"), getattr(columns, name))
+            with open(os.path.join(tmp, META_FILE), 'w') as f:
+                json.dump({"source": os.path.realpath(path),
+                           "attribute": columns.attribute_name,
+                           "records": len(columns),
+                           "created": time.time()}, f)
+            try:
+                os.rename(tmp, entry)
+            except OSError:
+                # Another process wrote the same entry first
+                pass
+        finally:
+            shutil.rmtree(tmp, True)
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or clear the GFF column cache")
+    ap.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                    help="Cache directory (default: $GFF_CACHE_DIR or '%s')"
+                    % DEFAULT_CACHE_DIR)
+    ap.add_argument('--clear', action='store_true', help='Remove every entry')
+    ap.add_argument('--invalidate', metavar='FILE',
+                    help='Remove entries built from FILE')
+    args = ap.parse_args()
+
+    cache = ColumnCache(args.cache_dir)
+    if args.clear:
+        cache.invalidate()
+    elif args.invalidate:
+        cache.invalidate(args.invalidate)
+    else:
+        for key, meta in cache.entries():
+            print "\t".join((key, meta["source"], meta["attribute"],
+                             str(meta["records"])))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+# Region queries over GFF records.
+#
+# AnnotationIndex keeps, for every seqid, the records sorted by start in a
+# nested containment list (NCList): records contained in another record
+# are moved into that record's sublist, so that within each sublist both
+# starts and ends are increasing and the first overlapping record can be
+# found by bisection. Overlap queries cost O(log n + k).
+#
+# All coordinates are GFF style: 1-based and inclusive.
+
+from bisect import bisect_left, bisect_right
+
+import gff
+
+__all__ = ["AnnotationIndex", "read_bed_regions"]
+
+class _SeqIndex:
+    """NCList and sorted start/end arrays for the records on one seqid."""
+
+    def __init__(self, records):
+        records = sorted(records, key=lambda rec: (rec.start, -rec.end))
+        self.records = records
+
+        # Each sublist is (starts, ends, record indexes, child sublists);
+        # child sublists are indexes into self.sublists or -1
+        self.sublists = [([], [], [], [])]
+        stack = []  # (end, sublist index to add contained records to)
+        for index, rec in enumerate(records):
+            while stack and stack[-1][0] < rec.end:
+                stack.pop()
+            if stack:
+                parent = stack[-1]
+                if parent[1] < 0:
+                    # First record contained in the parent: start its sublist
+                    parent_sublist, position = parent[2]
+                    self.sublists.append(([], [], [], []))
+                    sublist = len(self.sublists) - 1
+                    self.sublists[parent_sublist][3][position] = sublist
+                    stack[-1] = (parent[0], sublist, parent[2])
+                sublist = stack[-1][1]
+            else:
+                sublist = 0
+            starts, ends, indexes, children = self.sublists[sublist]
+            starts.append(rec.start)
+            ends.append(rec.end)
+            indexes.append(index)
+            children.append(-1)
+            stack.append((rec.end, -1, (sublist, len(indexes) - 1)))
+
+        # Records by start and by end for nearest-neighbour queries
+        self.starts = [rec.start for rec in records]
+        self.by_end = sorted(range(len(records)),
+                             key=lambda index: records[index].end)
+        self.ends = [records[index].end for index in self.by_end]
+
+    def overlap(self, start, end):
+        hits = []
+        pending = [0]
+        while pending:
+            starts, ends, indexes, children = self.sublists[pending.pop()]
+            position = bisect_left(ends, start)
+            count = len(starts)
+            while position < count and starts[position] <= end:
+                hits.append(indexes[position])
+                if children[position] >= 0:
+                    pending.append(children[position])
+                position += 1
+        hits.sort()
+        records = self.records
+        return [records[index] for index in hits]
+
+    def nearest(self, start, end):
+        hits = self.overlap(start, end)
+        if hits:
+            return 0, hits
+
+        records = self.records
+        candidates = []
+        # Closest record ending before start
+        left = bisect_left(self.ends, start) - 1
+        if left >= 0:
+            left_end = self.ends[left]
+            first = bisect_left(self.ends, left_end)
+            candidates.append((start - left_end,
+                               [records[index]
+                                for index in self.by_end[first:left + 1]]))
+        # Closest record starting after end
+        right = bisect_right(self.starts, end)
+        if right < len(self.starts):
+            right_start = self.starts[right]
+            last = bisect_right(self.starts, right_start)
+            candidates.append((right_start - end, records[right:last]))
+
+        if not candidates:
+            return None, []
+        distance = min(distance for distance, recs in candidates)
+        nearest = []
+        for candidate_distance, recs in candidates:
+            if candidate_distance == distance:
+                nearest.extend(recs)
+        return distance, nearest
+
+class AnnotationIndex:
+    """An index of GFF records for overlap and nearest-record queries."""
+
+    def __init__(self, records, types=None):
+        by_seqid = {}
+        for rec in records:
+            if types is None or rec.type in types:
+                by_seqid.setdefault(rec.seqid, []).append(rec)
+        self._seqs = dict([(seqid, _SeqIndex(recs))
+                           for seqid, recs in by_seqid.items()])
+
+    @classmethod
+    def from_stream(cls, stream, types=None, version="2"):
+        """Builds an index from a GFF stream read with gff.ChunkedReader."""
+        return cls(gff.ChunkedReader(stream, version), types)
+
+    def __len__(self):
+        return sum([len(seq.records) for seq in self._seqs.values()])
+
+    def seqids(self):
+        return sorted(self._seqs.keys())
+
+    def overlap(self, seqid, start, end=None):
+        """Returns the records on seqid overlapping [start, end], in start order."""
+        seq = self._seqs.get(seqid)
+        if seq is None:
+            return []
+        return seq.overlap(start, start if end is None else end)
+
+    def nearest(self, seqid, start, end=None):
+        """Returns (distance, records) for the records closest to [start, end].
+
+        Overlapping records have distance 0. Otherwise the records with
+        the smallest gap to either side are returned. distance is None
+        when seqid has no records.
+        """
+        seq = self._seqs.get(seqid)
+        if seq is None:
+            return None, []
+        return seq.nearest(start, start if end is None else end)
+
+    def query_bed(self, stream):
+        """Yields (chrom, start, end, records) overlapping each BED region.
+
+        start and end are converted from BED's 0-based, half-open
+        coordinates to GFF's 1-based, inclusive ones.
+        """
+        for chrom, start, end in read_bed_regions(stream):
+            yield chrom, start, end, self.overlap(chrom, start, end)
+
+def read_bed_regions(stream):
+    """Yields (chrom, start, end) in GFF coordinates from a BED stream."""
+    for line in stream:
+        if not line.strip() or line.startswith(("#", "track", "browser")):
+            continue
+        fields = line.split("\t", 3)
+        if len(fields) < 3:
+            raise gff.FormatError("Invalid BED line: " + line)
+        try:
+            yield fields[0], int(fields[1]) + 1, int(fields[2])
+        except ValueError:
+            raise gff.FormatError("Invalid BED line: " + line)
@@ -0,0 +1,63 @@
+# Annotations shared by the make_transcript_sizes tests.
+
+import random
+
+# Small GTF with directives, comments, repeated tags, quoted separators
+# and a trailing comment
+GTF = (
+    '##description: test annotation\n'
+    '#a comment\n'
+    'chr1\tHAVANA\tgene\t11869\t14409\t.\t+\t.\tgene_id "G1"; gene_type "pseudogene"; level 2;\n'
+    'chr1\tHAVANA\ttranscript\t11869\t14409\t.\t+\t.\tgene_id "G1"; transcript_id "T1"; tag "basic"; tag "CCDS";\n'
+    'chr1\tHAVANA\texon\t11869\t12227\t.\t+\t.\tgene_id "G1"; transcript_id "T1"; exon_number 1;\n'
+    'chr1\tHAVANA\texon\t12613\t12721\t0.5\t+\t.\tgene_id "G1"; transcript_id "T1"; exon_number 2; note "a;b";\n'
+    'chr2\tENSEMBL\tCDS\t100\t200\t.\t-\t0\tgene_id "G2"; transcript_id "T2";\n'
+    'chr2\tENSEMBL\texon\t50\t400\t.\t-\t.\tgene_id "G2"; transcript_id "T2"; # trailing comment\n'
+)
+
+GFF3 = (
+    '##gff-version 3\n'
+    '##sequence-region ctg1 1 40\n'
+    'ctg1\tsrc\tgene\t1\t30\t.\t+\t.\tID=gene1;Name=Gene%201\n'
+    'ctg1\tsrc\tmRNA\t1\t30\t.\t+\t.\tID=mrna1;Parent=gene1;Note=x,y\n'
+    'ctg1\tsrc\texon\t5\t20\t.\t+\t.\tParent=mrna1\n'
+    '##FASTA\n'
+    '>ctg1 test contig\n'
+    'ACGTACGTAC\n'
+    'GGGGCCCCAA\n'
+    'TTTT\n'
+    '>ctg2\n'
+    'NNNN\n'
+)
+
+def synthetic_gtf(genes, seed=0):
+    """Returns a GENCODE-like GTF of genes genes, each with a transcript
+    and a few exons, with comments scattered through it."""
+    rng = random.Random(seed)
+    lines = ["##description: synthetic\n"]
+    for gene in range(genes):
+        chrom = "chr%d" % (gene % 3 + 1)
+        start = rng.randint(1, 1000000)
+        gene_id = "ENSG%011d.1" % gene
+        transcript_id = "ENST%011d.1" % gene
+        lines.append('%s\tHAVANA\tgene\t%d\t%d\t.\t+\t.\tgene_id "%s"; '
+                     'gene_name "G%d"; level 2;\n'
+                     % (chrom, start, start + 5000, gene_id, gene))
+        lines.append('%s\tHAVANA\ttranscript\t%d\t%d\t.\t+\t.\tgene_id "%s"; '
+                     'transcript_id "%s"; tag "basic";\n'
+                     % (chrom, start, start + 5000, gene_id, transcript_id))
+        for exon in range(rng.randint(1, 4)):
+            exon_start = start + exon * 1000
+            lines.append('%s\tHAVANA\texon\t%d\t%d\t.\t+\t.\tgene_id "%s"; '
+                         'transcript_id "%s"; exon_number %d;\n'
+                         % (chrom, exon_start,
+                            exon_start + rng.randint(10, 900), gene_id,
+                            transcript_id, exon + 1))
+        if gene % 50 == 0:
+            lines.append("# gene %d done\n" % gene)
+    return "".join(lines)
+
+def fields(rec):
+    """Returns the fields of a record, with its attributes as a dict."""
+    return (rec.seqid, rec.source, rec.type, rec.start, rec.end, rec.score,
+            rec.strand, rec.phase, dict(rec.attributes))
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# gff tests: the block, lazy and parallel readers against Reader, and
+# Writer and BatchWriter output.
+
+import os, sys, unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import gff
+from gtf_data import GTF, GFF3, synthetic_gtf, fields
+
+# Writer output of the records of GTF, as written by the original Writer
+GTF_V2 = (
+    '##gff-version 2\n'
+    'chr1\tHAVANA\tgene\t11869\t14409\t.\t+\t.\tgene_id "G1"; gene_type "pseudogene"; level "2";\n'
+    'chr1\tHAVANA\ttranscript\t11869\t14409\t.\t+\t.\tgene_id "G1"; tag "basic" "CCDS"; transcript_id "T1";\n'
+    'chr1\tHAVANA\texon\t11869\t12227\t.\t+\t.\texon_number "1"; gene_id "G1"; transcript_id "T1";\n'
+    'chr1\tHAVANA\texon\t12613\t12721\t0.5\t+\t.\texon_number "2"; gene_id "G1"; note "a;b"; transcript_id "T1";\n'
+    'chr2\tENSEMBL\tCDS\t100\t200\t.\t-\t0\tgene_id "G2"; transcript_id "T2";\n'
+    'chr2\tENSEMBL\texon\t50\t400\t.\t-\t.\tgene_id "G2"; transcript_id "T2";\n'
+)
+GTF_V22 = (
+    '##gff-version 2.2\n'
+    'chr1\tHAVANA\tgene\t11869\t14409\t.\t+\t.\tgene_id "G1"; transcript_id ""; gene_type "pseudogene"; level "2";\n'
+    'chr1\tHAVANA\ttranscript\t11869\t14409\t.\t+\t.\tgene_id "G1"; transcript_id "T1"; tag "basic" "CCDS";\n'
+    'chr1\tHAVANA\texon\t11869\t12227\t.\t+\t.\tgene_id "G1"; transcript_id "T1"; exon_number "1";\n'
+    'chr1\tHAVANA\texon\t12613\t12721\t0.5\t+\t.\tgene_id "G1"; transcript_id "T1"; note "a;b"; exon_number "2";\n'
+    'chr2\tENSEMBL\tCDS\t100\t200\t.\t-\t0\tgene_id "G2"; transcript_id "T2";\n'
+    'chr2\tENSEMBL\texon\t50\t400\t.\t-\t.\tgene_id "G2"; transcript_id "T2";\n'
+)
+GFF3_V3 = (
+    '##gff-version 3\n'
+    'ctg1\tsrc\tgene\t1\t30\t.\t+\t.\tID=gene1;Name=Gene 1\n'
+    'ctg1\tsrc\tmRNA\t1\t30\t.\t+\t.\tNote=x,y;ID=mrna1;Parent=gene1\n'
+    'ctg1\tsrc\texon\t5\t20\t.\t+\t.\tParent=mrna1\n'
+)
+
+def read(reader_class, text, version="2", **kwargs):
+    reader = reader_class(StringIO(text), version, **kwargs)
+    recs = [fields(rec) for rec in reader]
+    return recs, reader
+
+class TestReaders(unittest.TestCase):
+    def assertSameAsReader(self, text, version="2", **readers):
+        expected, reader = read(gff.Reader, text, version)
+        self.assertTrue(expected)
+        for name, (reader_class, kwargs) in readers.items():
+            recs, other = read(reader_class, text, version, **kwargs)
+            self.assertEqual(recs, expected, name)
+            self.assertEqual(other.get_version(), reader.get_version())
+            self.assertEqual([(m.name, m.value) for m in other.get_metadata()],
+                             [(m.name, m.value) for m in reader.get_metadata()])
+            self.assertEqual(other.get_comments(), reader.get_comments())
+
+    def test_gtf(self):
+        self.assertSameAsReader(
+            GTF, chunked=(gff.ChunkedReader, {"block_size": 7}),
+            parallel=(gff.ParallelReader, {"processes": 2, "block_size": 50}))
+
+    def test_gff3(self):
+        self.assertSameAsReader(
+            GFF3, "3", chunked=(gff.ChunkedReader, {"block_size": 11}),
+            parallel=(gff.ParallelReader, {"processes": 2, "block_size": 30}))
+
+    def test_synthetic(self):
+        text = synthetic_gtf(500)
+        self.assertSameAsReader(
+            text, chunked=(gff.ChunkedReader, {"block_size": 4096}),
+            parallel=(gff.ParallelReader, {"processes": 3,
+                                           "block_size": 8192}))
+
+    def test_no_final_newline(self):
+        self.assertSameAsReader(
+            GTF.rstrip("\n"), chunked=(gff.ChunkedReader, {"block_size": 5}),
+            parallel=(gff.ParallelReader, {"processes": 1, "block_size": 5}))
+
+    def test_compact_record(self):
+        rec = gff.ChunkedReader(StringIO(GTF)).next()
+        self.assertEqual(fields(rec.to_record()), fields(rec))
+        copy = rec.copy()
+        copy.attributes["gene_id"].append("x")
+        self.assertEqual(rec.attributes["gene_id"], ["G1"])
+
+    def test_malformed_attributes(self):
+        text = 'chr1\tx\texon\t1\t2\t.\t+\t.\tgene_id "G1; transcript_id "T1";\n'
+        for reader_class in (gff.Reader, gff.ChunkedReader):
+            rec = reader_class(StringIO(text)).next()
+            self.assertRaises(gff.FormatError,
+                              lambda: rec.attributes["gene_id"])
+
+class TestLazyAttributes(unittest.TestCase):
+    def test_fast_lookup(self):
+        s = 'gene_id "G1"; transcript_id "T1"; tag "a"; tag "b";'
+        attributes = gff.LazyAttributes(s)
+        self.assertEqual(attributes["transcript_id"], ["T1"])
+        self.assertEqual(attributes["gene_id"], ["G1"])
+        self.assertFalse(attributes._complete)
+        self.assertEqual(attributes["tag"], ["a", "b"])
+        self.assertEqual(dict(attributes), gff.parse_attributes_v2_faster(s))
+
+    def test_repeated_tag(self):
+        attributes = gff.LazyAttributes('transcript_id "T1"; transcript_id "T2";')
+        self.assertEqual(attributes["transcript_id"], ["T1", "T2"])
+        for s in ('gene_id foo; gene_id "bar";',
+                  'gene_id "a" "b"; gene_id "c";'):
+            self.assertEqual(gff.LazyAttributes(s)["gene_id"],
+                             gff.parse_attributes_v2_faster(s)["gene_id"])
+
+    def test_tag_in_value(self):
+        attributes = gff.LazyAttributes('note "transcript_id"; transcript_id "T1";')
+        self.assertEqual(attributes["transcript_id"], ["T1"])
+
+    def test_malformed(self):
+        attributes = gff.LazyAttributes('gene_id "G1"; transcript_id "T1')
+        self.assertRaises(gff.FormatError, lambda: attributes["gene_id"])
+        self.assertRaises(gff.FormatError, lambda: attributes["gene_id"])
+
+class TestWriters(unittest.TestCase):
+    def write(self, writer_class, recs, version, **kwargs):
+        out = StringIO()
+        writer = writer_class(out, version, **kwargs)
+        writer.write_recs(recs)
+        if hasattr(writer, "flush"):
+            writer.flush()
+        return out.getvalue()
+
+    def test_writer(self):
+        recs = gff.Reader(StringIO(GTF)).read_recs()
+        self.assertEqual(self.write(gff.Writer, recs, "2"), GTF_V2)
+        self.assertEqual(self.write(gff.Writer, recs, "2.2"), GTF_V22)
+        recs = gff.Reader(StringIO(GFF3), "3").read_recs()
+        self.assertEqual(self.write(gff.Writer, recs, "3"), GFF3_V3)
+
+    def test_batch_writer(self):
+        for text, version in [(GTF, "2"), (GTF, "2.2"), (GFF3, "3"),
+                              (synthetic_gtf(300), "2")]:
+            recs = list(gff.ChunkedReader(StringIO(text), version[0]))
+            expected = self.write(gff.Writer, recs, version)
+            for batch_lines in (1, 3, gff.DEFAULT_BATCH_LINES):
+                self.assertEqual(self.write(gff.BatchWriter, recs, version,
+                                            batch_lines=batch_lines),
+                                 expected)
+
+    def test_write_columns(self):
+        recs = gff.Reader(StringIO(GTF)).read_recs()
+        columns = dict((name, [getattr(rec, name) for rec in recs])
+                       for name in ("seqid", "source", "type", "start", "end",
+                                    "score", "strand", "phase", "attributes"))
+        out = StringIO()
+        writer = gff.BatchWriter(out, "2")
+        writer.write_columns(columns)
+        writer.flush()
+        self.assertEqual(out.getvalue(), GTF_V2)
+
+class TestFasta(unittest.TestCase):
+    def test_stream(self):
+        reader = gff.Reader(StringIO(GFF3), "3")
+        self.assertEqual(len(reader.read_recs()), 3)
+        self.assertTrue(reader.has_fasta())
+        self.assertEqual(list(reader.iter_fasta()),
+                         [("ctg1", "ACGTACGTACGGGGCCCCAATTTT"),
+                          ("ctg2", "NNNN")])
+        self.assertEqual(reader.get_fasta_string(),
+                         GFF3[GFF3.index(">"):])
+
+    def test_fetch(self):
+        reader = gff.ChunkedReader(StringIO(GFF3), "3", block_size=16)
+        list(reader)
+        self.assertEqual(reader.fetch_fasta("ctg1", 9, 12), "ACGG")
+        self.assertEqual(reader.fetch_fasta("ctg1", 21), "TTTT")
+        self.assertEqual(reader.fetch_fasta("ctg2"), "NNNN")
+        self.assertRaises(KeyError, reader.fetch_fasta, "ctg3")
+
+if __name__ == '__main__':
+    unittest.main()
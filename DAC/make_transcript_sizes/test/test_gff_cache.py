@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# gff_cache tests: cached columns against gff.load_columns, and eviction.
+
+import os, sys, gzip, shutil, tempfile, unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import gff
+import gff_cache
+from gtf_data import GTF, synthetic_gtf
+
+class TestColumnCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.dir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def gtf(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def assertSameColumns(self, columns, expected):
+        self.assertEqual(len(columns), len(expected))
+        self.assertEqual(columns.attribute_name, expected.attribute_name)
+        for name in ("seqid", "type", "attribute"):
+            self.assertEqual(getattr(columns, name).labels,
+                             getattr(expected, name).labels)
+            self.assertEqual(getattr(columns, name).codes.tolist(),
+                             getattr(expected, name).codes.tolist())
+        for name in ("start", "end", "strand"):
+            self.assertEqual(getattr(columns, name).tolist(),
+                             getattr(expected, name).tolist())
+
+    def test_round_trip(self):
+        text = synthetic_gtf(200)
+        path = self.gtf("a.gtf", text)
+        expected = gff.load_columns(StringIO(text), "transcript_id")
+        cache = gff_cache.ColumnCache(self.cache_dir)
+        self.assertSameColumns(cache.load(path), expected)
+        self.assertEqual(len(cache.entries()), 1)
+
+        # A hit is read back from the cache, not parsed again
+        def opener(path):
+            raise AssertionError("parsed on a cache hit")
+        self.assertSameColumns(cache.load(path, opener=opener), expected)
+        self.assertSameColumns(
+            gff_cache.ColumnCache(self.cache_dir).load(path, opener=opener),
+            expected)
+
+    def test_options(self):
+        path = self.gtf("a.gtf", GTF)
+        cache = gff_cache.ColumnCache(self.cache_dir)
+        columns = cache.load(path, attribute="gene_id")
+        self.assertSameColumns(columns,
+                               gff.load_columns(StringIO(GTF), "gene_id"))
+        cache.load(path)
+        self.assertEqual(len(cache.entries()), 2)
+        columns = cache.load(path, attribute_types=("exon",))
+        self.assertSameColumns(columns, gff.load_columns(
+            StringIO(GTF), attribute_types=("exon",)))
+        self.assertEqual(len(cache.entries()), 3)
+
+    def test_gzipped(self):
+        text = synthetic_gtf(50)
+        path = os.path.join(self.dir, "a.gtf.gz")
+        f = gzip.open(path, 'wb')
+        f.write(text)
+        f.close()
+        cache = gff_cache.ColumnCache(self.cache_dir)
+        self.assertSameColumns(cache.load(path, opener=gzip.open),
+                               gff.load_columns(StringIO(text)))
+
+    def test_changed_file(self):
+        path = self.gtf("a.gtf", GTF)
+        cache = gff_cache.ColumnCache(self.cache_dir)
+        cache.load(path)
+        text = synthetic_gtf(20)
+        self.gtf("a.gtf", text)
+        os.utime(path, (0, 0))
+        self.assertSameColumns(cache.load(path),
+                               gff.load_columns(StringIO(text)))
+
+    def test_invalidate(self):
+        cache = gff_cache.ColumnCache(self.cache_dir)
+        a = self.gtf("a.gtf", GTF)
+        cache.load(a)
+        cache.load(self.gtf("b.gtf", synthetic_gtf(10)))
+        cache.invalidate(a)
+        self.assertEqual([meta["source"] for key, meta in cache.entries()],
+                         [os.path.realpath(os.path.join(self.dir, "b.gtf"))])
+        cache.invalidate()
+        self.assertEqual(cache.entries(), [])
+
+    def test_evict(self):
+        paths = [self.gtf("%d.gtf" % i, synthetic_gtf(100, seed=i))
+                 for i in range(3)]
+        cache = gff_cache.ColumnCache(self.cache_dir)
+        cache.load(paths[0])
+        entry_bytes = max(
+            sum(os.path.getsize(os.path.join(self.cache_dir, key, name))
+                for name in os.listdir(os.path.join(self.cache_dir, key)))
+            for key, meta in cache.entries())
+        cache.max_bytes = entry_bytes * 2.5
+
+        def sources():
+            return sorted(os.path.basename(meta["source"])
+                          for key, meta in cache.entries())
+        cache.load(paths[1])
+        self.assertEqual(sources(), ["0.gtf", "1.gtf"])
+        # Using 0.gtf makes 1.gtf the least recently used
+        for key, meta in cache.entries():
+            if meta["source"].endswith("/1.gtf"):
+                meta_path = os.path.join(self.cache_dir, key,
+                                         gff_cache.META_FILE)
+                os.utime(meta_path, (1, 1))
+        cache.load(paths[2])
+        self.assertEqual(sources(), ["0.gtf", "2.gtf"])
+
+        # The entry just loaded is kept even when it alone is too big
+        cache.max_bytes = 0
+        cache.load(paths[1])
+        self.assertEqual(sources(), ["1.gtf"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# gff_index tests: AnnotationIndex queries against brute force.
+
+import os, sys, random, unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import gff
+import gff_index
+
+def random_records(count, seed=0):
+    """Returns count records on two seqids, many of them nested."""
+    rng = random.Random(seed)
+    recs = []
+    for i in range(count):
+        start = rng.randint(1, 5000)
+        length = rng.choice([1, rng.randint(1, 50), rng.randint(1, 2000)])
+        recs.append(gff.Record(rng.choice(["chr1", "chr2"]), "test",
+                               rng.choice(["gene", "exon"]), start,
+                               start + length - 1,
+                               attributes={"ID": ["r%d" % i]}))
+    return recs
+
+def ids(recs):
+    return sorted(rec.attributes["ID"][0] for rec in recs)
+
+def brute_overlap(recs, seqid, start, end):
+    return [rec for rec in recs if rec.seqid == seqid and
+            rec.start <= end and rec.end >= start]
+
+def brute_nearest(recs, seqid, start, end):
+    distances = []
+    for rec in recs:
+        if rec.seqid != seqid:
+            continue
+        distances.append((max(0, rec.start - end, start - rec.end), rec))
+    if not distances:
+        return None, []
+    distance = min(d for d, rec in distances)
+    return distance, [rec for d, rec in distances if d == distance]
+
+class TestAnnotationIndex(unittest.TestCase):
+    def setUp(self):
+        self.recs = random_records(1000)
+        self.index = gff_index.AnnotationIndex(self.recs)
+        self.rng = random.Random(1)
+
+    def queries(self, count):
+        for i in range(count):
+            start = self.rng.randint(-100, 7500)
+            yield (self.rng.choice(["chr1", "chr2", "chr3"]), start,
+                   start + self.rng.choice([0, 10, 500]))
+
+    def test_len(self):
+        self.assertEqual(len(self.index), len(self.recs))
+        self.assertEqual(self.index.seqids(), ["chr1", "chr2"])
+
+    def test_overlap(self):
+        for seqid, start, end in self.queries(500):
+            hits = self.index.overlap(seqid, start, end)
+            self.assertEqual(ids(hits),
+                             ids(brute_overlap(self.recs, seqid, start, end)))
+            self.assertEqual([rec.start for rec in hits],
+                             sorted(rec.start for rec in hits))
+
+    def test_point(self):
+        for seqid, start, end in self.queries(200):
+            self.assertEqual(
+                ids(self.index.overlap(seqid, start)),
+                ids(brute_overlap(self.recs, seqid, start, start)))
+
+    def test_nearest(self):
+        for seqid, start, end in self.queries(500):
+            distance, hits = self.index.nearest(seqid, start, end)
+            expected_distance, expected = brute_nearest(self.recs, seqid,
+                                                        start, end)
+            self.assertEqual(distance, expected_distance)
+            self.assertEqual(ids(hits), ids(expected))
+
+    def test_types(self):
+        index = gff_index.AnnotationIndex(self.recs, types=["exon"])
+        exons = [rec for rec in self.recs if rec.type == "exon"]
+        for seqid, start, end in self.queries(100):
+            self.assertEqual(ids(index.overlap(seqid, start, end)),
+                             ids(brute_overlap(exons, seqid, start, end)))
+
+    def test_query_bed(self):
+        stream = StringIO()
+        gff.Writer(stream, "3").write_recs(self.recs)
+        index = gff_index.AnnotationIndex.from_stream(
+            StringIO(stream.getvalue()), version="3")
+        bed = StringIO("track name=test\nchr1\t99\t200\tx\nchr2\t0\t1\n")
+        results = [(chrom, start, end, ids(hits))
+                   for chrom, start, end, hits in index.query_bed(bed)]
+        self.assertEqual(results, [
+            ("chr1", 100, 200, ids(brute_overlap(self.recs, "chr1", 100, 200))),
+            ("chr2", 1, 1, ids(brute_overlap(self.recs, "chr2", 1, 1)))])
+
+    def test_bad_bed(self):
+        self.assertRaises(gff.FormatError, list,
+                          gff_index.read_bed_regions(StringIO("chr1\t1\n")))
+        self.assertRaises(gff.FormatError, list,
+                          gff_index.read_bed_regions(StringIO("chr1\tx\t2\n")))
+
+if __name__ == '__main__':
+    unittest.main()
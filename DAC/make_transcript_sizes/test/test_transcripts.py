@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# transcripts tests: lengths from parallel_lengths and from columns
+# against one Reader.
+
+import os, sys, gzip, shutil, tempfile, unittest
+from StringIO import StringIO
+from distutils.spawn import find_executable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import gff
+import transcripts
+from gtf_data import synthetic_gtf
+
+def merge(partials):
+    lengths = {}
+    order = []
+    for partial in partials:
+        for transcript_id, length in partial:
+            if transcript_id not in lengths:
+                order.append(transcript_id)
+                lengths[transcript_id] = 0
+            lengths[transcript_id] += length
+    return [(transcript_id, lengths[transcript_id]) for transcript_id in order]
+
+class TestParallelLengths(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.text = synthetic_gtf(400)
+        self.expected = merge([transcripts.partial_lengths(
+            gff.Reader(StringIO(self.text)))])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_plain(self):
+        path = os.path.join(self.dir, "a.gtf")
+        with open(path, 'w') as f:
+            f.write(self.text)
+        self.assertEqual(merge(transcripts.parallel_lengths(path, 2)),
+                         self.expected)
+
+    def test_gzipped(self):
+        path = os.path.join(self.dir, "a.gtf.gz")
+        f = gzip.open(path, 'wb')
+        f.write(self.text)
+        f.close()
+        self.assertEqual(merge(transcripts.parallel_lengths(path, 2)),
+                         self.expected)
+
+    @unittest.skipUnless(find_executable('pigz'), "needs pigz")
+    def test_truncated_gzip(self):
+        path = os.path.join(self.dir, "a.gtf.gz")
+        f = gzip.open(path, 'wb')
+        f.write(self.text)
+        f.close()
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        self.assertRaises(IOError, list, transcripts.parallel_lengths(path, 2))
+        self.assertRaises(IOError, transcripts.partial_lengths,
+                          gff.ChunkedReader(transcripts.open_gtf(path)))
+
+    def test_line_ranges(self):
+        path = os.path.join(self.dir, "a.gtf")
+        with open(path, 'w') as f:
+            f.write(self.text)
+        ranges = transcripts.line_ranges(path, 7)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(self.text))
+        for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(self.text[end - 1], "\n")
+
+    def test_line_chunks(self):
+        chunks = list(transcripts.line_chunks(StringIO(self.text), 1000))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual("".join(chunks), self.text)
+        self.assertTrue(all(chunk.endswith("\n") for chunk in chunks))
+
+class TestColumnar(unittest.TestCase):
+    def test_sum_lengths(self):
+        text = synthetic_gtf(400)
+        expected = merge([transcripts.partial_lengths(
+            gff.Reader(StringIO(text)))])
+        for attribute_types in (None, transcripts.EXON_TYPES):
+            columns = gff.load_columns(StringIO(text), "transcript_id",
+                                       attribute_types=attribute_types)
+            transcript_ids, lengths = columns.sum_lengths(
+                transcripts.EXON_TYPES)
+            self.assertEqual(zip(transcript_ids, lengths.tolist()), expected)
+        # Other records hold no value
+        self.assertRaises(KeyError, columns.sum_lengths, ("transcript",))
+
+    def test_missing_attribute(self):
+        columns = gff.load_columns(StringIO(synthetic_gtf(10)), "exon_id")
+        self.assertRaises(KeyError, columns.sum_lengths, transcripts.EXON_TYPES)
+
+if __name__ == '__main__':
+    unittest.main()
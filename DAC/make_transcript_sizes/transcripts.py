@@ -1,20 +1,234 @@
 #!/usr/bin/env python
 import gff
-import sys
-from collections import defaultdict
+import gff_cache
+import os
+import gzip
+import argparse
+import subprocess
+import multiprocessing
+from StringIO import StringIO
+from collections import defaultdict, deque
 
-reader =  gff.Reader(open(sys.argv[1]))
+# Types of records whose lengths add up to a transcript's length
+EXON_TYPES = ("exon", "tRNAscan")
 
-#Summing the lengths of transcripts should be something like:
+# Number of byte ranges (or decompressed chunks) handed to each process
+CHUNKS_PER_PROCESS = 4
+GZIP_CHUNK_SIZE = 32 * 1024 * 1024
 
+def get_args():
+	ap = argparse.ArgumentParser(description="Sums exon lengths per transcript_id in a GTF file")
+	ap.add_argument('gtf', help='GTF file (may be gzipped)')
+	ap.add_argument('-p', '--processes', type=int, default=1,
+	                help='Number of worker processes to parse with (default: 1)')
+	ap.add_argument('--columnar', action='store_true',
+	                help='Load columns into NumPy arrays and sum lengths vectorized (ignores --processes). '
+	                     'Parsing the columns takes longer than the default loop, so this only pays off with --cache')
+	ap.add_argument('--cache', action='store_true',
+	                help='Reuse parsed columns from the column cache (implies --columnar)')
+	ap.add_argument('--cache-dir', default=gff_cache.DEFAULT_CACHE_DIR,
+	                help="Column cache directory, may be shared (default: $GFF_CACHE_DIR or '%s')"
+	                % gff_cache.DEFAULT_CACHE_DIR)
+	return ap.parse_args()
 
-transcript_lengths = defaultdict(int)
-for record in reader:
-	if record.type == "exon" or record.type == "tRNAscan":
-		transcript_id = record.attributes["transcript_id"][0]
-		exon_length = record.end - record.start + 1
-		transcript_lengths[transcript_id] += exon_length
+def is_gzipped(path):
+	with open(path, 'rb') as f:
+		return f.read(2) == '\x1f\x8b'
 
-for tnx in transcript_lengths.keys():
-	print "%s\t%s" % (tnx, transcript_lengths[tnx])
+class PigzStream:
+	"""Output of pigz -dc on a file, read to its end.
 
+	pigz can stop at a line boundary on a corrupt file, so reaching the
+	end of its output waits for it and raises IOError if it failed.
+	Closing the stream before its end stops pigz without checking.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self._process = subprocess.Popen(['pigz', '-dc', path], stdout=subprocess.PIPE)
+		self._done = False
+
+	def read(self, size=-1):
+		data = self._process.stdout.read(size)
+		if not data and size != 0:
+			self._finish()
+		return data
+
+	def readline(self):
+		line = self._process.stdout.readline()
+		if not line:
+			self._finish()
+		return line
+
+	def __iter__(self):
+		return iter(self.readline, '')
+
+	def _finish(self):
+		if self._done:
+			return
+		self._done = True
+		self._process.stdout.close()
+		if self._process.wait():
+			raise IOError("pigz failed on %s with exit status %d"
+			              % (self.path, self._process.returncode))
+
+	def close(self):
+		if not self._done:
+			self._done = True
+			self._process.stdout.close()
+			self._process.wait()
+
+def open_gtf(path):
+	"""Opens a plain or gzipped GTF, decompressing with pigz when available."""
+	if not is_gzipped(path):
+		return open(path)
+	try:
+		return PigzStream(path)
+	except OSError:
+		return gzip.open(path)
+
+def partial_lengths(reader):
+	"""Returns (transcript_id, length) pairs in order of first appearance."""
+	lengths = {}
+	order = []
+	for record in reader:
+		if record.type in EXON_TYPES:
+			transcript_id = record.attributes["transcript_id"][0]
+			exon_length = record.end - record.start + 1
+			if transcript_id in lengths:
+				lengths[transcript_id] += exon_length
+			else:
+				lengths[transcript_id] = exon_length
+				order.append(transcript_id)
+	return [(transcript_id, lengths[transcript_id]) for transcript_id in order]
+
+class ByteRange:
+	"""Read-only view of bytes [start, end) of a file."""
+
+	def __init__(self, path, start, end):
+		self._file = open(path)
+		self._file.seek(start)
+		self._remaining = end - start
+
+	def read(self, size=-1):
+		if size < 0 or size > self._remaining:
+			size = self._remaining
+		data = self._file.read(size)
+		self._remaining -= len(data)
+		return data
+
+	def close(self):
+		self._file.close()
+
+def line_ranges(path, count):
+	"""Splits a file into at most count byte ranges that start at line starts."""
+	size = os.path.getsize(path)
+	bounds = [0]
+	with open(path) as f:
+		for i in range(1, count):
+			f.seek(max(size * i / count, bounds[-1]))
+			if f.tell() > 0:
+				f.seek(f.tell() - 1)
+				f.readline()
+			if f.tell() >= size:
+				break
+			if f.tell() > bounds[-1]:
+				bounds.append(f.tell())
+	bounds.append(size)
+	return zip(bounds[:-1], bounds[1:])
+
+def range_lengths(args):
+	path, start, end, version = args
+	stream = ByteRange(path, start, end)
+	try:
+		return partial_lengths(gff.ChunkedReader(stream, version))
+	finally:
+		stream.close()
+
+def chunk_lengths(args):
+	chunk, version = args
+	return partial_lengths(gff.ChunkedReader(StringIO(chunk), version))
+
+def line_chunks(stream, chunk_size=GZIP_CHUNK_SIZE):
+	"""Yields blocks of whole lines read from a stream."""
+	partial = ""
+	while True:
+		block = stream.read(chunk_size)
+		if not block:
+			break
+		block = partial + block
+		cut = block.rfind("\n") + 1
+		partial = block[cut:]
+		if cut:
+			yield block[:cut]
+	if partial:
+		yield partial
+
+def ordered_map(pool, func, tasks, window):
+	"""Like pool.imap, but keeps at most window tasks in flight."""
+	pending = deque()
+	for task in tasks:
+		pending.append(pool.apply_async(func, (task,)))
+		if len(pending) >= window:
+			yield pending.popleft().get()
+	while pending:
+		yield pending.popleft().get()
+
+def parallel_lengths(path, processes):
+	"""Parses a GTF across worker processes, returning partial maps in file order."""
+	stream = open_gtf(path)
+	version = gff.ChunkedReader(stream).get_version()
+	stream.close()
+
+	pool = multiprocessing.Pool(processes)
+	try:
+		if is_gzipped(path):
+			# gzip cannot be split by byte offset, so decompress in a
+			# separate (pigz) process and hand out blocks of lines
+			stream = open_gtf(path)
+			tasks = ((chunk, version) for chunk in line_chunks(stream))
+			partials = ordered_map(pool, chunk_lengths, tasks, processes * 2)
+		else:
+			tasks = [(path, start, end, version) for start, end in
+			         line_ranges(path, processes * CHUNKS_PER_PROCESS)]
+			partials = ordered_map(pool, range_lengths, tasks, len(tasks))
+		for partial in partials:
+			yield partial
+	finally:
+		pool.terminate()
+		pool.join()
+
+def main():
+	args = get_args()
+
+	transcript_lengths = defaultdict(int)
+	if args.columnar or args.cache:
+		if args.cache:
+			cache = gff_cache.ColumnCache(args.cache_dir)
+			columns = cache.load(args.gtf, attribute="transcript_id", opener=open_gtf,
+			                     attribute_types=EXON_TYPES)
+		else:
+			columns = gff.load_columns(open_gtf(args.gtf), attribute="transcript_id",
+			                           attribute_types=EXON_TYPES)
+		transcript_ids, lengths = columns.sum_lengths(EXON_TYPES)
+		for transcript_id, exon_length in zip(transcript_ids, lengths.tolist()):
+			transcript_lengths[transcript_id] = exon_length
+	elif args.processes > 1:
+		# Merging in file order inserts transcript ids in the same order as
+		# the serial loop, so the output is identical
+		for partial in parallel_lengths(args.gtf, args.processes):
+			for transcript_id, exon_length in partial:
+				transcript_lengths[transcript_id] += exon_length
+	else:
+		reader = gff.ChunkedReader(open_gtf(args.gtf))
+		for record in reader:
+			if record.type in EXON_TYPES:
+				transcript_id = record.attributes["transcript_id"][0]
+				exon_length = record.end - record.start + 1
+				transcript_lengths[transcript_id] += exon_length
+
+	for tnx in transcript_lengths.keys():
+		print "%s\t%s" % (tnx, transcript_lengths[tnx])
+
+if __name__ == '__main__':
+	main()
@@ -21,6 +21,7 @@ print sys.path
 print subprocess.check_output(['ls','-l'])
 
 from dxencode import dxencode as dxencode
+from dcc import encoded, metadata
 
 logger = logging.getLogger("Applet")
 
@@ -59,16 +60,23 @@ def main(accession, key=None, debug=False):
 
     exp = response.json()
 
-    for ff in exp.get('original_files', []):
+    # Look up all of the original files with a batched search rather than
+    # one request each
+    original_files = exp.get('original_files', [])
+    session = encoded.new_session(AUTHID, AUTHPW)
+    f_objs = metadata.get_objects(session, SERVER,
+                                  [metadata.path_accession(ff) for ff in original_files])
+
+    for ff in original_files:
+        file_acc = metadata.path_accession(ff)
         try:
-            fr = dxencode.encoded_get(SERVER+ff, AUTHID, AUTHPW)
-            ff = fr.json()
+            ff = f_objs[file_acc]
             if ff['status'] != 'uploading':
                 continue
             notes = json.loads(ff['notes'])
             dxid = notes['dx-id']
         except Exception, e:
-            logger.error("Error getting dx id: %s for %s" % (e, ff['accession']))
+            logger.error("Error getting dx id: %s for %s" % (e, file_acc))
             continue
 
         dx_file = dxpy.DXFile(dxid)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# Benchmark ENCODE request throughput with a pooled dcc.encoded session
+# against a requests.get per call, using a local stand-in for the portal.
+
+import os
+import sys
+import time
+import argparse
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from dcc import encoded
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "dcc", "test"))
+from fake_encoded import FakeEncoded
+
+def per_call_get(url):
+    return requests.get(url, headers=encoded.HEADERS)
+
+def run(get, urls, threads):
+    pool = ThreadPool(threads)
+    try:
+        start = time.time()
+        for response in pool.imap_unordered(get, urls):
+            response.content
+        return time.time() - start
+    finally:
+        pool.terminate()
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare pooled and per-call ENCODE request throughput")
+    ap.add_argument('--requests', type=int, default=2000,
+                    help='Number of requests per run (default: 2000)')
+    ap.add_argument('--threads', type=int, nargs='+', default=[1, 8],
+                    help='Numbers of concurrent threads to run with (default: 1 8)')
+    ap.add_argument('--delay', type=float, default=0.0,
+                    help='Server latency added to each request in seconds (default: 0)')
+    ap.add_argument('--fail-every', type=int, default=0,
+                    help='Answer every Nth request with a 503 (default: never)')
+    args = ap.parse_args()
+
+    objects = dict(("ENCFF%06d" % i, {"accession": "ENCFF%06d" % i,
+                                      "file_format": "bed", "status": "released"})
+                   for i in range(100))
+    server = FakeEncoded(objects, delay=args.delay).start()
+    urls = [server.url + "ENCFF%06d/?frame=embedded" % (i % 100)
+            for i in range(args.requests)]
+    def failures():
+        if not args.fail_every:
+            return []
+        return [503 if i % args.fail_every == 0 else None
+                for i in range(1, args.requests + 1)]
+
+    print "\t".join(["client", "threads", "requests", "seconds", "requests/s",
+                     "failed", "latency"])
+    try:
+        for threads in args.threads:
+            for name in ("per-call", "pooled"):
+                failed = [0]
+                server.failures = failures()
+                if name == "pooled":
+                    metrics = encoded.RequestMetrics()
+                    session = encoded.new_session(pool_size=threads,
+                                                  backoff=0.01, metrics=metrics)
+                    get = session.get
+                else:
+                    metrics = None
+                    get = per_call_get
+                def counted_get(url):
+                    response = get(url)
+                    if response.status_code != 200:
+                        failed[0] += 1
+                    return response
+                elapsed = run(counted_get, urls, threads)
+                latency = str(metrics) if metrics else ""
+                print "%s\t%d\t%d\t%.2f\t%.0f\t%d\t%s" % (
+                    name, threads, len(urls), elapsed, len(urls) / elapsed,
+                    failed[0], latency)
+                if name == "pooled":
+                    session.close()
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
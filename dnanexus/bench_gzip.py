@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# Benchmark dcc.compress parallel gzip against the gzip command at the
+# same level, checking that gzip -dc reads back every output.
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+from dcc import compress, download
+
+def make_bed(path, size):
+    """Writes about size bytes of bedMethyl-like lines to path."""
+    with open(path, 'wb') as f:
+        written = 0
+        start = 10000
+        while written < size:
+            lines = "".join(
+                "chr1\t%d\t%d\t.\t%d\t+\t%d\t%d\t0,255,0\t%d\t%d\n" %
+                (pos, pos + 1, pos % 1000, pos, pos + 1, pos % 97, pos % 101)
+                for pos in range(start, start + 100000, 7))
+            f.write(lines)
+            written += len(lines)
+            start += 100000
+
+def md5_of_gunzip(path):
+    process = subprocess.Popen(["gzip", "-dc", path], stdout=subprocess.PIPE)
+    md5 = hashlib.md5()
+    for block in iter(lambda: process.stdout.read(1024 * 1024), ''):
+        md5.update(block)
+    if process.wait():
+        raise subprocess.CalledProcessError(process.returncode, "gzip -dc")
+    return md5.hexdigest()
+
+def run_gzip(path, out, level, threads):
+    with open(out, 'wb') as f:
+        subprocess.check_call(["gzip", "-c", "-%d" % level, path], stdout=f)
+
+def run_parallel(path, out, level, threads, bgzf=False):
+    with open(path, 'rb') as f:
+        with open(out, 'wb') as o:
+            writer = compress.ParallelGzipWriter(o, level, threads, bgzf)
+            for block in iter(lambda: f.read(4 * 1024 * 1024), ''):
+                writer.write(block)
+            writer.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare parallel gzip with the gzip command")
+    ap.add_argument('input', nargs='?',
+                    help='File to compress (default: generated bedMethyl-like lines)')
+    ap.add_argument('--size', type=int, default=256,
+                    help='Size of the generated input in MB (default: 256)')
+    ap.add_argument('--level', type=int, default=compress.DEFAULT_LEVEL,
+                    help='Compression level (default: %d)' % compress.DEFAULT_LEVEL)
+    ap.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8],
+                    help='Numbers of threads to run with (default: 1 2 4 8)')
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = args.input
+        if not path:
+            path = os.path.join(tmp, "input.bed")
+            make_bed(path, args.size * 1024 * 1024)
+        size = os.path.getsize(path)
+        expected = download.file_md5(path)
+        out = os.path.join(tmp, "output.gz")
+
+        runs = [("gzip", 1, run_gzip)]
+        for threads in args.threads:
+            runs.append(("members", threads, run_parallel))
+            runs.append(("bgzf", threads,
+                         lambda p, o, l, t: run_parallel(p, o, l, t, True)))
+
+        print "\t".join(["compressor", "threads", "seconds", "MB/s", "ratio"])
+        for name, threads, run in runs:
+            start = time.time()
+            run(path, out, args.level, threads)
+            elapsed = time.time() - start
+            if md5_of_gunzip(out) != expected:
+                print >> sys.stderr, "%s output does not decompress to the input" % name
+                sys.exit(1)
+            print "%s\t%d\t%.2f\t%.1f\t%.3f" % (
+                name, threads, elapsed, size / elapsed / 1024 / 1024,
+                float(os.path.getsize(out)) / size)
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    main()
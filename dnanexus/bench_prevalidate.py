@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# Benchmark dcc.prevalidate, and dcc.bedvalidate on growing numbers of
+# processes, on synthetic bed, narrowPeak and bedMethyl files, and
+# validateFiles on the same files if it is on the PATH.
+
+import os
+import time
+import gzip
+import shutil
+import random
+import argparse
+import multiprocessing
+import tempfile
+import subprocess
+
+from dcc import bedvalidate, prevalidate
+
+AS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      "validate-files", "resources", "opt", "data",
+                      "encValData", "as")
+CHROM_SIZES = dict(("chr%d" % i, 250000000 - i * 5000000) for i in range(1, 23))
+
+FORMATS = {
+    "bed": (['-type=bed6+'],
+            lambda c, s, r: "%s\t%d\t%d\tpeak\t%d\t+\n" % (
+                c, s, s + 200, r.randint(0, 1000))),
+    "narrowPeak": (['-type=bed6+4', '-as=%s/narrowPeak.as' % AS_DIR],
+                   lambda c, s, r: "%s\t%d\t%d\t.\t0\t.\t%.5f\t-1\t%.5f\t%d\n" % (
+                       c, s, s + 300, r.random() * 50, r.random() * 10,
+                       r.randint(0, 300))),
+    "bedMethyl": (['-type=bed9+2', '-as=%s/bedMethyl.as' % AS_DIR],
+                  lambda c, s, r: "%s\t%d\t%d\t.\t%d\t+\t%d\t%d\t0,255,0\t%d\t%d\n" % (
+                      c, s, s + 1, r.randint(0, 1000), s, s + 1,
+                      r.randint(0, 500), r.randint(0, 100))),
+}
+
+def make_file(path, line, lines, error_at=None, compress=False):
+    rand = random.Random(0)
+    f = gzip.open(path, 'wb') if compress else open(path, 'wb')
+    with f:
+        for i in range(lines):
+            chrom = "chr%d" % (i * 22 // lines + 1)
+            if i == error_at:
+                chrom = "chrUn"
+            f.write(line(chrom, (i * 100) % 100000000, rand))
+
+def main():
+    ap = argparse.ArgumentParser(description="Time pre-validation of synthetic bed files")
+    ap.add_argument('--lines', type=int, default=1000000,
+                    help='Lines per file (default: 1000000)')
+    ap.add_argument('--formats', nargs='+', default=sorted(FORMATS),
+                    choices=sorted(FORMATS), help='Formats to test (default: all)')
+    ap.add_argument('--gzip', action='store_true',
+                    help='Compress the files, as they are posted')
+    ap.add_argument('--processes', type=int, nargs='+',
+                    default=sorted(set([1, multiprocessing.cpu_count()])),
+                    help='Numbers of bedvalidate processes (default: 1 and one per core)')
+    ap.add_argument('--error-at', type=int,
+                    help='Put an unknown chromosome on this line, to time failing fast')
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        chrom_sizes = os.path.join(tmp, "chrom.sizes")
+        with open(chrom_sizes, 'w') as f:
+            for chrom, size in sorted(CHROM_SIZES.items()):
+                f.write("%s\t%d\n" % (chrom, size))
+        have_validate_files = subprocess.call(
+            "which validateFiles", shell=True, stdout=open(os.devnull, 'w')) == 0
+
+        print "\t".join(["format", "lines", "MB", "checker", "seconds", "lines/s",
+                         "errors"])
+        for name in args.formats:
+            validate_args, line = FORMATS[name]
+            path = os.path.join(tmp, "%s.bed" % name) + (".gz" if args.gzip else "")
+            make_file(path, line, args.lines, args.error_at, args.gzip)
+            mb = os.path.getsize(path) / 1024.0 / 1024
+
+            start = time.time()
+            # Stop at the planted error, as a failing file would
+            errors = prevalidate.check(
+                path, validate_args, chrom_sizes, sample_lines=None,
+                max_errors=1 if args.error_at is not None
+                else prevalidate.DEFAULT_MAX_ERRORS)
+            elapsed = time.time() - start
+            checked = args.error_at + 1 if errors and args.error_at is not None \
+                else args.lines
+            print "%s\t%d\t%.1f\tprevalidate\t%.2f\t%.0f\t%d" % (
+                name, args.lines, mb, elapsed, checked / elapsed, len(errors))
+
+            for processes in args.processes:
+                start = time.time()
+                lines, errors = bedvalidate.validate(
+                    path, validate_args, chrom_sizes, processes=processes,
+                    max_errors=1 if args.error_at is not None
+                    else bedvalidate.DEFAULT_MAX_ERRORS)
+                elapsed = time.time() - start
+                print "%s\t%d\t%.1f\tbedvalidate x%d\t%.2f\t%.0f\t%d" % (
+                    name, args.lines, mb, processes, elapsed, lines / elapsed,
+                    len(errors))
+
+            if have_validate_files:
+                start = time.time()
+                process = subprocess.Popen(
+                    ['validateFiles'] + validate_args +
+                    ['-chromInfo=%s' % chrom_sizes, path],
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                out = process.communicate()[0]
+                elapsed = time.time() - start
+                print "%s\t%d\t%.1f\tvalidateFiles\t%.2f\t%.0f\t%s" % (
+                    name, args.lines, mb, elapsed, args.lines / elapsed,
+                    out.strip())
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+# Code shared by the ENCODE DCC applets and scripts.
+#
+# build_applets copies this package into each applet's
+# resources/home/dnanexus so that applet code can "import dcc" the same
+# way it imports dxencode.
@@ -0,0 +1,141 @@
+# Parsing of the autoSql (.as) table definitions that validateFiles -as
+# checks extra bed columns against, e.g. encValData/as/narrowPeak.as:
+#
+#   table narrowPeak
+#   "BED6+4 Peaks of signal enrichment based on pooled, normalized data."
+#   (
+#       string chrom;        "Reference sequence chromosome or scaffold"
+#       uint   chromStart;   "Start position in chromosome"
+#       ...
+#       char[1]  strand;     "+ or - or . for unknown"
+#       float  signalValue;  "Measurement of average enrichment for the region"
+#   )
+
+import re
+
+__all__ = ["AutoSqlError", "Field", "Table", "parse", "read"]
+
+_TOKEN = re.compile(r'\s*(?:("[^"\n]*"?)|([A-Za-z_][A-Za-z_0-9]*|-?\d+)|(\S))')
+
+class AutoSqlError(Exception):
+    """An autoSql definition could not be parsed."""
+    pass
+
+class Field:
+    """A column of an autoSql table.
+
+    type is the autoSql type (e.g. "uint", "char", "enum"), size the
+    array size if it is an array (a number, or the name of the field
+    holding it), and values the allowed values of an enum or set.
+    """
+
+    def __init__(self, type, name, comment="", size=None, values=None):
+        self.type = type
+        self.name = name
+        self.comment = comment
+        self.size = size
+        self.values = values
+
+    def __repr__(self):
+        size = "[%s]" % self.size if self.size is not None else ""
+        return "<Field %s%s %s>" % (self.type, size, self.name)
+
+class Table:
+    """An autoSql table: its name, comment and list of Fields."""
+
+    def __init__(self, name, comment, fields):
+        self.name = name
+        self.comment = comment
+        self.fields = fields
+
+    def field_names(self):
+        return [field.name for field in self.fields]
+
+    def __repr__(self):
+        return "<Table %s: %d fields>" % (self.name, len(self.fields))
+
+def _tokens(text):
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        pos = match.end()
+        quoted, word, punct = match.groups()
+        if quoted is not None:
+            # Comments left open are closed at the end of their line
+            yield ('"', quoted[1:].rstrip('"'))
+        elif word is not None:
+            yield ('w', word)
+        else:
+            yield (punct, punct)
+
+class _Parser:
+    def __init__(self, text):
+        self._tokens = list(_tokens(text))
+        self._pos = 0
+
+    def peek(self):
+        if self._pos < len(self._tokens):
+            return self._tokens[self._pos]
+        return (None, None)
+
+    def next(self, kind=None):
+        token = self.peek()
+        if token[0] is None:
+            raise AutoSqlError("Unexpected end of definition")
+        if kind is not None and token[0] != kind:
+            raise AutoSqlError("Expected %s, found %s" % (kind, token[1]))
+        self._pos += 1
+        return token[1]
+
+    def comment(self):
+        if self.peek()[0] == '"':
+            return self.next()
+        return ""
+
+    def table(self):
+        kind = self.next('w')
+        if kind not in ("table", "simple", "object"):
+            raise AutoSqlError("Expected table, found %s" % kind)
+        name = self.next('w')
+        comment = self.comment()
+        self.next('(')
+        fields = []
+        while self.peek()[0] != ')':
+            fields.append(self.field())
+        self.next(')')
+        return Table(name, comment, fields)
+
+    def field(self):
+        type = self.next('w')
+        size = values = None
+        if self.peek()[0] == '(':
+            # enum(a, b, c) or set(a, b, c)
+            self.next('(')
+            values = []
+            while self.peek()[0] != ')':
+                values.append(self.next('w'))
+                if self.peek()[0] == ',':
+                    self.next(',')
+            self.next(')')
+        if self.peek()[0] == '[':
+            self.next('[')
+            size = self.next('w')
+            if size.isdigit():
+                size = int(size)
+            self.next(']')
+        name = self.next('w')
+        # Index and auto-increment qualifiers are of no interest here
+        while self.peek()[0] != ';':
+            self.next()
+        self.next(';')
+        return Field(type, name, self.comment(), size, values)
+
+def parse(text):
+    """Returns the Table defined by autoSql text."""
+    return _Parser(text).table()
+
+def read(path):
+    """Returns the Table defined in the .as file at path."""
+    with open(path) as f:
+        return parse(f.read())
@@ -0,0 +1,167 @@
+# Validation of whole bed-family text files on a pool of processes.
+#
+# The rows of bed, narrowPeak, broadPeak, bedMethyl, bedLogR and
+# bedRnaElements files are checked by dcc.prevalidate.RowChecker against
+# their bed type and autoSql (.as) definition. An uncompressed file is
+# cut into line aligned byte ranges that the workers read themselves; a
+# gzipped one is decompressed here and handed out in blocks of lines.
+# The errors of every chunk are merged in order, numbered by line, and
+# written to the same .report file and "Error count N" result that
+# validateFiles -doReport produces.
+
+import os
+import collections
+import multiprocessing
+
+import prevalidate
+
+__all__ = ["DEFAULT_PROCESSES", "DEFAULT_CHUNK_SIZE", "DEFAULT_MAX_ERRORS",
+           "supports", "chunk_ranges", "validate", "validate_file"]
+
+DEFAULT_PROCESSES = multiprocessing.cpu_count()
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+# validateFiles stops after this many errors too
+DEFAULT_MAX_ERRORS = prevalidate.DEFAULT_MAX_ERRORS
+
+# The RowChecker of each worker process, set up once by _init_worker
+_checker = None
+
+def _init_worker(spec, chrom_sizes):
+    global _checker
+    _checker = prevalidate.RowChecker(spec, chrom_sizes)
+
+def _check_lines(data, max_errors, checker=None):
+    """Returns the number of lines in data and (line index, error, line)
+    for up to max_errors of them, checked by checker or the worker's."""
+    lines = data.split('\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    errors = []
+    check_line = (checker or _checker).check_line
+    for index, line in enumerate(lines):
+        error = check_line(line.rstrip('\r'))
+        if error:
+            errors.append((index, error, line))
+            if len(errors) >= max_errors:
+                break
+    return len(lines), errors
+
+def _check_range(args, checker=None):
+    path, start, end, max_errors = args
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _check_lines(data, max_errors, checker)
+
+def _check_block(args, checker=None):
+    data, max_errors = args
+    return _check_lines(data, max_errors, checker)
+
+def _ordered_results(pool, func, tasks, window):
+    """Yields func(task) for each of tasks in order, computed on pool
+    with at most window tasks queued at a time."""
+    pending = collections.deque()
+    tasks = iter(tasks)
+    while True:
+        while len(pending) < window:
+            task = next(tasks, None)
+            if task is None:
+                break
+            pending.append(pool.apply_async(func, (task,)))
+        if not pending:
+            return
+        yield pending.popleft().get()
+
+def supports(validate_args):
+    """Returns whether validate_map arguments are for a text bed type
+    this module can validate."""
+    return prevalidate.bed_spec(validate_args) is not None
+
+def chunk_ranges(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Returns (start, end) byte ranges of about chunk_size that cover
+    path, each starting at the beginning of a line."""
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def _gzip_blocks(path, chunk_size):
+    """Yields blocks of about chunk_size bytes of whole lines."""
+    with prevalidate.open_text(path) as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                return
+            if not block.endswith('\n'):
+                block += f.readline()
+            yield block
+
+def validate(path, validate_args, chrom_sizes, processes=DEFAULT_PROCESSES,
+             chunk_size=DEFAULT_CHUNK_SIZE, max_errors=DEFAULT_MAX_ERRORS):
+    """Validates every line of path and returns (lines, errors), where
+    errors are the first max_errors errors in validateFiles' style.
+
+    If the file has more errors than that, lines is the number of lines
+    up to the end of the chunk holding the last error reported. Raises
+    ValueError if validate_args are not for a text bed type.
+
+    With processes=1 the file is checked in the calling process, without
+    a pool, so that callers validating several files on threads of their
+    own do not start a pool in each.
+    """
+    spec = prevalidate.bed_spec(validate_args)
+    if spec is None:
+        raise ValueError("Not a bed type: %s" % " ".join(validate_args or []))
+    if not isinstance(chrom_sizes, dict):
+        chrom_sizes = prevalidate.read_chrom_sizes(chrom_sizes)
+
+    with open(path, 'rb') as f:
+        gzipped = f.read(2) == '\x1f\x8b'
+    if gzipped:
+        tasks = ((block, max_errors)
+                 for block in _gzip_blocks(path, chunk_size))
+        check = _check_block
+    else:
+        tasks = [(path, start, end, max_errors)
+                 for start, end in chunk_ranges(path, chunk_size)]
+        check = _check_range
+
+    if processes == 1:
+        pool = None
+        checker = prevalidate.RowChecker(spec, chrom_sizes)
+        results = (check(task, checker) for task in tasks)
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker,
+                                    (spec, chrom_sizes))
+        # Keep every process busy while holding only a few chunks
+        results = _ordered_results(pool, check, tasks, 2 * processes)
+    lines = 0
+    errors = []
+    try:
+        for count, chunk_errors in results:
+            for index, error, line in chunk_errors:
+                errors.append(prevalidate.format_error(path, lines + index + 1,
+                                                       error, line))
+            lines += count
+            if len(errors) >= max_errors:
+                errors = errors[:max_errors]
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return lines, errors
+
+def validate_file(path, validate_args, chrom_sizes, **kwargs):
+    """Validates path, writes its path.report file and returns the
+    validateFiles style result, "Error count N\\n"."""
+    lines, errors = validate(path, validate_args, chrom_sizes, **kwargs)
+    return prevalidate.write_report(path, errors)
@@ -0,0 +1,34 @@
+# Grouping of files into jobs by size.
+#
+# Each subjob pays for starting a worker, downloading its inputs and
+# unpacking the applet's resources, which for small files costs more
+# than the work itself. first_fit_decreasing() packs files into as few
+# jobs as fit a byte budget each; files too big to share a job get one
+# to themselves.
+
+__all__ = ["DEFAULT_JOB_BYTES", "DEFAULT_JOB_FILES", "first_fit_decreasing"]
+
+# Bytes of input for one job, and the most files it validates
+DEFAULT_JOB_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_JOB_FILES = 50
+
+def first_fit_decreasing(items, capacity, max_items=None):
+    """Packs items, a list of (size, item), into bins of at most capacity
+    bytes and max_items items, and returns the bins as lists of items.
+
+    Items are placed from largest to smallest (ties in their original
+    order) into the first bin with room for them. An item bigger than
+    capacity gets a bin of its own.
+    """
+    order = sorted(range(len(items)), key=lambda i: (-items[i][0], i))
+    bins = []  # [room left, items]
+    for i in order:
+        size, item = items[i]
+        for b in bins:
+            if b[0] >= size and (max_items is None or len(b[1]) < max_items):
+                b[0] -= size
+                b[1].append(item)
+                break
+        else:
+            bins.append([capacity - size, [item]])
+    return [b[1] for b in bins]
@@ -0,0 +1,116 @@
+# Stopping validateFiles once a file has used up its error budget.
+#
+# validateFiles reads a whole file before it prints its "Error count N",
+# which for a malformed multi-GB file can take an hour. It does print
+# each error to stderr as it finds it, though, so check_output() runs it
+# reading stderr as it goes and terminates it as soon as an ErrorBudget
+# is spent: too many errors, or an error early in the file. The result
+# is then labelled as partial ("Aborted ...") and the report holds the
+# errors seen so far.
+
+import sys
+import threading
+import subprocess
+import collections
+
+import reports
+
+__all__ = ["DEFAULT_FIRST_LINES", "STDERR_TAIL_LINES", "ErrorBudget",
+           "DEFAULT_BUDGET", "check_output"]
+
+# An error this early usually means the wrong format or assembly
+DEFAULT_FIRST_LINES = 10000
+# Lines of stderr kept for the CalledProcessError of a failed command
+STDERR_TAIL_LINES = 20
+
+class ErrorBudget:
+    """Stop validating after max_errors errors, or at the first error in
+    the first first_lines lines. Either may be None to not stop for it."""
+
+    def __init__(self, max_errors=None, first_lines=None):
+        self.max_errors = max_errors
+        self.first_lines = first_lines
+
+    def spent(self, line_numbers):
+        """Returns why errors on line_numbers (so far) use up the budget,
+        or None if they do not."""
+        if self.max_errors is not None and len(line_numbers) >= self.max_errors:
+            return "%d errors" % len(line_numbers)
+        if self.first_lines is not None and line_numbers and \
+                line_numbers[-1] is not None and \
+                line_numbers[-1] <= self.first_lines:
+            return "error in the first %d lines" % self.first_lines
+        return None
+
+    def __repr__(self):
+        return "<ErrorBudget %s errors, first %s lines>" % (self.max_errors,
+                                                            self.first_lines)
+
+# The budget the validation applets use when their stop_early input is
+# set. It sets no error limit: validateFiles stops after 10 errors itself,
+# and finishing with its own "Error count" gives a result that can be
+# cached
+DEFAULT_BUDGET = ErrorBudget(first_lines=DEFAULT_FIRST_LINES)
+
+def _read(stream, chunks):
+    for chunk in iter(lambda: stream.read(4096), ''):
+        chunks.append(chunk)
+
+def check_output(command, budget, report_path):
+    """Runs command like subprocess.check_output, returning its stdout,
+    unless the errors it prints to stderr spend budget.
+
+    In that case the command is terminated, report_path is written with
+    the errors seen, as -doReport would have, and the result is
+    "Aborted after <reason>\\nError count N\\n".
+
+    Everything the command prints to stderr is passed on to sys.stderr.
+    If it fails, the CalledProcessError's output is its stdout followed by
+    the last STDERR_TAIL_LINES lines of its stderr, which are also kept
+    as the error's stderr.
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    stdout = []
+    reader = threading.Thread(target=_read, args=(process.stdout, stdout))
+    reader.daemon = True
+    reader.start()
+    errors = []
+    line_numbers = []
+    tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+    reason = None
+    finished = False
+    try:
+        for line in iter(process.stderr.readline, ''):
+            sys.stderr.write(line)
+            tail.append(line)
+            line_number = reports.error_line_number(line)
+            if line_number is None and (not line.startswith("Error") or
+                                        reports.error_count(line) is not None):
+                continue
+            errors.append(line.rstrip("\r\n"))
+            line_numbers.append(line_number)
+            reason = budget.spent(line_numbers)
+            if reason:
+                process.terminate()
+                break
+        finished = True
+    finally:
+        if not finished and process.poll() is None:
+            process.kill()
+        process.stderr.close()
+        process.wait()
+        reader.join()
+    if reason:
+        with open(report_path, 'w') as f:
+            for error in errors:
+                f.write(error + "\n")
+            f.write("Error count %d\n" % len(errors))
+        return "%s after %s\nError count %d\n" % (reports.ABORTED, reason,
+                                                  len(errors))
+    if process.returncode:
+        error = subprocess.CalledProcessError(process.returncode, command,
+                                              "".join(stdout) + "".join(tail))
+        error.stderr = "".join(tail)
+        raise error
+    return "".join(stdout)
@@ -0,0 +1,155 @@
+# On-disk cache of ENCODE portal responses.
+#
+# Responses to GET requests are stored in a SQLite database keyed by URL
+# and credential identity. An entry younger than the TTL is used without
+# contacting the server; an older one is revalidated with its ETag or
+# Last-Modified header, so that unchanged objects cost a 304 rather than
+# the whole JSON. The least recently used entries are evicted once the
+# stored bodies grow past a byte budget.
+
+import os
+import json
+import time
+import errno
+import sqlite3
+import hashlib
+
+__all__ = ["ResponseCache", "DEFAULT_CACHE_PATH", "DEFAULT_TTL",
+           "DEFAULT_MAX_BYTES"]
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "ENCODED_CACHE", os.path.expanduser("~/.cache/encoded/responses.sqlite"))
+DEFAULT_TTL = 60 * 60
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    stored REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+"""
+
+class ResponseCache:
+    """A SQLite store of response bodies with TTL and LRU eviction.
+
+    Every call opens its own connection, so a cache may be shared by
+    threads and by processes.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or DEFAULT_CACHE_PATH
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(self.path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+        db = self._connect()
+        try:
+            db.executescript(_SCHEMA)
+        finally:
+            db.close()
+
+    @staticmethod
+    def key(url, identity=None):
+        """Returns the key for url fetched with the credentials identity."""
+        return hashlib.sha1("%s\t%s" % (identity or "", url)).hexdigest()
+
+    def get(self, key):
+        """Returns the entry for key as a dict, or None.
+
+        The entry's "fresh" item is True if it is younger than the TTL.
+        """
+        db = self._connect()
+        try:
+            row = db.execute("SELECT url, headers, body, etag, last_modified, "
+                             "stored FROM responses WHERE key = ?",
+                             (key,)).fetchone()
+            if row is None:
+                return None
+            with db:
+                db.execute("UPDATE responses SET used = ? WHERE key = ?",
+                           (time.time(), key))
+        finally:
+            db.close()
+        url, headers, body, etag, last_modified, stored = row
+        return {"url": url, "headers": json.loads(headers), "body": str(body),
+                "etag": etag, "last_modified": last_modified,
+                "fresh": time.time() - stored < self.ttl}
+
+    def put(self, key, url, headers, body):
+        """Stores a 200 response's headers (a dict) and body for key."""
+        now = time.time()
+        db = self._connect()
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO responses VALUES "
+                           "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (key, url, json.dumps(dict(headers)),
+                            sqlite3.Binary(body), headers.get("ETag"),
+                            headers.get("Last-Modified"), len(body), now, now))
+            self._evict(db)
+        finally:
+            db.close()
+
+    def refresh(self, key):
+        """Restarts the TTL of an entry the server says has not changed."""
+        now = time.time()
+        db = self._connect()
+        try:
+            with db:
+                db.execute("UPDATE responses SET stored = ?, used = ? "
+                           "WHERE key = ?", (now, now, key))
+        finally:
+            db.close()
+
+    def invalidate(self, key=None):
+        """Removes the entry for key, or every entry."""
+        db = self._connect()
+        try:
+            with db:
+                if key is None:
+                    db.execute("DELETE FROM responses")
+                else:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        finally:
+            db.close()
+
+    def size(self):
+        """Returns (entries, bytes) stored."""
+        db = self._connect()
+        try:
+            count, total = db.execute("SELECT COUNT(*), TOTAL(size) "
+                                      "FROM responses").fetchone()
+        finally:
+            db.close()
+        return count, int(total)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+
+    def _evict(self, db):
+        total = db.execute("SELECT TOTAL(size) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in db.execute("SELECT key, size FROM responses "
+                                    "ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        with db:
+            db.executemany("DELETE FROM responses WHERE key = ?", doomed)
@@ -0,0 +1,116 @@
+# Parallel gzip compression.
+#
+# The input is cut into blocks that are compressed independently on a
+# pool of threads (zlib releases the GIL while it deflates) and written
+# out in order, each as a gzip member of its own. Any gzip reader
+# decompresses the concatenated members as one stream. With bgzf set
+# the members follow the BGZF layout used by samtools and tabix: at most
+# 64KB each, with their size in a BC extra field, and ending in the
+# empty BGZF end-of-file block.
+
+import zlib
+import struct
+import collections
+from multiprocessing.pool import ThreadPool
+
+__all__ = ["DEFAULT_LEVEL", "DEFAULT_THREADS", "DEFAULT_BLOCK_SIZE",
+           "BGZF_BLOCK_SIZE", "BGZF_EOF", "compress_block",
+           "ParallelGzipWriter"]
+
+# The gzip command's default
+DEFAULT_LEVEL = 6
+DEFAULT_THREADS = 4
+# Input bytes per member, or per batch of BGZF blocks
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+# Input bytes per BGZF block, as in htslib, so that even incompressible
+# data fits in a 64KB block
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_EOF = ("\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43"
+            "\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00")
+
+def _deflate(data, level):
+    deflate = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return deflate.compress(data) + deflate.flush()
+
+def _trailer(data):
+    return struct.pack("<II", zlib.crc32(data) & 0xffffffff,
+                       len(data) & 0xffffffff)
+
+def compress_block(data, level=DEFAULT_LEVEL, bgzf=False, mtime=0):
+    """Returns data compressed as one gzip member, or as BGZF blocks."""
+    if not bgzf:
+        header = struct.pack("<BBBBIBB", 0x1f, 0x8b, 8, 0, mtime,
+                             2 if level == 9 else 0, 255)
+        return header + _deflate(data, level) + _trailer(data)
+    blocks = []
+    for start in range(0, len(data), BGZF_BLOCK_SIZE):
+        block = data[start:start + BGZF_BLOCK_SIZE]
+        deflated = _deflate(block, level)
+        # BSIZE is the size of the whole block less one
+        bsize = 18 + len(deflated) + 8 - 1
+        blocks.append(struct.pack("<BBBBIBBHBBHH", 0x1f, 0x8b, 8, 4, 0, 0,
+                                  255, 6, ord('B'), ord('C'), 2, bsize))
+        blocks.append(deflated)
+        blocks.append(_trailer(block))
+    return "".join(blocks)
+
+class ParallelGzipWriter:
+    """A file-like object that gzips what is written to it onto out,
+    compressing blocks of block_size bytes on threads threads.
+
+    The members' headers hold mtime, by default 0 (none, as with gzip
+    -n), so that the same input always gives the same bytes."""
+
+    def __init__(self, out, level=DEFAULT_LEVEL, threads=DEFAULT_THREADS,
+                 bgzf=False, block_size=DEFAULT_BLOCK_SIZE, mtime=0):
+        self.out = out
+        self.level = level
+        self.bgzf = bgzf
+        self.block_size = block_size
+        if bgzf:
+            # Whole BGZF blocks only, so that only the last one is short
+            self.block_size = max(1, block_size // BGZF_BLOCK_SIZE) * \
+                BGZF_BLOCK_SIZE
+        self.mtime = mtime
+        self._threads = threads
+        self._pool = ThreadPool(threads)
+        self._pending = collections.deque()
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.block_size:
+            data = "".join(self._buffer)
+            end = len(data) - len(data) % self.block_size
+            for start in range(0, end, self.block_size):
+                self._submit(data[start:start + self.block_size])
+            self._buffer = [data[end:]]
+            self._buffered = len(data) - end
+
+    def _submit(self, block):
+        self._pending.append(self._pool.apply_async(
+            compress_block, (block, self.level, self.bgzf, self.mtime)))
+        # Bound the blocks held in memory, writing out those done in order
+        while len(self._pending) > 2 * self._threads:
+            self.out.write(self._pending.popleft().get())
+
+    def close(self):
+        """Compresses what is left and writes out every block. out is not
+        closed."""
+        if self._pool is None:
+            return
+        try:
+            data = "".join(self._buffer)
+            if data or not (self._pending or self.bgzf):
+                # An empty input still needs a member to be valid gzip
+                self._submit(data)
+            while self._pending:
+                self.out.write(self._pending.popleft().get())
+            if self.bgzf:
+                self.out.write(BGZF_EOF)
+            self._buffer = []
+        finally:
+            self._pool.terminate()
+            self._pool = None
@@ -0,0 +1,185 @@
+# Parallel, resumable HTTP downloads.
+#
+# A file is split into parts that are fetched with Range requests on a
+# pool of threads over one keep-alive session. Each part is written in
+# place into a file preallocated to the full size: every thread writes
+# through its own file descriptor at the part's offset, the Python 2
+# equivalent of pwrite(). The indexes of finished parts are kept in a
+# state file next to the download so that an interrupted download only
+# fetches the missing parts when it is run again. Servers that do not
+# support Range requests are read in a single stream.
+
+import os
+import json
+import hashlib
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+import encoded
+
+__all__ = ["DownloadError", "DEFAULT_THREADS", "DEFAULT_PART_SIZE",
+           "download", "file_digest", "file_md5"]
+
+DEFAULT_THREADS = 8
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+STATE_SUFFIX = ".parts"
+
+class DownloadError(Exception):
+    """A download failed or did not match its MD5 checksum."""
+    pass
+
+def file_digest(path, algorithm="md5", block_size=4 * 1024 * 1024):
+    """Returns the hex digest of a file's contents with a hashlib
+    algorithm, reading it block_size bytes at a time."""
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_md5(path, block_size=4 * 1024 * 1024):
+    return file_digest(path, "md5", block_size)
+
+def _write_all(fd, data):
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+def download(url, path, md5sum=None, session=None, threads=DEFAULT_THREADS,
+             part_size=DEFAULT_PART_SIZE, attempts=3):
+    """Downloads url to path and returns the file's MD5 hex digest.
+
+    Parts that fail are retried up to attempts times in all. If md5sum is
+    given, a download that does not match it raises DownloadError. An
+    existing download of the same size and ETag (or Last-Modified) that
+    was interrupted is resumed.
+    """
+    if session is None:
+        session = encoded.EncodedSession()
+
+    # Probe with a one byte range to learn the size, whether ranges are
+    # supported and the URL at the end of any redirects
+    response = session.get(url, headers={'Range': 'bytes=0-0'}, stream=True)
+    if response.status_code == 416:
+        response.close()
+        open(path, 'wb').close()
+    elif response.status_code == 200:
+        _download_stream(response, path)
+    elif response.status_code == 206:
+        response.close()
+        try:
+            size = int(response.headers['Content-Range'].rsplit('/', 1)[1])
+        except (KeyError, IndexError, ValueError):
+            raise DownloadError("Invalid Content-Range from %s" % url)
+        validator = response.headers.get('ETag') or \
+            response.headers.get('Last-Modified')
+        _download_parts(session, response.url, path, size, validator,
+                        threads, part_size, attempts)
+    else:
+        response.raise_for_status()
+        raise DownloadError("Unexpected status %d from %s" %
+                            (response.status_code, url))
+
+    digest = file_md5(path)
+    if md5sum and digest != md5sum:
+        raise DownloadError("MD5 of %s is %s, expected %s" %
+                            (path, digest, md5sum))
+    return digest
+
+def _download_stream(response, path):
+    try:
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+    finally:
+        response.close()
+    expected = response.headers.get('Content-Length')
+    if expected is not None and os.path.getsize(path) != int(expected):
+        raise DownloadError("Short download of %s" % response.url)
+
+def _read_state(state_path, size, validator, part_size):
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if state.get("size") != size or state.get("validator") != validator or \
+            state.get("part_size") != part_size:
+        return None
+    return set(state.get("done", []))
+
+def _write_state(state_path, size, validator, part_size, done):
+    tmp = state_path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"size": size, "validator": validator,
+                   "part_size": part_size, "done": sorted(done)}, f)
+    os.rename(tmp, state_path)
+
+def _download_parts(session, url, path, size, validator, threads, part_size,
+                    attempts):
+    state_path = path + STATE_SUFFIX
+    parts = [(start, min(start + part_size, size) - 1)
+             for start in range(0, size, part_size)]
+
+    done = None
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        done = _read_state(state_path, size, validator, part_size)
+    if done is None:
+        # Preallocate the whole file so that parts can be written in place
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        done = set()
+        _write_state(state_path, size, validator, part_size, done)
+    lock = threading.Lock()
+
+    def fetch_part(index):
+        start, end = parts[index]
+        try:
+            response = session.get(url, stream=True, headers={
+                'Range': 'bytes=%d-%d' % (start, end)})
+            try:
+                if response.status_code != 206:
+                    return "status %d" % response.status_code
+                fd = os.open(path, os.O_WRONLY)
+                try:
+                    os.lseek(fd, start, os.SEEK_SET)
+                    written = 0
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        _write_all(fd, chunk)
+                        written += len(chunk)
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            finally:
+                response.close()
+        except (requests.RequestException, IOError, OSError), e:
+            return str(e)
+        if written != end - start + 1:
+            return "short read (%d of %d bytes)" % (written, end - start + 1)
+        with lock:
+            done.add(index)
+            _write_state(state_path, size, validator, part_size, done)
+        return None
+
+    errors = []
+    for attempt in range(attempts):
+        missing = [index for index in range(len(parts)) if index not in done]
+        if not missing:
+            break
+        pool = ThreadPool(min(threads, len(missing)))
+        try:
+            errors = [error for error in pool.map(fetch_part, missing)
+                      if error]
+        finally:
+            pool.terminate()
+    if len(done) < len(parts):
+        raise DownloadError("%d of %d parts of %s failed: %s" %
+                            (len(parts) - len(done), len(parts), url,
+                             errors[0] if errors else "unknown error"))
+    os.remove(state_path)
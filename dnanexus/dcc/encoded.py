@@ -0,0 +1,233 @@
+# HTTP access to the ENCODE portal (encoded).
+
+import time
+import threading
+
+import requests
+import requests.adapters
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+__all__ = ["HEADERS", "DEFAULT_POOL_SIZE", "DEFAULT_RETRIES",
+           "DEFAULT_BACKOFF", "RequestMetrics", "metrics", "EncodedSession",
+           "CachingSession", "new_session", "get_session", "set_cache",
+           "encoded_get"]
+
+HEADERS = {'content-type': 'application/json'}
+
+# Connections kept open per host; should be at least the number of
+# threads sharing a session
+DEFAULT_POOL_SIZE = 10
+
+# Idempotent requests that fail with one of RETRY_STATUSES or a connection
+# error are retried up to DEFAULT_RETRIES times, waiting DEFAULT_BACKOFF
+# seconds and then twice as long each time (or as long as a Retry-After
+# header asks), up to MAX_BACKOFF
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 60
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+class RequestMetrics:
+    """Thread-safe counts and latencies of HTTP requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latencies = []
+            self.statuses = {}
+            self.errors = 0
+            self.retries = 0
+
+    def record(self, latency, status=None):
+        """Records one attempt; status is None for a connection error."""
+        with self._lock:
+            self.latencies.append(latency)
+            if status is None:
+                self.errors += 1
+            else:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def summary(self):
+        """Returns a dict of request counts and latency percentiles."""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            summary = {"requests": len(latencies), "errors": self.errors,
+                       "retries": self.retries,
+                       "statuses": dict(self.statuses)}
+        if latencies:
+            def percentile(p):
+                return latencies[min(len(latencies) - 1,
+                                     int(p * len(latencies)))]
+            summary.update({"mean": sum(latencies) / len(latencies),
+                            "p50": percentile(0.5), "p95": percentile(0.95),
+                            "max": latencies[-1]})
+        return summary
+
+    def __str__(self):
+        summary = self.summary()
+        text = "%d requests, %d retries, %d errors" % (
+            summary["requests"], summary["retries"], summary["errors"])
+        if summary["requests"]:
+            text += ", latency mean %.3fs p50 %.3fs p95 %.3fs max %.3fs" % (
+                summary["mean"], summary["p50"], summary["p95"],
+                summary["max"])
+        return text
+
+# Metrics of every session made by new_session without its own
+metrics = RequestMetrics()
+
+class EncodedSession(requests.Session):
+    """A session that retries failed requests with exponential backoff
+    and records each attempt in a RequestMetrics."""
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 metrics=None):
+        requests.Session.__init__(self)
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = metrics or RequestMetrics()
+
+    def request(self, method, url, **kwargs):
+        retry = method.upper() in RETRY_METHODS
+        attempt = 0
+        while True:
+            start = time.time()
+            try:
+                response = requests.Session.request(self, method, url,
+                                                    **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.metrics.record(time.time() - start)
+                if not retry or attempt >= self.retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                self.metrics.record(time.time() - start, response.status_code)
+                if not retry or attempt >= self.retries or \
+                        response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self._backoff(attempt, response)
+                response.close()
+            self.metrics.record_retry()
+            time.sleep(delay)
+            attempt += 1
+
+    def _backoff(self, attempt, response=None):
+        delay = self.backoff * 2 ** attempt
+        if response is not None:
+            try:
+                delay = float(response.headers.get('Retry-After'))
+            except (TypeError, ValueError):
+                pass
+        return min(max(delay, 0), MAX_BACKOFF)
+
+class CachingSession(EncodedSession):
+    """A session that answers GET requests from a dcc.cache.ResponseCache.
+
+    Fresh entries are returned without contacting the server. Stale ones
+    are revalidated with If-None-Match/If-Modified-Since and reused if
+    the server answers 304 Not Modified. Responses served from the cache
+    have from_cache set to True.
+    """
+
+    def __init__(self, cache, identity=None, **kwargs):
+        EncodedSession.__init__(self, **kwargs)
+        self.cache = cache
+        self.identity = identity
+
+    def request(self, method, url, **kwargs):
+        if method.upper() != 'GET' or kwargs.get('stream') or \
+                kwargs.get('params'):
+            return EncodedSession.request(self, method, url, **kwargs)
+
+        key = self.cache.key(url, self.identity)
+        entry = self.cache.get(key)
+        if entry is not None and entry["fresh"]:
+            return self._cached_response(entry)
+
+        if entry is not None:
+            headers = dict(kwargs.get('headers') or {})
+            if entry["etag"]:
+                headers['If-None-Match'] = entry["etag"]
+            if entry["last_modified"]:
+                headers['If-Modified-Since'] = entry["last_modified"]
+            kwargs['headers'] = headers
+        response = EncodedSession.request(self, method, url, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.cache.refresh(key)
+            return self._cached_response(entry)
+        if response.status_code == 200:
+            self.cache.put(key, url, response.headers, response.content)
+        response.from_cache = False
+        return response
+
+    def _cached_response(self, entry):
+        response = requests.models.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = entry["url"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry["body"]
+        response.from_cache = True
+        return response
+
+def new_session(AUTHID=None, AUTHPW=None, pool_size=DEFAULT_POOL_SIZE,
+                cache=None, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                metrics=metrics):
+    """Returns an EncodedSession that reuses connections to the server.
+
+    Up to pool_size connections are kept alive. If cache (a
+    dcc.cache.ResponseCache) is given, GET responses are cached per
+    AUTHID. A session may be shared by threads making concurrent
+    requests.
+    """
+    if cache is not None:
+        session = CachingSession(cache, AUTHID, retries=retries,
+                                 backoff=backoff, metrics=metrics)
+    else:
+        session = EncodedSession(retries, backoff, metrics)
+    session.headers.update(HEADERS)
+    if AUTHID and AUTHPW:
+        session.auth = (AUTHID, AUTHPW)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                            pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Sessions used by encoded_get, by credentials
+_sessions = {}
+_sessions_lock = threading.Lock()
+_cache = None
+
+def set_cache(cache):
+    """Sets the ResponseCache used by encoded_get (None for no cache)."""
+    global _cache
+    with _sessions_lock:
+        _cache = cache
+        _sessions.clear()
+
+def get_session(AUTHID=None, AUTHPW=None):
+    """Returns the shared session for the credentials, which uses the
+    cache set with set_cache()."""
+    with _sessions_lock:
+        session = _sessions.get((AUTHID, AUTHPW))
+        if session is None:
+            session = new_session(AUTHID, AUTHPW, cache=_cache)
+            _sessions[(AUTHID, AUTHPW)] = session
+    return session
+
+def encoded_get(url, AUTHID=None, AUTHPW=None):
+    """GETs url like dxencode.encoded_get, over a shared keep-alive
+    session that retries failures and uses the cache set with
+    set_cache()."""
+    return get_session(AUTHID, AUTHPW).get(url)
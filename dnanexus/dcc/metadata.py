@@ -0,0 +1,153 @@
+# ENCODE metadata for DNAnexus files.
+
+import re
+import urllib
+from collections import deque
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+__all__ = ["ENCFF_PATTERN", "DEFAULT_THREADS", "DEFAULT_BATCH_SIZE",
+           "MAX_URL_LENGTH", "file_accession", "path_accession",
+           "object_url", "search_urls", "get_objects", "fetch_file_metadata"]
+
+ENCFF_PATTERN = re.compile('ENCFF[0-9]{3}[A-Z]{3}')
+
+# Describe requests in flight at once
+DEFAULT_THREADS = 8
+
+# Most accessions looked up by one search query. Queries are also split
+# to keep URLs under MAX_URL_LENGTH, well below common server limits.
+DEFAULT_BATCH_SIZE = 100
+MAX_URL_LENGTH = 4000
+
+# Seconds to wait for a describe call before looking up the files
+# already described
+POLL_INTERVAL = 0.05
+
+def file_accession(filename):
+    """Returns the ENCFF accession a file name starts with, or None."""
+    match = ENCFF_PATTERN.match(filename)
+    if match:
+        return match.group()
+    return None
+
+def path_accession(path):
+    """Returns the accession in an object path such as /files/ENCFF000AAA/."""
+    parts = [part for part in path.split('/') if part]
+    if parts:
+        return parts[-1]
+    return None
+
+def object_url(server, accession):
+    return server.rstrip('/') + '/' + accession + '/?frame=embedded'
+
+def search_urls(server, accessions, obj_type="File",
+                max_url_length=MAX_URL_LENGTH, batch_size=DEFAULT_BATCH_SIZE):
+    """Returns /search/ URLs that together find the objects in accessions."""
+    base = "%s/search/?type=%s&frame=embedded&limit=all" % (
+        server.rstrip('/'), urllib.quote(obj_type))
+    urls = []
+    url = base
+    count = 0
+    for accession in accessions:
+        param = "&accession=" + urllib.quote(accession)
+        if count and (count >= batch_size or
+                      len(url) + len(param) > max_url_length):
+            urls.append(url)
+            url = base
+            count = 0
+        url += param
+        count += 1
+    if count:
+        urls.append(url)
+    return urls
+
+def get_objects(session, server, accessions, obj_type="File",
+                max_url_length=MAX_URL_LENGTH):
+    """Returns a dict of accession to embedded object for accessions.
+
+    The objects are found with as few /search/ queries as fit in
+    max_url_length. Any that a search does not return (such as deleted
+    objects) are then fetched one at a time. Accessions that cannot be
+    fetched either are left out of the result.
+    """
+    wanted = []
+    wanted_set = set()
+    for accession in accessions:
+        if accession not in wanted_set:
+            wanted.append(accession)
+            wanted_set.add(accession)
+
+    found = {}
+    for url in search_urls(server, wanted, obj_type, max_url_length):
+        response = session.get(url)
+        # The portal answers searches without results with a 404
+        if response.status_code != 404:
+            response.raise_for_status()
+        for obj in response.json().get('@graph', []):
+            if obj.get('accession') in wanted_set:
+                found[obj['accession']] = obj
+
+    for accession in wanted:
+        if accession not in found:
+            response = session.get(object_url(server, accession))
+            if response.status_code == 200:
+                found[accession] = response.json()
+    return found
+
+def fetch_file_metadata(files, describe, session, server,
+                        threads=DEFAULT_THREADS, batch_size=DEFAULT_BATCH_SIZE):
+    """Yields (file_obj, filename, file_meta) for each DNAnexus file.
+
+    describe is dxpy.describe (or a stand-in) and session a
+    requests.Session for server. The files are described on a pool of
+    threads, and their ENCODE metadata is looked up in batches with
+    get_objects() while later files are still being described: a batch
+    is sent when it is full or when no other lookup is in flight.
+    Results are yielded in the order of files as soon as they are
+    available, so that the caller can start work on the first files while
+    the rest are still being fetched. file_meta is None for files whose
+    names do not start with an ENCFF accession and for accessions the
+    server does not know.
+    """
+    def describe_file(file_obj):
+        filename = describe(file_obj)['name']
+        return file_obj, filename, file_accession(filename)
+
+    def fetch_batch(batch):
+        found = get_objects(session, server,
+                            [file_acc for _, _, file_acc in batch if file_acc])
+        return [(file_obj, filename, found.get(file_acc))
+                for file_obj, filename, file_acc in batch]
+
+    if not files:
+        return
+    describe_pool = ThreadPool(min(threads, len(files)))
+    search_pool = ThreadPool(2)
+    pending = deque()
+    try:
+        described = describe_pool.imap(describe_file, files)
+        batch = []
+        done = False
+        while not done:
+            try:
+                if batch or pending:
+                    batch.append(described.next(POLL_INTERVAL))
+                else:
+                    batch.append(described.next())
+            except TimeoutError:
+                if batch and not pending:
+                    pending.append(search_pool.apply_async(fetch_batch,
+                                                           (batch,)))
+                    batch = []
+            except StopIteration:
+                done = True
+            if batch and (done or len(batch) >= batch_size):
+                pending.append(search_pool.apply_async(fetch_batch, (batch,)))
+                batch = []
+            while pending and (done or pending[0].ready()):
+                for result in pending.popleft().get():
+                    yield result
+    finally:
+        describe_pool.terminate()
+        search_pool.terminate()
@@ -0,0 +1,297 @@
+# Quick checks of bed-family files before they are given to validateFiles.
+#
+# validateFiles can run for many minutes on a large file that a glance at
+# its first lines would reject. check() reads a sample of a file typed
+# by the same validate_map arguments (-type=bed6+4 -as=narrowPeak.as) and
+# checks each row's field count, coordinates, chromosome and column
+# types, stopping at the first few errors. Rows are split into fields
+# the way validateFiles splits them: on tabs with -tab, on any
+# whitespace otherwise. Errors are reported in the style of
+# validateFiles, so that an invalid file can be failed without running it
+# at all. Such a result starts with FAILED, so it is not taken for (or
+# cached as) a validateFiles verdict.
+
+import io
+import re
+import gzip
+
+import autosql
+
+__all__ = ["DEFAULT_SAMPLE_LINES", "DEFAULT_MAX_ERRORS", "FAILED", "BedSpec",
+           "bed_spec", "read_chrom_sizes", "open_text", "RowChecker",
+           "check", "format_error", "error_count", "write_report",
+           "failed_result"]
+
+# Lines read from the start of a file; None reads all of it
+DEFAULT_SAMPLE_LINES = 1000000
+DEFAULT_MAX_ERRORS = 10
+# How the result of a file that failed these checks starts
+FAILED = "Pre-validation failed"
+
+_BED_TYPE = re.compile(r"^-type=bed(\d+)(\+(\d*))?$")
+_AS_PATH = re.compile(r"^-as=(.*)$")
+_INT_TYPES = ("int", "short", "byte", "bigint")
+_UINT_TYPES = ("uint", "ushort", "ubyte")
+_FLOAT_TYPES = ("float", "double")
+
+class BedSpec:
+    """The columns a bed type such as bed6+4 has: bed_fields standard bed
+    fields followed by extra_fields more (None for any number), typed by
+    table (an autosql.Table) if an .as file was given. Fields are
+    separated by tabs if tab is true (-tab), by any whitespace if not."""
+
+    def __init__(self, bed_fields, extra_fields=0, table=None, tab=False):
+        self.bed_fields = bed_fields
+        self.extra_fields = extra_fields
+        self.table = table
+        self.tab = tab
+
+    def __repr__(self):
+        extra = "+" if self.extra_fields is None else \
+            "+%d" % self.extra_fields if self.extra_fields else ""
+        return "<BedSpec bed%d%s>" % (self.bed_fields, extra)
+
+def bed_spec(validate_args):
+    """Returns the BedSpec of validate_map arguments, or None if they are
+    not for a text bed type (e.g. bigBed or fastq)."""
+    spec = table = None
+    tab = False
+    for arg in validate_args or []:
+        match = _BED_TYPE.match(arg)
+        if match:
+            bed_fields, plus, extra = match.groups()
+            if plus and not extra:
+                extra = None
+            spec = BedSpec(int(bed_fields),
+                           int(extra) if extra is not None else None)
+        match = _AS_PATH.match(arg)
+        if match:
+            table = autosql.read(match.group(1))
+        if arg == "-tab":
+            tab = True
+    if spec is not None:
+        spec.table = table
+        spec.tab = tab
+    return spec
+
+def read_chrom_sizes(path):
+    """Returns a dict of chromosome sizes from a chrom.sizes file."""
+    sizes = {}
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            if len(words) >= 2:
+                sizes[words[0]] = int(words[1])
+    return sizes
+
+def open_text(path):
+    """Opens path for reading lines, decompressing it if it is gzipped."""
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == '\x1f\x8b':
+        # GzipFile reads lines slowly on its own
+        return io.BufferedReader(gzip.open(path, 'rb'))
+    return open(path, 'rb')
+
+def _is_uint(word):
+    return word.isdigit()
+
+def _is_int(word):
+    return word.isdigit() or (word[:1] == '-' and word[1:].isdigit())
+
+def _is_float(word):
+    try:
+        float(word)
+    except ValueError:
+        return False
+    return True
+
+class RowChecker:
+    """Checks the fields of bed rows against a BedSpec and chromosome
+    sizes."""
+
+    def __init__(self, spec, chrom_sizes):
+        self.spec = spec
+        self.chrom_sizes = chrom_sizes
+        self.min_fields = spec.bed_fields
+        if spec.extra_fields is None:
+            self.max_fields = None
+        else:
+            self.max_fields = spec.bed_fields + spec.extra_fields
+            self.min_fields = self.max_fields
+        self._extra_checks = []
+        if spec.table is not None:
+            names = spec.table.field_names()
+            for index, field in enumerate(spec.table.fields):
+                if index < spec.bed_fields:
+                    continue
+                # Arrays are comma separated lists, sized by a number or
+                # by another field
+                count = None
+                if field.size is not None and field.type != "char":
+                    count = field.size
+                    if not isinstance(count, int):
+                        count = names.index(count) if count in names else None
+                        count = (count,) if count is not None else None
+                self._extra_checks.append((index, field,
+                                           self._field_check(field), count))
+
+    def _field_check(self, field):
+        if field.type in _UINT_TYPES:
+            return _is_uint
+        if field.type in _INT_TYPES:
+            return _is_int
+        if field.type in _FLOAT_TYPES:
+            return _is_float
+        if field.type == "char" and isinstance(field.size, int):
+            size = field.size
+            return lambda word: len(word) <= size
+        if field.type == "enum" and field.values:
+            values = frozenset(field.values)
+            return lambda word: word in values
+        if field.type == "set" and field.values:
+            values = frozenset(field.values)
+            return lambda word: all(value in values
+                                    for value in word.split(',') if value)
+        return None
+
+    def check_line(self, line):
+        """Returns what is wrong with a line without its newline, or None.
+        Blank, comment, track and browser lines are skipped."""
+        if not line or line[0] == '#' or line.startswith('track') or \
+                line.startswith('browser'):
+            return None
+        if self.spec.tab:
+            return self.check(line.split('\t'))
+        words = line.split()
+        if not words:
+            return None
+        return self.check(words)
+
+    def check(self, words):
+        """Returns what is wrong with a row split into words, or None."""
+        count = len(words)
+        if count < self.min_fields or \
+                (self.max_fields is not None and count > self.max_fields):
+            if self.max_fields == self.min_fields:
+                return "expecting %d words, found %d" % (self.min_fields,
+                                                         count)
+            return "expecting at least %d words, found %d" % (
+                self.min_fields, count)
+        chrom, start, end = words[0], words[1], words[2]
+        size = self.chrom_sizes.get(chrom)
+        if size is None:
+            return "chrom %s not found" % chrom
+        if not start.isdigit() or not end.isdigit():
+            return "chromStart and chromEnd must be unsigned integers"
+        start, end = int(start), int(end)
+        if start > end:
+            return "chromStart %d after chromEnd %d" % (start, end)
+        if end > size:
+            return "chromEnd %d past end of %s (%d)" % (end, chrom, size)
+        bed_fields = self.spec.bed_fields
+        if bed_fields >= 5:
+            if not words[4].isdigit() or int(words[4]) > 1000:
+                return "score %s is not between 0 and 1000" % words[4]
+        if bed_fields >= 6 and words[5] not in ('+', '-', '.'):
+            return "strand %s is not +, - or ." % words[5]
+        # As kent's loadAndValidateBed: 0 is a thickStart or thickEnd
+        # for a feature without a thick part
+        if bed_fields >= 8:
+            thick_start, thick_end = words[6], words[7]
+            if not thick_start.isdigit() or not thick_end.isdigit():
+                return "thickStart and thickEnd must be unsigned integers"
+            thick_start, thick_end = int(thick_start), int(thick_end)
+            if thick_end < thick_start:
+                return "thickStart %d after thickEnd %d" % (thick_start,
+                                                           thick_end)
+            for name, value in (("thickStart", thick_start),
+                                ("thickEnd", thick_end)):
+                if value != 0 and not start <= value <= end:
+                    return "%s %d not within %d-%d" % (name, value, start,
+                                                       end)
+        # An integer (a packed RGB value), or three comma separated
+        # numbers that each start with a digit, as kent's bedParseRgb
+        if bed_fields >= 9:
+            rgb = words[8]
+            if ',' in rgb:
+                parts = [part for part in rgb.split(',') if part]
+                if len(parts) != 3 or not all(part[0].isdigit()
+                                              for part in parts):
+                    return "itemRgb %s is not r,g,b" % rgb
+            elif not _is_int(rgb):
+                return "itemRgb %s is not an integer or r,g,b" % rgb
+        for index, field, check, size in self._extra_checks:
+            if index >= count:
+                break
+            word = words[index]
+            if size is None:
+                if check is not None and not check(word):
+                    return "%s %s is not a valid %s" % (field.name, word,
+                                                        field.type)
+                continue
+            items = word.rstrip(',').split(',') if word.rstrip(',') else []
+            if isinstance(size, tuple):
+                # Sized by the field at index size[0]
+                size = words[size[0]]
+                size = int(size) if _is_int(size) else None
+            if size is not None and len(items) != size:
+                return "%s has %d items, expecting %d" % (field.name,
+                                                          len(items), size)
+            if check is not None:
+                for item in items:
+                    if not check(item):
+                        return "%s item %s is not a valid %s" % (
+                            field.name, item, field.type)
+        return None
+
+def check(path, validate_args, chrom_sizes, sample_lines=DEFAULT_SAMPLE_LINES,
+          max_errors=DEFAULT_MAX_ERRORS):
+    """Checks up to sample_lines lines of path and returns the errors
+    found, stopping after max_errors. Returns None if validate_args are
+    not for a text bed type, so there is nothing to check.
+
+    chrom_sizes is a dict or the path of a chrom.sizes file.
+    """
+    spec = bed_spec(validate_args)
+    if spec is None:
+        return None
+    if not isinstance(chrom_sizes, dict):
+        chrom_sizes = read_chrom_sizes(chrom_sizes)
+    checker = RowChecker(spec, chrom_sizes)
+    errors = []
+    with open_text(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if sample_lines is not None and line_number > sample_lines:
+                break
+            line = line.rstrip('\r\n')
+            error = checker.check_line(line)
+            if error:
+                errors.append(format_error(path, line_number, error, line))
+                if len(errors) >= max_errors:
+                    break
+    return errors
+
+def format_error(path, line_number, error, line):
+    """Returns an error in a line in the style of validateFiles."""
+    return "Error [file=%s, line=%d]: %s [%s]" % (path, line_number, error,
+                                                  line[:200])
+
+def error_count(errors):
+    """Returns the validateFiles style result for a list of errors."""
+    return "Error count %d\n" % len(errors)
+
+def write_report(path, errors):
+    """Writes errors to the path.report file validateFiles -doReport
+    would, and returns the validateFiles style result."""
+    with open("%s.report" % path, 'w') as f:
+        for error in errors:
+            f.write(error + "\n")
+        f.write(error_count(errors))
+    return error_count(errors)
+
+def failed_result(path, errors):
+    """Writes the path.report file of a file that failed these checks and
+    returns its result: FAILED followed by the validateFiles style
+    result."""
+    return "%s\n%s" % (FAILED, write_report(path, errors))
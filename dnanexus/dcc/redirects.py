@@ -0,0 +1,71 @@
+# Resolution of ENCODE download links to the URLs they redirect to.
+
+import threading
+import urlparse
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+__all__ = ["DEFAULT_THREADS", "MAX_REDIRECTS", "RedirectResolver"]
+
+# Requests in flight at once in RedirectResolver.resolve_all
+DEFAULT_THREADS = 8
+MAX_REDIRECTS = 10
+
+class RedirectResolver:
+    """Finds where portal links such as a file's href redirect to.
+
+    Redirects are followed with HEAD requests while they stay on the
+    portal; the first one that leaves it (e.g. to S3) is returned without
+    being requested. Results are cached per href, and resolve_all()
+    resolves many links concurrently.
+    """
+
+    def __init__(self, session, server, threads=DEFAULT_THREADS):
+        self.session = session
+        self.server = server
+        self.threads = threads
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, href):
+        """Returns the URL href redirects to off the portal, or the URL of
+        href itself if it is served by the portal.
+
+        Raises requests.HTTPError if the portal answers with an error.
+        """
+        with self._lock:
+            if href in self._resolved:
+                return self._resolved[href]
+        url = self._resolve(urlparse.urljoin(self.server, href))
+        with self._lock:
+            self._resolved[href] = url
+        return url
+
+    def resolve_all(self, hrefs):
+        """Returns the resolved URLs of hrefs, in order."""
+        hrefs = list(hrefs)
+        if len(hrefs) <= 1:
+            return [self.resolve(href) for href in hrefs]
+        pool = ThreadPool(min(self.threads, len(hrefs)))
+        try:
+            return pool.map(self.resolve, hrefs)
+        finally:
+            pool.terminate()
+
+    def _resolve(self, url):
+        host = urlparse.urlparse(url).netloc
+        for i in range(MAX_REDIRECTS):
+            response = self.session.head(url, allow_redirects=False)
+            if response.status_code == 405:
+                # No HEAD support: GET without reading the body instead
+                response = self.session.get(url, allow_redirects=False,
+                                            stream=True)
+            response.close()
+            if not response.is_redirect:
+                response.raise_for_status()
+                return url
+            url = urlparse.urljoin(url, response.headers['Location'])
+            if urlparse.urlparse(url).netloc != host:
+                return url
+        raise requests.TooManyRedirects("Too many redirects resolving %s" % url)
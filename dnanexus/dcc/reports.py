@@ -0,0 +1,176 @@
+# Structured results of validateFiles and bedvalidate runs.
+#
+# Both print "Error count N" when they finish and, with -doReport, write
+# path.report holding one "Error [file=..., line=N]: message [line]" line
+# per error before the same count. parse() turns the two into a record
+# with the count, how many errors there were of each class (the message
+# with the values from the offending line and numbers taken out) and
+# the first few errors, and summarize() merges the records of many files
+# into one summary that write_json() and write_tsv() save.
+
+import re
+import json
+
+__all__ = ["DEFAULT_MAX_ERRORS", "TSV_COLUMNS", "ABORTED", "error_count",
+           "is_valid", "error_line_number", "error_class", "parse_report",
+           "parse", "summarize", "write_json", "write_tsv"]
+
+# Errors kept in full per file
+DEFAULT_MAX_ERRORS = 5
+
+TSV_COLUMNS = ["file", "status", "error_count", "error_classes",
+               "first_error", "file_size", "seconds", "mb_per_second"]
+
+# How the output of a validation stopped early starts (see dcc.budget)
+ABORTED = "Aborted"
+
+_ERROR_COUNT = re.compile(r"^Error count (\d+)\s*$", re.M)
+_ERROR_LINE = re.compile(r"^Error \[file=(.*?), line=(\d+)\]: (.*?) \[(.*)\]$")
+_NUMBER = re.compile(r"(?<![\w.])[-+]?\d+(\.\d+)?([eE][-+]?\d+)?(?![\w.])")
+
+def error_count(output):
+    """Returns the count of the last "Error count N" line in validator
+    output, or None if it has none (the validator did not finish)."""
+    counts = _ERROR_COUNT.findall(output or "")
+    if not counts:
+        return None
+    return int(counts[-1])
+
+def is_valid(output):
+    """Returns whether validator output reports no errors."""
+    return error_count(output) == 0
+
+def error_line_number(report_line):
+    """Returns the line number of an "Error [file=..., line=N]" line, or
+    None if report_line is not one."""
+    match = _ERROR_LINE.match(report_line.rstrip("\r\n"))
+    if match:
+        return int(match.group(2))
+    return None
+
+def error_class(message, line=""):
+    """Returns message with the words that come from line and the
+    numbers in it replaced, so that the same error on different lines
+    falls in the same class."""
+    values = set(line.split("\t"))
+    words = []
+    for word in message.split(" "):
+        # Numbers are numbers, even where the line has them too
+        if word in values and not _NUMBER.match(word):
+            word = "<value>"
+        words.append(_NUMBER.sub("N", word))
+    return " ".join(words)
+
+def parse_report(text, max_errors=DEFAULT_MAX_ERRORS):
+    """Returns (count, classes, errors) for the text of a .report file:
+    its error count (or None), a dict of error class to number of errors
+    and the first max_errors errors as dicts of line, message and text."""
+    classes = {}
+    errors = []
+    for report_line in text.splitlines():
+        if not report_line.startswith("Error") or \
+                _ERROR_COUNT.match(report_line):
+            continue
+        match = _ERROR_LINE.match(report_line)
+        if match:
+            path, line_number, message, line = match.groups()
+            error = {"line": int(line_number), "message": message,
+                     "text": line}
+        else:
+            message, line = report_line, ""
+            error = {"line": None, "message": message, "text": ""}
+        cls = error_class(message, line)
+        classes[cls] = classes.get(cls, 0) + 1
+        if len(errors) < max_errors:
+            errors.append(error)
+    return error_count(text), classes, errors
+
+def parse(filename, output, report=None, file_size=None, seconds=None,
+          max_errors=DEFAULT_MAX_ERRORS):
+    """Returns the record of validating filename: the validator's output
+    (its "Error count N" or why it did not run), the text of its .report
+    file if any, and how big the file was and how long it took."""
+    count = error_count(output)
+    classes, errors = {}, []
+    if report is not None:
+        report_count, classes, errors = parse_report(report, max_errors)
+        if count is None:
+            count = report_count
+    if count is None:
+        status = "not validated"
+    elif (output or "").startswith(ABORTED):
+        status = "aborted"
+    elif count == 0:
+        status = "valid"
+    else:
+        status = "invalid"
+    record = {
+        "file": filename,
+        "status": status,
+        "error_count": count,
+        "error_classes": classes,
+        "errors": errors,
+        "output": (output or "").strip(),
+        "file_size": file_size,
+        "seconds": seconds,
+        "mb_per_second": None,
+    }
+    if file_size is not None and seconds:
+        record["mb_per_second"] = file_size / 1024.0 / 1024 / seconds
+    return record
+
+def summarize(records):
+    """Returns a summary of the records of many files: how many had each
+    status, the errors of each class across them, the bytes and seconds
+    spent and the records themselves."""
+    statuses = {}
+    classes = {}
+    file_size = 0
+    seconds = 0.0
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+        for cls, count in record["error_classes"].items():
+            classes[cls] = classes.get(cls, 0) + count
+        file_size += record["file_size"] or 0
+        seconds += record["seconds"] or 0
+    return {
+        "files": len(records),
+        "statuses": statuses,
+        "error_classes": classes,
+        "file_size": file_size,
+        "seconds": seconds,
+        "mb_per_second": file_size / 1024.0 / 1024 / seconds
+        if seconds else None,
+        "records": records,
+    }
+
+def write_json(path, summary):
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+
+def write_tsv(path, summary):
+    """Writes a line of TSV_COLUMNS per record of summary, the invalid
+    files first."""
+    order = {"invalid": 0, "aborted": 1, "not validated": 2, "valid": 3}
+    records = sorted(summary["records"],
+                     key=lambda r: (order.get(r["status"], 3), r["file"]))
+    with open(path, 'w') as f:
+        f.write("\t".join(TSV_COLUMNS) + "\n")
+        for record in records:
+            first = record["errors"][0] if record["errors"] else None
+            fields = [
+                record["file"], record["status"], record["error_count"],
+                "; ".join("%s (%d)" % (cls, count) for cls, count in
+                          sorted(record["error_classes"].items(),
+                                 key=lambda c: (-c[1], c[0]))),
+                "line %s: %s" % (first["line"], first["message"])
+                if first else "",
+                record["file_size"],
+                "%.2f" % record["seconds"]
+                if record["seconds"] is not None else None,
+                "%.2f" % record["mb_per_second"]
+                if record["mb_per_second"] is not None else None,
+            ]
+            f.write("\t".join("" if field is None
+                              else str(field).replace("\t", " ")
+                              for field in fields) + "\n")
@@ -0,0 +1,228 @@
+# Cache of validation results, keyed by what decides them.
+#
+# A validation result (the "Error count N" string and the .report file)
+# depends only on the file's contents, the validator's arguments and the
+# encValData files those arguments name. ValidationCache keys results on
+# the file's MD5, the argument vector and the SHA-1 of every file an
+# argument refers to, so that reruns on the same file with the same
+# chrom.sizes and .as files skip validation altogether. Results are kept
+# in a pluggable store: LocalStore keeps them in a local directory and
+# DXStore in a folder of a DNAnexus project, through a client object so
+# that it can be tested without dxpy.
+
+import os
+import sys
+import json
+import errno
+import random
+import hashlib
+import threading
+
+import download
+
+__all__ = ["DEFAULT_MAX_ENTRIES", "DEFAULT_EVICT_FRACTION", "file_sha1",
+           "validation_key", "LocalStore", "DxpyClient", "DXStore",
+           "ValidationCache"]
+
+DEFAULT_MAX_ENTRIES = 10000
+# Share of DXStore puts that also list the folder to evict old entries
+DEFAULT_EVICT_FRACTION = 0.01
+
+_sha1s = {}
+_sha1s_lock = threading.Lock()
+
+def file_sha1(path):
+    """Returns the SHA-1 of a file's contents, remembered while its size
+    and modification time stay the same."""
+    stat = os.stat(path)
+    signature = (path, stat.st_size, stat.st_mtime)
+    with _sha1s_lock:
+        if signature in _sha1s:
+            return _sha1s[signature]
+    sha1 = download.file_digest(path, "sha1")
+    with _sha1s_lock:
+        _sha1s[signature] = sha1
+    return sha1
+
+def validation_key(md5sum, argv):
+    """Returns the cache key of validating a file with MD5 md5sum using
+    argv, the validator's arguments less the file name.
+
+    Arguments naming files (-as=path, -chromInfo=path) are keyed on the
+    files' contents rather than their paths.
+    """
+    normalized = []
+    for arg in argv:
+        option, sep, value = arg.partition('=')
+        if sep and os.path.isfile(value):
+            arg = "%s=sha1:%s" % (option, file_sha1(value))
+        normalized.append(arg)
+    return hashlib.sha1(json.dumps([md5sum, normalized])).hexdigest()
+
+class LocalStore:
+    """Stores entries as files in a directory, keeping the max_entries
+    most recently used."""
+
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        try:
+            os.makedirs(directory)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except IOError, e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+        # The modification time records the last use, for eviction
+        os.utime(self._path(key), None)
+        return data
+
+    def put(self, key, data):
+        tmp = "%s.%d.tmp" % (self._path(key), os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.rename(tmp, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass  # removed by another process
+        entries.sort()
+        for mtime, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+class DxpyClient:
+    """The few DNAnexus operations DXStore needs, on one project."""
+
+    def __init__(self, project):
+        import dxpy
+        self.dxpy = dxpy
+        self.project = project
+
+    def find(self, folder, name):
+        """Returns the ID of the closed file called name in folder, or
+        None."""
+        for result in self.dxpy.find_data_objects(
+                classname='file', state='closed', project=self.project,
+                folder=folder, recurse=False, name=name, name_mode='exact',
+                limit=1):
+            return result['id']
+        return None
+
+    def read(self, file_id):
+        return self.dxpy.open_dxfile(file_id, project=self.project).read()
+
+    def upload(self, folder, name, data):
+        self.dxpy.upload_string(data, project=self.project, folder=folder,
+                                name=name, parents=True, wait_on_close=True)
+
+    def list(self, folder):
+        """Returns (created, ID) of every file in folder."""
+        return [(result['describe']['created'], result['id'])
+                for result in self.dxpy.find_data_objects(
+                    classname='file', project=self.project, folder=folder,
+                    recurse=False, describe=True)]
+
+    def remove(self, file_ids):
+        self.dxpy.DXProject(self.project).remove_objects(file_ids)
+
+class DXStore:
+    """Stores entries as files in a DNAnexus project folder, keeping about
+    the max_entries newest. client is a DxpyClient or a stand-in for one.
+
+    Listing the folder costs as much as the folder holds, so only a random
+    evict_fraction of puts do it; in between, the folder grows past
+    max_entries by around 1/evict_fraction entries.
+    """
+
+    def __init__(self, client, folder, max_entries=DEFAULT_MAX_ENTRIES,
+                 evict_fraction=DEFAULT_EVICT_FRACTION):
+        self.client = client
+        self.folder = folder
+        self.max_entries = max_entries
+        self.evict_fraction = evict_fraction
+
+    def get(self, key):
+        file_id = self.client.find(self.folder, key + ".json")
+        if file_id is None:
+            return None
+        return self.client.read(file_id)
+
+    def put(self, key, data):
+        self.client.upload(self.folder, key + ".json", data)
+        if random.random() < self.evict_fraction:
+            self._evict()
+
+    def _evict(self):
+        entries = sorted(self.client.list(self.folder))
+        doomed = [file_id for created, file_id
+                  in entries[:max(0, len(entries) - self.max_entries)]]
+        if doomed:
+            self.client.remove(doomed)
+
+class ValidationCache:
+    """Validation results in a LocalStore or DXStore.
+
+    Only results validation finished with ("Error count N") are stored,
+    not those of a validator that failed to run or of a pre-check.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, key):
+        """Returns (valid, report) for key, or None."""
+        data = self.store.get(key)
+        if data is None:
+            return None
+        entry = json.loads(data)
+        return entry["valid"], entry["report"]
+
+    def put(self, key, valid, report):
+        self.store.put(key, json.dumps({"valid": valid, "report": report}))
+
+    def validate(self, md5sum, argv, filename, run):
+        """Returns the result of validating filename with argv, calling
+        run() to do it on a miss. On a hit filename.report is written from
+        the cache, as the validator would have written it."""
+        key = validation_key(md5sum, argv)
+        report_path = "%s.report" % filename
+        # A cache that cannot be reached only costs the validation
+        try:
+            hit = self.get(key)
+        except Exception, e:
+            print >> sys.stderr, "Validation cache unavailable: %s" % e
+            hit = None
+        if hit is not None:
+            valid, report = hit
+            with open(report_path, 'w') as f:
+                f.write(report)
+            return valid
+        valid = run()
+        if valid.startswith("Error count") and os.path.exists(report_path):
+            with open(report_path) as f:
+                report = f.read()
+            try:
+                self.put(key, valid, report)
+            except Exception, e:
+                print >> sys.stderr, "Validation cache unavailable: %s" % e
+        return valid
@@ -0,0 +1,135 @@
+# Single pass checks of files before they are posted to ENCODE.
+#
+# scan() reads a file once and returns its MD5 and size together with
+# the number of lines and bytes of its (uncompressed) contents. gzip
+# files have every member decompressed, which checks their CRCs and
+# lengths on the way. Uncompressed files can be gzipped in the same
+# pass, in which case the MD5 and size are those of the compressed copy.
+# Compression can be spread over threads with dcc.compress.
+
+import zlib
+import gzip
+import hashlib
+
+import compress
+
+__all__ = ["BLOCK_SIZE", "COMPRESS_LEVEL", "ScanError", "scan"]
+
+BLOCK_SIZE = 4 * 1024 * 1024
+COMPRESS_LEVEL = compress.DEFAULT_LEVEL
+GZIP_MAGIC = '\x1f\x8b'
+
+class ScanError(Exception):
+    """A gzip file is truncated or corrupt."""
+    pass
+
+class _Counter:
+    def __init__(self):
+        self.lines = 0
+        self.size = 0
+
+    def feed(self, data):
+        self.lines += data.count('\n')
+        self.size += len(data)
+
+class _HashingWriter:
+    """Writes to a file, keeping the MD5 and size of what was written."""
+
+    def __init__(self, f):
+        self.f = f
+        self.md5 = hashlib.md5()
+        self.size = 0
+
+    def write(self, data):
+        self.md5.update(data)
+        self.size += len(data)
+        self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+class _GzipChecker:
+    """Decompresses the members of a gzip stream fed to it in pieces."""
+
+    def __init__(self):
+        self.members = 0
+        self._start()
+
+    def _start(self):
+        self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.members += 1
+
+    def feed(self, data):
+        """Returns the data decompressed from data."""
+        out = []
+        while data:
+            try:
+                out.append(self._inflate.decompress(data))
+            except zlib.error, e:
+                raise ScanError("Invalid gzip member %d: %s" %
+                                (self.members, e))
+            data = self._inflate.unused_data
+            if data:
+                # The member ended and another one follows
+                self._start()
+        return ''.join(out)
+
+    def close(self):
+        """Returns the last of the decompressed data, raising ScanError if
+        the stream ends part way through a member."""
+        # zlib in Python 2 does not say whether a stream is complete, but
+        # anything fed after the end of one is left in unused_data
+        try:
+            self._inflate.decompress('\0')
+        except zlib.error:
+            pass
+        if not self._inflate.unused_data:
+            raise ScanError("Truncated gzip member %d" % self.members)
+        return self._inflate.flush()
+
+def scan(path, compress_to=None, block_size=BLOCK_SIZE,
+         compress_level=COMPRESS_LEVEL, threads=1, bgzf=False):
+    """Reads path once and returns a dict of its md5sum and file_size and
+    the lines and data_size of its uncompressed contents. gzip files also
+    have the number of members they hold in members.
+
+    If compress_to is given, path is gzipped to it and md5sum and
+    file_size are those of the compressed file. Its headers hold no
+    mtime, so compressing the same file again gives the same md5sum.
+    With more than one thread, or bgzf set, it is compressed in parallel
+    as a multi-member gzip (see dcc.compress.ParallelGzipWriter). Raises
+    ScanError if path is a corrupt gzip file.
+    """
+    counter = _Counter()
+    result = {}
+    with open(path, 'rb') as f:
+        if compress_to:
+            with open(compress_to, 'wb') as out:
+                writer = _HashingWriter(out)
+                if threads > 1 or bgzf:
+                    gz = compress.ParallelGzipWriter(writer, compress_level,
+                                                     threads, bgzf)
+                else:
+                    gz = gzip.GzipFile(path, 'wb', compress_level, writer,
+                                       mtime=0)
+                for block in iter(lambda: f.read(block_size), ''):
+                    counter.feed(block)
+                    gz.write(block)
+                gz.close()
+            md5, size = writer.md5, writer.size
+        else:
+            md5 = hashlib.md5()
+            size = 0
+            checker = None
+            for block in iter(lambda: f.read(block_size), ''):
+                if size == 0 and block.startswith(GZIP_MAGIC):
+                    checker = _GzipChecker()
+                md5.update(block)
+                size += len(block)
+                counter.feed(checker.feed(block) if checker else block)
+            if checker:
+                counter.feed(checker.close())
+                result["members"] = checker.members
+    result.update({"md5sum": md5.hexdigest(), "file_size": size,
+                   "lines": counter.lines, "data_size": counter.size})
+    return result
@@ -0,0 +1,178 @@
+# Instance types for subjobs, chosen by file format and size.
+#
+# Subjobs run on the applet's default instance type unless
+# dxpy.new_dxjob is given another, so a 50 KB tsv and a 40 GB BAM get the
+# same worker. A Policy picks an instance type per file from a table of
+# rules: the first rule for the file's format (or for any format) whose
+# size limit the file is under and whose instance type has the disk the
+# file needs. The Sizing it returns also says how much disk the file
+# needs and how many threads to work on it with (the instance type's
+# cores). The table can be loaded from JSON to change it without changing
+# code.
+
+import os
+import json
+
+__all__ = ["GB", "INSTANCE_TYPES", "DEFAULT_DISK_FACTOR", "DEFAULT_RULES",
+           "SizingError", "Rule", "Sizing", "Policy", "load"]
+
+GB = 1024 * 1024 * 1024
+
+# Cores, memory (GB) and local disk (GB) of DNAnexus instance types
+INSTANCE_TYPES = {
+    "mem1_ssd1_x2": (2, 3.8, 32),
+    "mem1_ssd1_x4": (4, 7.5, 80),
+    "mem1_ssd1_x8": (8, 15, 160),
+    "mem1_ssd1_x16": (16, 30, 320),
+    "mem1_ssd1_x32": (32, 60, 640),
+    "mem1_ssd2_x4": (4, 7.5, 320),
+    "mem1_ssd2_x8": (8, 15, 640),
+    "mem1_ssd2_x16": (16, 30, 1280),
+    "mem3_hdd2_x2": (2, 15, 420),
+    "mem3_hdd2_x4": (4, 30, 840),
+    "mem3_hdd2_x8": (8, 61, 1680),
+}
+
+# Local disk a file needs, as a multiple of its size: the download, a
+# compressed or uncompressed copy, and reports
+DEFAULT_DISK_FACTOR = 3
+
+class SizingError(Exception):
+    """A sizing table is invalid."""
+    pass
+
+class Rule:
+    """Use instance_type for files of formats (None for any format) of at
+    most max_size bytes (None for any size), given disk_factor times
+    their size in local disk."""
+
+    def __init__(self, instance_type, formats=None, max_size=None,
+                 disk_factor=DEFAULT_DISK_FACTOR):
+        self.instance_type = instance_type
+        self.formats = formats
+        self.max_size = max_size
+        self.disk_factor = disk_factor
+
+    def __repr__(self):
+        return "<Rule %s: %s up to %s bytes>" % (
+            self.instance_type, ",".join(self.formats or ["*"]),
+            self.max_size if self.max_size is not None else "any")
+
+class Sizing:
+    """What a file needs: instance_type to run on, disk bytes of local
+    disk and threads to work on it with."""
+
+    def __init__(self, instance_type, disk, threads):
+        self.instance_type = instance_type
+        self.disk = disk
+        self.threads = threads
+
+    def __repr__(self):
+        return "<Sizing %s: %d bytes of disk, %d threads>" % (
+            self.instance_type, self.disk, self.threads)
+
+DEFAULT_RULES = [
+    # Whole alignments are read into memory by validateFiles
+    Rule("mem3_hdd2_x2", ["bam"], 20 * GB),
+    Rule("mem3_hdd2_x4", ["bam"], 100 * GB),
+    Rule("mem3_hdd2_x8", ["bam"]),
+    Rule("mem1_ssd1_x2", None, 1 * GB),
+    Rule("mem1_ssd1_x4", None, 10 * GB),
+    Rule("mem1_ssd1_x8", None, 40 * GB),
+    Rule("mem1_ssd2_x8", None, 150 * GB),
+    Rule("mem3_hdd2_x8"),
+]
+
+class Policy:
+    """Chooses instance types from rules, a list of Rules tried in order,
+    among instance_types (name to cores, memory and disk)."""
+
+    def __init__(self, rules=None, instance_types=None):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.instance_types = instance_types or INSTANCE_TYPES
+        for rule in self.rules:
+            if rule.instance_type not in self.instance_types:
+                raise SizingError("Unknown instance type %s"
+                                  % rule.instance_type)
+
+    def choose(self, file_format, size):
+        """Returns the Sizing of a file, or None if its size is unknown
+        (None) and the applet's default should be used.
+
+        A file that no rule fits gets the last rule of its format with
+        the largest disk.
+        """
+        if size is None:
+            return None
+        rules = [rule for rule in self.rules
+                 if rule.formats is None or file_format in rule.formats]
+        if not rules:
+            return None
+        chosen = None
+        for rule in rules:
+            cores, memory, disk = self.instance_types[rule.instance_type]
+            if rule.max_size is not None and size > rule.max_size:
+                continue
+            if disk * GB >= size * rule.disk_factor:
+                chosen = rule
+                break
+        if chosen is None:
+            chosen = max(reversed(rules),
+                         key=lambda r: self.instance_types[r.instance_type][2])
+        cores = self.instance_types[chosen.instance_type][0]
+        return Sizing(chosen.instance_type, size * chosen.disk_factor, cores)
+
+    def choose_batch(self, file_formats, size):
+        """Returns the Sizing of a job validating files of file_formats
+        together, size bytes in all, or None for the applet's default.
+
+        Each format's rules are applied to the whole size, and the job
+        gets the chosen instance type with the most memory, then cores,
+        then disk, and the most disk any format needs.
+        """
+        sizings = [sizing for sizing in (self.choose(file_format, size)
+                                         for file_format in set(file_formats))
+                   if sizing is not None]
+        if not sizings:
+            return None
+        def capacity(sizing):
+            cores, memory, disk = self.instance_types[sizing.instance_type]
+            return (memory, cores, disk, sizing.instance_type)
+        chosen = max(sizings, key=capacity)
+        return Sizing(chosen.instance_type,
+                      max(sizing.disk for sizing in sizings), chosen.threads)
+
+    def instance_type(self, file_format, size):
+        """Returns the instance type for a file, or None for the
+        applet's default."""
+        sizing = self.choose(file_format, size)
+        return sizing.instance_type if sizing else None
+
+def load(path):
+    """Returns the Policy in the JSON file at path, or the default policy
+    if there is no such file.
+
+    The file holds {"rules": [{"instance_type": ..., "formats": [...],
+    "max_size": bytes, "disk_factor": n}, ...]} and optionally
+    "instance_types": {name: [cores, memory GB, disk GB]} to add to
+    INSTANCE_TYPES.
+    """
+    if path is None or not os.path.exists(path):
+        return Policy()
+    with open(path) as f:
+        try:
+            table = json.load(f)
+        except ValueError, e:
+            raise SizingError("%s: %s" % (path, e))
+    instance_types = dict(INSTANCE_TYPES)
+    for name, spec in table.get("instance_types", {}).items():
+        instance_types[str(name)] = tuple(spec)
+    rules = []
+    for rule in table.get("rules", []):
+        try:
+            rules.append(Rule(str(rule["instance_type"]),
+                              rule.get("formats"), rule.get("max_size"),
+                              rule.get("disk_factor", DEFAULT_DISK_FACTOR)))
+        except KeyError, e:
+            raise SizingError("%s: rule without %s" % (path, e))
+    return Policy(rules or None, instance_types)
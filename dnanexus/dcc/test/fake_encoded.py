@@ -0,0 +1,228 @@
+# A local HTTP server standing in for the ENCODE portal in tests.
+
+import re
+import json
+import socket
+import hashlib
+import time
+import threading
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    # Room for many clients connecting at once, which would otherwise
+    # wait for SYN retransmits
+    request_queue_size = 128
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffer each response so it is sent in one write rather than being
+    # held up by Nagle's algorithm
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        fake = self.server.fake
+        url = urlparse.urlparse(self.path)
+        with fake.lock:
+            fake.requests.append(self.path)
+        if fake.delay:
+            time.sleep(fake.delay)
+
+        with fake.lock:
+            failure = fake.failures.pop(0) if fake.failures else None
+        if failure is not None:
+            self.send_json(failure, {"status": "error", "code": failure},
+                           {"Retry-After": "0"} if failure == 429 else {})
+            return
+
+        if len(self.path) > fake.max_url_length:
+            self.send_json(414, {"status": "error", "code": 414})
+            return
+
+        if url.path in fake.redirects:
+            self.send_response(307)
+            self.send_header("Location", fake.redirects[url.path])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            self.wfile.flush()
+            return
+        if url.path in fake.files:
+            self.send_file(fake.files[url.path])
+            return
+
+        # Objects are found by the last part of the path, so that
+        # /ENCFF000AAA/, //ENCFF000AAA/ and /files/ENCFF000AAA/ all work
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ["search"]:
+            self.search(urlparse.parse_qs(url.query))
+            return
+        obj = fake.objects.get(parts[-1]) if parts else None
+        if obj is None:
+            self.send_json(404, {"status": "error", "code": 404,
+                                 "title": "Not Found"})
+        else:
+            self.send_json(200, obj)
+
+    def search(self, query):
+        """Answers /search/ queries filtering by type and accession."""
+        graph = []
+        for accession in query.get("accession", []):
+            obj = self.server.fake.objects.get(accession)
+            if obj is None or accession in self.server.fake.unsearchable:
+                continue
+            if "type" in query and "@type" in obj and \
+                    query["type"][0] not in obj["@type"]:
+                continue
+            graph.append(obj)
+        # Like the portal, answer 404 when nothing is found
+        self.send_json(200 if graph else 404, {"@graph": graph,
+                                               "total": len(graph)})
+
+    def do_HEAD(self):
+        fake = self.server.fake
+        path = urlparse.urlparse(self.path).path
+        with fake.lock:
+            fake.requests.append(self.path)
+        if fake.delay:
+            time.sleep(fake.delay)
+        if path in fake.redirects:
+            self.send_response(307)
+            self.send_header("Location", fake.redirects[path])
+        else:
+            parts = [part for part in path.split('/') if part]
+            self.send_response(200 if parts and parts[-1] in fake.objects
+                               else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        self.wfile.flush()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.fake.lock:
+            self.server.fake.requests.append(self.path)
+            failure = self.server.fake.failures.pop(0) \
+                if self.server.fake.failures else None
+        self.send_json(failure or 200, {"status": "success"})
+
+    def send_file(self, data):
+        """Sends data, or the part of it asked for by a Range header."""
+        fake = self.server.fake
+        start, end = 0, len(data) - 1
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if match and fake.ranges:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), len(data) - 1)
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */%d" % len(data))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                self.wfile.flush()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range",
+                             "bytes %d-%d/%d" % (start, end, len(data)))
+        else:
+            self.send_response(200)
+        body = data[start:end + 1]
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"%s"' % hashlib.md5(data).hexdigest())
+        self.end_headers()
+        with fake.lock:
+            truncate = fake.truncations > 0
+            if truncate:
+                fake.truncations -= 1
+        if truncate:
+            # Drop the connection half way through the body
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = 1
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def send_json(self, status, obj, headers={}):
+        body = json.dumps(obj)
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            with self.server.fake.lock:
+                self.server.fake.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            self.wfile.flush()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status == 200:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+class FakeEncoded(object):
+    """Serves JSON objects by accession on a local port.
+
+    objects maps an accession (the last part of a URL path) to the object
+    returned for it. /search/ finds them by accession, except for those
+    in unsearchable. Responses carry an ETag, and requests with a
+    matching If-None-Match are answered 304 (counted in not_modified).
+    Requests for paths in redirects are answered with a redirect to the
+    location they map to, and files maps paths to data served with
+    support for Range requests (unless ranges is False). The next
+    truncations file responses are cut off half way through. Statuses in
+    failures are returned, in order, instead of answering the next
+    requests. Paths of all requests are recorded in requests, each
+    response is delayed by delay seconds to simulate latency, and URLs
+    longer than max_url_length are refused.
+    """
+
+    def __init__(self, objects=None, delay=0, max_url_length=8192):
+        self.objects = dict(objects or {})
+        self.unsearchable = set()
+        self.not_modified = 0
+        self.failures = []
+        self.redirects = {}
+        self.files = {}
+        self.ranges = True
+        self.truncations = 0
+        self.delay = delay
+        self.max_url_length = max_url_length
+        self.requests = []
+        self.lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d/" % self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
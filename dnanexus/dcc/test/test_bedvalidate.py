@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# dcc.bedvalidate tests, comparing the parallel engine with a single pass
+# of dcc.prevalidate over the same files.
+
+import os, sys, gzip, shutil, tempfile, unittest
+from multiprocessing.pool import ThreadPool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import autosql, bedvalidate, prevalidate
+
+AS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+                      "validate-files", "resources", "opt", "data",
+                      "encValData", "as")
+NARROWPEAK = ['-type=bed6+4', '-as=%s/narrowPeak.as' % AS_DIR]
+CHROM_SIZES = {"chr1": 100000000, "chr2": 5000}
+
+def narrow_peak(i):
+    chrom = "chrX" if i % 997 == 500 else "chr1"
+    return "%s\t%d\t%d\t.\t0\t.\t5.1\t-1\t3.2\t%d\n" % (chrom, i * 10,
+                                                      i * 10 + 5, i % 5)
+
+class TestBedValidate(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ENCFF000AAA.bed")
+        self.data = "track name=peaks\n" + "".join(narrow_peak(i)
+                                                  for i in range(10000))
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def expected(self, path, max_errors):
+        return prevalidate.check(path, NARROWPEAK, CHROM_SIZES,
+                                 sample_lines=None, max_errors=max_errors)
+
+    def test_chunk_ranges(self):
+        ranges = bedvalidate.chunk_ranges(self.path, 1000)
+        self.assertTrue(len(ranges) > 100)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(self.data))
+        for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(self.data[end - 1], '\n')
+
+    def test_matches_single_pass(self):
+        lines, errors = bedvalidate.validate(self.path, NARROWPEAK,
+                                             CHROM_SIZES, processes=3,
+                                             chunk_size=1000, max_errors=100)
+        self.assertEqual(lines, 10001)
+        self.assertEqual(len(errors), 10)
+        self.assertEqual(errors, self.expected(self.path, 100))
+
+    def test_max_errors(self):
+        lines, errors = bedvalidate.validate(self.path, NARROWPEAK,
+                                             CHROM_SIZES, processes=3,
+                                             chunk_size=1000, max_errors=3)
+        self.assertEqual(errors, self.expected(self.path, 3))
+
+    def test_gzip(self):
+        with gzip.open(self.path + ".gz", 'wb') as f:
+            f.write(self.data)
+        lines, errors = bedvalidate.validate(self.path + ".gz", NARROWPEAK,
+                                             CHROM_SIZES, processes=2,
+                                             chunk_size=1000, max_errors=100)
+        self.assertEqual(lines, 10001)
+        self.assertEqual(errors, self.expected(self.path + ".gz", 100))
+
+    def test_in_process_threads(self):
+        # As validate-files' process_batch calls it: several files at
+        # once on threads, each checked without a pool
+        paths = [self.path]
+        for n in range(3):
+            path = os.path.join(self.dir, "ENCFF00%dAAB.bed" % n)
+            shutil.copy(self.path, path)
+            paths.append(path)
+        pool = ThreadPool(len(paths))
+        try:
+            results = pool.map(lambda path: bedvalidate.validate(
+                path, NARROWPEAK, CHROM_SIZES, processes=1, chunk_size=1000,
+                max_errors=100), paths)
+        finally:
+            pool.terminate()
+        for path, (lines, errors) in zip(paths, results):
+            self.assertEqual(lines, 10001)
+            self.assertEqual(errors, self.expected(path, 100))
+
+    def test_no_final_newline(self):
+        with open(self.path, 'wb') as f:
+            f.write(narrow_peak(0) + narrow_peak(500).rstrip('\n'))
+        lines, errors = bedvalidate.validate(self.path, NARROWPEAK,
+                                             CHROM_SIZES, processes=1)
+        self.assertEqual(lines, 2)
+        self.assertEqual(len(errors), 1)
+
+    def test_report(self):
+        self.assertEqual(bedvalidate.validate_file(
+            self.path, NARROWPEAK, CHROM_SIZES, processes=2,
+            chunk_size=1000), "Error count 10\n")
+        with open(self.path + ".report") as f:
+            report = f.read().splitlines()
+        self.assertEqual(report[0], "Error [file=%s, line=502]: chrom chrX "
+                         "not found [%s]" % (self.path,
+                                             narrow_peak(500).rstrip('\n')))
+        self.assertEqual(report[-1], "Error count 10")
+
+    def test_not_bed(self):
+        self.assertFalse(bedvalidate.supports(['-type=bigBed6+4']))
+        self.assertTrue(bedvalidate.supports(NARROWPEAK))
+        self.assertRaises(ValueError, bedvalidate.validate, self.path,
+                          ['-type=fastq'], CHROM_SIZES)
+
+class TestArrays(unittest.TestCase):
+    def test_sized_arrays(self):
+        table = autosql.parse('''table t "" (
+            string chrom; "" uint chromStart; "" uint chromEnd; ""
+            uint blockCount; ""
+            int[blockCount] blockSizes; ""
+            enum(on, off) state; ""
+        )''')
+        checker = prevalidate.RowChecker(prevalidate.BedSpec(3, 3, table),
+                                         CHROM_SIZES)
+        self.assertEqual(checker.check_line("chr1\t0\t10\t2\t5,5,\ton"), None)
+        self.assertEqual(checker.check_line("chr1\t0\t10\t2\t5\ton"),
+                         "blockSizes has 1 items, expecting 2")
+        self.assertEqual(checker.check_line("chr1\t0\t10\t2\t5,x\ton"),
+                         "blockSizes item x is not a valid int")
+        self.assertEqual(checker.check_line("chr1\t0\t10\t2\t5,5\tup"),
+                         "state up is not a valid enum")
+
+if __name__ == '__main__':
+    unittest.main()
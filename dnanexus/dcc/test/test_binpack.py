@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# dcc.binpack tests.
+
+import os, sys, random, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import binpack
+
+class TestFirstFitDecreasing(unittest.TestCase):
+    def test_pack(self):
+        items = [(size, "f%d" % size) for size in [2, 5, 4, 7, 1, 3, 8]]
+        self.assertEqual(binpack.first_fit_decreasing(items, 10),
+                         [["f8", "f2"], ["f7", "f3"], ["f5", "f4", "f1"]])
+
+    def test_ties_keep_order(self):
+        items = [(1, "a"), (1, "b"), (1, "c")]
+        self.assertEqual(binpack.first_fit_decreasing(items, 2),
+                         [["a", "b"], ["c"]])
+
+    def test_oversized(self):
+        items = [(15, "big"), (3, "small")]
+        self.assertEqual(binpack.first_fit_decreasing(items, 10),
+                         [["big"], ["small"]])
+
+    def test_max_items(self):
+        items = [(1, i) for i in range(7)]
+        self.assertEqual(binpack.first_fit_decreasing(items, 100, 3),
+                         [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_capacity_respected(self):
+        rand = random.Random(0)
+        items = [(rand.randint(1, 100), i) for i in range(500)]
+        sizes = dict((item, size) for size, item in items)
+        bins = binpack.first_fit_decreasing(items, 250)
+        self.assertEqual(sorted(item for b in bins for item in b),
+                         range(500))
+        for b in bins:
+            self.assertTrue(sum(sizes[item] for item in b) <= 250)
+        # First fit decreasing needs at most 11/9 of the optimum, plus one
+        self.assertTrue(len(bins) <= sum(sizes.values()) * 11 / 9 / 250 + 2)
+
+    def test_empty(self):
+        self.assertEqual(binpack.first_fit_decreasing([], 10), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# dcc.budget tests, with a stand-in for validateFiles that prints errors
+# to stderr as it goes.
+
+import os, sys, time, shutil, tempfile, subprocess, unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import budget, reports
+
+VALIDATOR = '''
+import sys, time
+errors, lines, pause = [int(arg) for arg in sys.argv[1:4]]
+sys.stderr.write("reading x.bed\\n")
+for i in range(errors):
+    sys.stderr.write("Error [file=x.bed, line=%d]: chrom chrX not found "
+                     "[chrX\\t1\\t2]\\n" % ((i + 1) * lines))
+    sys.stderr.flush()
+time.sleep(pause)
+print "Error count %d" % errors
+sys.exit(int(sys.argv[4]) if len(sys.argv) > 4 else 0)
+'''
+
+class TestErrorBudget(unittest.TestCase):
+    def test_spent(self):
+        self.assertEqual(budget.ErrorBudget(3).spent([1, 2]), None)
+        self.assertEqual(budget.ErrorBudget(3).spent([1, 2, 3]), "3 errors")
+        early = budget.ErrorBudget(None, 100)
+        self.assertEqual(early.spent([100]), "error in the first 100 lines")
+        self.assertEqual(early.spent([101]), None)
+        self.assertEqual(budget.ErrorBudget().spent(range(1000)), None)
+
+    def test_default(self):
+        self.assertEqual(budget.DEFAULT_BUDGET.spent([50000]), None)
+        self.assertEqual(budget.DEFAULT_BUDGET.spent(range(20000, 21000)),
+                         None)
+        self.assertEqual(budget.DEFAULT_BUDGET.spent([10]),
+                         "error in the first %d lines" %
+                         budget.DEFAULT_FIRST_LINES)
+
+class TestCheckOutput(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.report = os.path.join(self.dir, "x.bed.report")
+        self.stderr = sys.stderr
+        sys.stderr = StringIO()
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+        shutil.rmtree(self.dir)
+
+    def validator(self, *args):
+        return [sys.executable, "-c", VALIDATOR] + [str(arg) for arg in args]
+
+    def test_abort(self):
+        start = time.time()
+        valid = budget.check_output(self.validator(5, 10, 60),
+                                    budget.ErrorBudget(max_errors=3),
+                                    self.report)
+        self.assertTrue(time.time() - start < 30)
+        self.assertEqual(valid, "Aborted after 3 errors\nError count 3\n")
+        self.assertFalse(reports.is_valid(valid))
+        with open(self.report) as f:
+            count, classes, errors = reports.parse_report(f.read())
+        self.assertEqual((count, [e["line"] for e in errors]),
+                         (3, [10, 20, 30]))
+        self.assertEqual(reports.parse("x.bed", valid)["status"], "aborted")
+
+    def test_early_error(self):
+        valid = budget.check_output(self.validator(1, 50, 60),
+                                    budget.ErrorBudget(first_lines=100),
+                                    self.report)
+        self.assertTrue(valid.startswith("Aborted after error in the first "
+                                         "100 lines"))
+
+    def test_within_budget(self):
+        valid = budget.check_output(self.validator(2, 1000, 0),
+                                    budget.ErrorBudget(10, 100), self.report)
+        self.assertEqual(valid, "Error count 2\n")
+        self.assertFalse(os.path.exists(self.report))
+        # Every line of stderr is passed on, errors or not
+        self.assertEqual(sys.stderr.getvalue().splitlines()[:2],
+                         ["reading x.bed", "Error [file=x.bed, line=1000]: "
+                          "chrom chrX not found [chrX\t1\t2]"])
+
+    def test_validator_limit(self):
+        # validateFiles' own tenth error is its result, not an abort
+        valid = budget.check_output(self.validator(10, 20000, 0),
+                                    budget.DEFAULT_BUDGET, self.report)
+        self.assertEqual(valid, "Error count 10\n")
+
+    def test_failure(self):
+        try:
+            budget.check_output(self.validator(2, 1000, 0, 2),
+                                budget.ErrorBudget(10), self.report)
+        except subprocess.CalledProcessError, e:
+            self.assertEqual(e.returncode, 2)
+            self.assertTrue(e.output.startswith("Error count 2\n"
+                                                "reading x.bed\n"))
+            self.assertEqual(len(e.stderr.splitlines()), 3)
+        else:
+            self.fail("CalledProcessError not raised")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# dcc.cache and encoded.CachingSession tests.
+
+import os, sys, time, shutil, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import cache, encoded
+from fake_encoded import FakeEncoded
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "responses.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+class TestResponseCache(CacheTestCase):
+    def test_put_get(self):
+        responses = cache.ResponseCache(self.path)
+        key = responses.key("http://x/ENCFF000AAA/", "id")
+        self.assertEqual(responses.get(key), None)
+        responses.put(key, "http://x/ENCFF000AAA/", {"ETag": '"1"'}, "{}")
+        entry = responses.get(key)
+        self.assertEqual(entry["body"], "{}")
+        self.assertEqual(entry["etag"], '"1"')
+        self.assertTrue(entry["fresh"])
+        # Keys differ by credentials
+        self.assertNotEqual(key, responses.key("http://x/ENCFF000AAA/", "other"))
+
+    def test_ttl(self):
+        responses = cache.ResponseCache(self.path, ttl=0.2)
+        responses.put("k", "u", {}, "body")
+        time.sleep(0.3)
+        self.assertFalse(responses.get("k")["fresh"])
+        responses.refresh("k")
+        self.assertTrue(responses.get("k")["fresh"])
+
+    def test_lru_eviction(self):
+        responses = cache.ResponseCache(self.path, max_bytes=3000)
+        for i in range(3):
+            responses.put("k%d" % i, "u", {}, "x" * 1000)
+            time.sleep(0.01)
+        responses.get("k0")
+        responses.put("k3", "u", {}, "x" * 1000)
+        self.assertEqual(responses.size(), (3, 3000))
+        self.assertEqual(responses.get("k1"), None)
+        self.assertNotEqual(responses.get("k0"), None)
+
+class TestCachingSession(CacheTestCase):
+    def setUp(self):
+        CacheTestCase.setUp(self)
+        self.server = FakeEncoded({"ENCFF000AAA": {"accession": "ENCFF000AAA"}})
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        CacheTestCase.tearDown(self)
+
+    def test_fresh_entries_skip_server(self):
+        session = encoded.new_session("id", "pw",
+                                      cache=cache.ResponseCache(self.path))
+        url = self.server.url + "ENCFF000AAA/?frame=embedded"
+        first = session.get(url)
+        second = session.get(url)
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.json(), {"accession": "ENCFF000AAA"})
+        self.assertEqual(len(self.server.requests), 1)
+        session.close()
+
+    def test_stale_entries_are_revalidated(self):
+        responses = cache.ResponseCache(self.path, ttl=0)
+        session = encoded.new_session(cache=responses)
+        url = self.server.url + "ENCFF000AAA/?frame=embedded"
+        session.get(url)
+        self.assertEqual(session.get(url).json()["accession"], "ENCFF000AAA")
+        self.assertEqual(self.server.not_modified, 1)
+
+        # A changed object is downloaded again
+        self.server.objects["ENCFF000AAA"] = {"accession": "ENCFF000AAA",
+                                              "status": "released"}
+        response = session.get(url)
+        self.assertFalse(response.from_cache)
+        self.assertEqual(response.json()["status"], "released")
+        self.assertEqual(self.server.not_modified, 1)
+        session.close()
+
+    def test_errors_are_not_cached(self):
+        session = encoded.new_session(cache=cache.ResponseCache(self.path))
+        url = self.server.url + "ENCFF999ZZZ/"
+        self.assertEqual(session.get(url).status_code, 404)
+        self.assertEqual(session.get(url).status_code, 404)
+        self.assertEqual(len(self.server.requests), 2)
+        session.close()
+
+if __name__ == '__main__':
+    unittest.main()
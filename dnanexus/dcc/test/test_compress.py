@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# dcc.compress tests, checked with the gzip module and the gzip command.
+
+import os, sys, gzip, struct, shutil, tempfile, subprocess, unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import compress, scan
+
+BED = "".join("chr1\t%d\t%d\t.\t1000\t+\t%d\t%d\t0,255,0\t%d\t%d\n" %
+              (i, i + 1, i, i + 1, i % 50, i % 100)
+              for i in range(0, 3000000, 100))
+
+def gzip_module(data):
+    return gzip.GzipFile(fileobj=StringIO(data)).read()
+
+def gzip_command(data):
+    process = subprocess.Popen(["gzip", "-dc"], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE)
+    out = process.communicate(data)[0]
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, "gzip")
+    return out
+
+def bgzf_blocks(data):
+    """Returns the (BSIZE, ISIZE) of each BGZF block in data."""
+    blocks = []
+    while data:
+        magic, flags, xlen, si1, si2, slen, bsize = struct.unpack(
+            "<HxB6xHBBHH", data[:18])
+        assert (magic, flags, xlen, si1, si2, slen) == \
+            (0x8b1f, 4, 6, ord('B'), ord('C'), 2)
+        isize = struct.unpack("<I", data[bsize - 3:bsize + 1])[0]
+        blocks.append((bsize, isize))
+        data = data[bsize + 1:]
+    return blocks
+
+class TestParallelGzipWriter(unittest.TestCase):
+    def compress(self, data, piece=100000, **kwargs):
+        out = StringIO()
+        writer = compress.ParallelGzipWriter(out, **kwargs)
+        for start in range(0, len(data), piece):
+            writer.write(data[start:start + piece])
+        writer.close()
+        return out.getvalue()
+
+    def test_members(self):
+        data = self.compress(BED, threads=4, block_size=100000)
+        self.assertEqual(gzip_module(data), BED)
+        self.assertEqual(gzip_command(data), BED)
+
+    def test_bgzf(self):
+        data = self.compress(BED, threads=4, bgzf=True)
+        self.assertEqual(gzip_command(data), BED)
+        blocks = bgzf_blocks(data)
+        self.assertTrue(all(bsize < 0x10000 for bsize, isize in blocks))
+        self.assertEqual([isize for bsize, isize in blocks[:-2]],
+                         [compress.BGZF_BLOCK_SIZE] * (len(blocks) - 2))
+        self.assertEqual(sum(isize for bsize, isize in blocks), len(BED))
+        self.assertTrue(data.endswith(compress.BGZF_EOF))
+
+    def test_incompressible_bgzf(self):
+        data = os.urandom(200000)
+        out = self.compress(data, bgzf=True, level=9)
+        self.assertEqual(gzip_command(out), data)
+        self.assertTrue(all(bsize < 0x10000 for bsize, isize
+                            in bgzf_blocks(out)))
+
+    def test_empty(self):
+        for bgzf in (False, True):
+            data = self.compress("", bgzf=bgzf)
+            self.assertEqual(gzip_command(data), "")
+
+class TestScanCompress(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ENCFF000AAA.bed")
+        with open(self.path, 'wb') as f:
+            f.write(BED)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_scan(self):
+        result = scan.scan(self.path, compress_to=self.path + ".gz",
+                           threads=4, block_size=65536)
+        with open(self.path + ".gz", 'rb') as f:
+            self.assertEqual(gzip_command(f.read()), BED)
+        rescanned = scan.scan(self.path + ".gz")
+        self.assertEqual(rescanned["md5sum"], result["md5sum"])
+        self.assertEqual(rescanned["lines"], 30000)
+        self.assertTrue(rescanned["members"] > 1)
+
+if __name__ == '__main__':
+    unittest.main()
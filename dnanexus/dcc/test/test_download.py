@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# dcc.download tests, run against a local file server.
+
+import os, sys, json, shutil, hashlib, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import encoded, download
+from fake_encoded import FakeEncoded
+
+DATA = "".join(chr(i % 251) for i in range(100000))
+MD5 = hashlib.md5(DATA).hexdigest()
+PATH = "/2015/01/01/ENCFF000AAA.fastq.gz"
+
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeEncoded().start()
+        self.server.files[PATH] = DATA
+        self.url = self.server.url + PATH.lstrip('/')
+        self.session = encoded.EncodedSession(retries=0)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ENCFF000AAA.fastq.gz")
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def download(self, url=None, **kwargs):
+        kwargs.setdefault("part_size", 10000)
+        return download.download(url or self.url, self.path,
+                                 session=self.session, **kwargs)
+
+    def contents(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_parts(self):
+        self.assertEqual(self.download(md5sum=MD5, threads=4), MD5)
+        self.assertEqual(self.contents(), DATA)
+        # The probe and ten parts
+        self.assertEqual(len(self.server.requests), 11)
+        self.assertFalse(os.path.exists(self.path + download.STATE_SUFFIX))
+
+    def test_md5_mismatch(self):
+        self.assertRaises(download.DownloadError, self.download,
+                          md5sum="0" * 32)
+
+    def test_no_range_support(self):
+        self.server.ranges = False
+        self.assertEqual(self.download(md5sum=MD5), MD5)
+        self.assertEqual(self.contents(), DATA)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_truncated_parts_are_retried(self):
+        self.server.truncations = 3
+        self.assertEqual(self.download(md5sum=MD5), MD5)
+        self.assertEqual(self.contents(), DATA)
+
+    def test_gives_up(self):
+        self.server.truncations = 100
+        self.assertRaises(download.DownloadError, self.download, attempts=2)
+        # The finished parts are kept for the next attempt
+        self.assertTrue(os.path.exists(self.path + download.STATE_SUFFIX))
+
+    def test_resume(self):
+        # Leave a download with parts 0 and 5 done and the rest zeroed
+        with open(self.path, 'wb') as f:
+            f.write(DATA[:10000] + "\0" * 40000 + DATA[50000:60000] +
+                    "\0" * 40000)
+        with open(self.path + download.STATE_SUFFIX, 'w') as f:
+            json.dump({"size": len(DATA), "validator": '"%s"' % MD5,
+                       "part_size": 10000, "done": [0, 5]}, f)
+        self.assertEqual(self.download(md5sum=MD5), MD5)
+        self.assertEqual(len(self.server.requests), 9)
+
+    def test_stale_state_is_ignored(self):
+        with open(self.path, 'wb') as f:
+            f.write("\0" * len(DATA))
+        with open(self.path + download.STATE_SUFFIX, 'w') as f:
+            json.dump({"size": len(DATA), "validator": '"changed"',
+                       "part_size": 10000, "done": range(10)}, f)
+        self.assertEqual(self.download(md5sum=MD5), MD5)
+
+    def test_redirect(self):
+        self.server.redirects["/files/ENCFF000AAA/@@download/"] = self.url
+        self.assertEqual(self.download(
+            self.server.url + "files/ENCFF000AAA/@@download/"), MD5)
+        # Only the probe is redirected
+        self.assertEqual(self.server.requests.count(PATH), 11)
+
+    def test_empty(self):
+        self.server.files[PATH] = ""
+        self.assertEqual(self.download(), hashlib.md5("").hexdigest())
+        self.assertEqual(self.contents(), "")
+
+if __name__ == '__main__':
+    unittest.main()
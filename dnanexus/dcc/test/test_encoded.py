@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# dcc.encoded session retry and metrics tests.
+
+import os, sys, socket, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import requests
+
+from dcc import encoded
+from fake_encoded import FakeEncoded
+
+class TestEncodedSession(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeEncoded({"ENCFF000AAA": {"accession": "ENCFF000AAA"}})
+        self.server.start()
+        self.url = self.server.url + "ENCFF000AAA/"
+        self.metrics = encoded.RequestMetrics()
+        self.session = encoded.new_session(retries=3, backoff=0,
+                                           metrics=self.metrics)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_retries_server_errors(self):
+        self.server.failures = [503, 429, 500]
+        response = self.session.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.requests), 4)
+        summary = self.metrics.summary()
+        self.assertEqual(summary["requests"], 4)
+        self.assertEqual(summary["retries"], 3)
+        self.assertEqual(summary["statuses"], {200: 1, 429: 1, 500: 1, 503: 1})
+
+    def test_gives_up_after_retries(self):
+        self.server.failures = [502] * 5
+        self.assertEqual(self.session.get(self.url).status_code, 502)
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.failures = [403]
+        self.assertEqual(self.session.get(self.url).status_code, 403)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_post_is_not_retried(self):
+        self.server.failures = [503]
+        self.assertEqual(self.session.post(self.url, data="{}").status_code,
+                         503)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_connection_errors(self):
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        url = "http://127.0.0.1:%d/" % sock.getsockname()[1]
+        sock.close()
+        self.assertRaises(requests.ConnectionError, self.session.get, url)
+        self.assertEqual(self.metrics.summary()["errors"], 4)
+
+    def test_backoff(self):
+        session = encoded.EncodedSession(backoff=0.5)
+        self.assertEqual([session._backoff(attempt) for attempt in range(3)],
+                         [0.5, 1, 2])
+        self.assertEqual(session._backoff(20), encoded.MAX_BACKOFF)
+
+if __name__ == '__main__':
+    unittest.main()
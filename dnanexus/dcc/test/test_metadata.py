@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# dcc.metadata tests, run against a local stand-in for the ENCODE portal.
+
+import os, sys, time, threading, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import encoded, metadata
+from fake_encoded import FakeEncoded
+
+def make_files(count):
+    """Returns dx file ids and a fake dxpy.describe naming them ENCFF files."""
+    files = ["file-%04d" % i for i in range(count)]
+    names = dict((file_obj, "ENCFF%03dAAA.bed.gz" % i)
+                 for i, file_obj in enumerate(files))
+    def describe(file_obj):
+        return {"id": file_obj, "name": names[file_obj]}
+    return files, names, describe
+
+class TestFetchFileMetadata(unittest.TestCase):
+    def setUp(self):
+        objects = dict(("ENCFF%03dAAA" % i, {"accession": "ENCFF%03dAAA" % i,
+                                             "file_format": "bed"})
+                       for i in range(20))
+        self.server = FakeEncoded(objects, delay=0.1).start()
+        self.session = encoded.new_session(pool_size=metadata.DEFAULT_THREADS)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_results_in_input_order(self):
+        files, names, describe = make_files(20)
+        results = list(metadata.fetch_file_metadata(
+            files, describe, self.session, self.server.url))
+        self.assertEqual([result[0] for result in results], files)
+        for file_obj, filename, file_meta in results:
+            self.assertEqual(filename, names[file_obj])
+            self.assertEqual(file_meta["accession"], filename[:11])
+        # Looked up with a few searches rather than a request per file
+        self.assertTrue(len(self.server.requests) < 5)
+        for path in self.server.requests:
+            self.assertTrue(path.startswith("/search/?type=File"))
+
+    def test_requests_are_concurrent(self):
+        files, names, describe = make_files(16)
+        start = time.time()
+        list(metadata.fetch_file_metadata(files, describe, self.session,
+                                          self.server.url, threads=8))
+        # 16 requests of 0.1 seconds take 1.6 seconds one at a time
+        self.assertTrue(time.time() - start < 0.8)
+
+    def test_first_result_before_last_is_fetched(self):
+        files, names, describe = make_files(4)
+        release = threading.Event()
+        def slow_describe(file_obj):
+            if file_obj == files[-1]:
+                release.wait(5)
+            return describe(file_obj)
+        results = metadata.fetch_file_metadata(files, slow_describe,
+                                               self.session, self.server.url)
+        self.assertEqual(results.next()[0], files[0])
+        release.set()
+        self.assertEqual(len(list(results)), 3)
+
+    def test_non_encode_file(self):
+        describe = lambda file_obj: {"name": "reads.fastq.gz"}
+        results = list(metadata.fetch_file_metadata(
+            ["file-0001"], describe, self.session, self.server.url))
+        self.assertEqual(results, [("file-0001", "reads.fastq.gz", None)])
+        self.assertEqual(self.server.requests, [])
+
+    def test_unknown_accession(self):
+        files, names, describe = make_files(22)
+        results = list(metadata.fetch_file_metadata(
+            files, describe, self.session, self.server.url))
+        self.assertEqual([file_meta is None for _, _, file_meta in results],
+                         [False] * 20 + [True] * 2)
+
+class TestGetObjects(unittest.TestCase):
+    def setUp(self):
+        self.accessions = ["ENCFF%03dAAA" % i for i in range(300)]
+        objects = dict((acc, {"accession": acc, "@type": ["File", "Item"]})
+                       for acc in self.accessions)
+        objects["ENCSR000AAA"] = {"accession": "ENCSR000AAA",
+                                  "@type": ["Experiment", "Item"]}
+        self.server = FakeEncoded(objects, max_url_length=1000).start()
+        self.session = encoded.new_session()
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_search_urls_are_chunked(self):
+        urls = metadata.search_urls(self.server.url, self.accessions,
+                                    max_url_length=1000)
+        self.assertTrue(len(urls) > 1)
+        for url in urls:
+            self.assertTrue(len(url) <= 1000)
+        self.assertEqual(sum(url.count("&accession=") for url in urls), 300)
+
+    def test_get_objects(self):
+        found = metadata.get_objects(self.session, self.server.url,
+                                     self.accessions + self.accessions[:5],
+                                     max_url_length=1000)
+        self.assertEqual(sorted(found.keys()), self.accessions)
+        self.assertEqual(len(self.server.requests),
+                         len(metadata.search_urls(self.server.url,
+                                                  self.accessions,
+                                                  max_url_length=1000)))
+
+    def test_falls_back_to_get(self):
+        self.server.unsearchable.add("ENCFF001AAA")
+        found = metadata.get_objects(self.session, self.server.url,
+                                     ["ENCFF000AAA", "ENCFF001AAA",
+                                      "ENCFF999ZZZ"])
+        self.assertEqual(sorted(found.keys()), ["ENCFF000AAA", "ENCFF001AAA"])
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_type(self):
+        found = metadata.get_objects(self.session, self.server.url,
+                                     ["ENCSR000AAA"], obj_type="Experiment")
+        self.assertEqual(found.keys(), ["ENCSR000AAA"])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_path_accession(self):
+        self.assertEqual(metadata.path_accession("/files/ENCFF000AAA/"),
+                         "ENCFF000AAA")
+        self.assertEqual(metadata.path_accession("ENCFF000AAA"), "ENCFF000AAA")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# dcc.prevalidate and dcc.autosql tests, using the .as files shipped with
+# validate-files.
+
+import os, sys, gzip, shutil, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import autosql, prevalidate
+
+AS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+                      "validate-files", "resources", "opt", "data",
+                      "encValData", "as")
+NARROWPEAK = ['-type=bed6+4', '-as=%s/narrowPeak.as' % AS_DIR]
+BEDMETHYL = ['-type=bed9+2', '-as=%s/bedMethyl.as' % AS_DIR]
+CHROM_SIZES = {"chr1": 10000, "chr2": 5000}
+
+def narrow_peak(chrom="chr1", start=100, end=200, score="0", strand=".",
+                peak="50"):
+    return "\t".join([chrom, str(start), str(end), ".", score, strand, "5.1",
+                      "-1", "3.2e-5", peak])
+
+class TestAutoSql(unittest.TestCase):
+    def test_narrow_peak(self):
+        table = autosql.read(os.path.join(AS_DIR, "narrowPeak.as"))
+        self.assertEqual(table.name, "narrowPeak")
+        self.assertEqual(table.field_names(), [
+            "chrom", "chromStart", "chromEnd", "name", "score", "strand",
+            "signalValue", "pValue", "qValue", "peak"])
+        self.assertEqual((table.fields[5].type, table.fields[5].size),
+                         ("char", 1))
+
+    def test_types(self):
+        table = autosql.parse('''table t "comment" (
+            enum(a, b) kind; "Kind"
+            uint count; "Count"
+            int[count] sizes; "Sizes"
+            uint id primary auto; "Id"
+        )''')
+        self.assertEqual([(f.type, f.name, f.size, f.values)
+                          for f in table.fields],
+                         [("enum", "kind", None, ["a", "b"]),
+                          ("uint", "count", None, None),
+                          ("int", "sizes", "count", None),
+                          ("uint", "id", None, None)])
+
+    def test_invalid(self):
+        self.assertRaises(autosql.AutoSqlError, autosql.parse,
+                          "table t (uint x;")
+
+class TestPrevalidate(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ENCFF000AAA.bed")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, lines, args=NARROWPEAK, **kwargs):
+        with open(self.path, 'w') as f:
+            f.write("".join(line + "\n" for line in lines))
+        return prevalidate.check(self.path, args, CHROM_SIZES, **kwargs)
+
+    def assertError(self, line, message, args=NARROWPEAK):
+        errors = self.check(["#header", line], args)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith(
+            "Error [file=%s, line=2]: %s" % (self.path, message)),
+            errors[0])
+        self.assertTrue(errors[0].endswith("[%s]" % line))
+
+    def test_spec(self):
+        spec = prevalidate.bed_spec(NARROWPEAK)
+        self.assertEqual((spec.bed_fields, spec.extra_fields), (6, 4))
+        self.assertEqual(spec.table.name, "narrowPeak")
+        spec = prevalidate.bed_spec(['-type=bed6+'])
+        self.assertEqual((spec.bed_fields, spec.extra_fields), (6, None))
+        self.assertEqual(prevalidate.bed_spec(['-type=bigBed6+4']), None)
+        self.assertEqual(prevalidate.bed_spec(['-type=fastq']), None)
+        self.assertEqual(prevalidate.bed_spec(None), None)
+
+    def test_valid(self):
+        self.assertEqual(self.check(["track name=x", "#comment"] +
+                                    [narrow_peak(start=i, end=i + 10)
+                                     for i in range(100)]), [])
+
+    def test_not_bed(self):
+        self.assertEqual(self.check(["@read"], ['-type=fastq']), None)
+
+    def test_field_count(self):
+        self.assertError("\t".join(narrow_peak().split("\t")[:9]),
+                         "expecting 10 words, found 9")
+        self.assertError("chr1\t1\t2\tx\t0",
+                         "expecting at least 6 words, found 5",
+                         ['-type=bed6+'])
+
+    def test_whitespace(self):
+        line = narrow_peak().replace("\t", " ")
+        self.assertEqual(self.check([line, " ", narrow_peak()]), [])
+        self.assertTrue(prevalidate.bed_spec(NARROWPEAK + ['-tab']).tab)
+        self.assertError(line, "expecting 10 words, found 1",
+                         NARROWPEAK + ['-tab'])
+
+    def test_coordinates(self):
+        self.assertError(narrow_peak(chrom="chrX"), "chrom chrX not found")
+        self.assertError(narrow_peak(start=300), "chromStart 300 after")
+        self.assertError(narrow_peak(start=-1), "chromStart and chromEnd")
+        self.assertError(narrow_peak(chrom="chr2", end=5001),
+                         "chromEnd 5001 past end of chr2")
+
+    def test_bed_fields(self):
+        self.assertError(narrow_peak(score="1001"), "score 1001")
+        self.assertError(narrow_peak(strand="x"), "strand x")
+        self.assertError("chr1\t10\t20\t.\t0\t+\t5\t20\t0\t3\t100",
+                         "thickStart 5 not within 10-20", BEDMETHYL)
+        self.assertError("chr1\t10\t20\t.\t0\t+\t15\t12\t0\t3\t100",
+                         "thickStart 15 after thickEnd 12", BEDMETHYL)
+        self.assertError("chr1\t10\t20\t.\t0\t+\t10\t20\t0,255\t3\t100",
+                         "itemRgb 0,255", BEDMETHYL)
+        self.assertError("chr1\t10\t20\t.\t0\t+\t10\t20\tred\t3\t100",
+                         "itemRgb red", BEDMETHYL)
+
+    def test_kent_leniency(self):
+        # No thick part, and packed or out of range RGB values, which
+        # validateFiles accepts
+        self.assertEqual(self.check(
+            ["chr1\t10\t20\t.\t0\t+\t0\t0\t16711680\t3\t100",
+             "chr1\t10\t20\t.\t0\t+\t0\t15\t300,0,0\t3\t100"],
+            BEDMETHYL), [])
+
+    def test_extra_fields(self):
+        self.assertError(narrow_peak(peak="x"), "peak x is not a valid int")
+        self.assertError("chr1\t10\t20\t.\t0\t+\t10\t20\t0,255,0\t-3\t100",
+                         "readCount -3 is not a valid uint", BEDMETHYL)
+
+    def test_fail_fast(self):
+        errors = self.check([narrow_peak(chrom="chrX")] * 100, max_errors=3)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(prevalidate.error_count(errors), "Error count 3\n")
+
+    def test_sample(self):
+        lines = [narrow_peak()] * 10 + [narrow_peak(chrom="chrX")]
+        self.assertEqual(self.check(lines, sample_lines=10), [])
+        self.assertEqual(len(self.check(lines, sample_lines=None)), 1)
+
+    def test_gzip(self):
+        with gzip.open(self.path + ".gz", 'wb') as f:
+            f.write(narrow_peak(chrom="chrX") + "\n")
+        errors = prevalidate.check(self.path + ".gz", NARROWPEAK, CHROM_SIZES)
+        self.assertEqual(len(errors), 1)
+
+    def test_report(self):
+        errors = self.check([narrow_peak(chrom="chrX")])
+        self.assertEqual(prevalidate.write_report(self.path, errors),
+                         "Error count 1\n")
+        with open(self.path + ".report") as f:
+            self.assertEqual(f.read(), errors[0] + "\nError count 1\n")
+        self.assertEqual(prevalidate.failed_result(self.path, errors),
+                         "Pre-validation failed\nError count 1\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# dcc.redirects tests, run against a local redirecting stand-in for the
+# ENCODE portal.
+
+import os, sys, time, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import requests
+
+from dcc import encoded, redirects
+from fake_encoded import FakeEncoded
+
+S3 = "https://encode-files.invalid"
+
+def download_href(i):
+    return "/files/ENCFF%03dAAA/@@download/ENCFF%03dAAA.fastq.gz" % (i, i)
+
+class TestRedirectResolver(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeEncoded({"ENCFF000AAA": {}}, delay=0.1).start()
+        for i in range(16):
+            self.server.redirects[download_href(i)] = \
+                S3 + "/2015/01/01/%d/ENCFF%03dAAA.fastq.gz" % (i, i)
+        self.session = encoded.new_session()
+        self.resolver = redirects.RedirectResolver(self.session,
+                                                   self.server.url)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_final_hop_is_not_followed(self):
+        # Requesting the S3 URL would fail, as its host does not exist
+        self.assertEqual(self.resolver.resolve(download_href(3)),
+                         S3 + "/2015/01/01/3/ENCFF003AAA.fastq.gz")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_redirects_on_the_portal_are_followed(self):
+        self.server.redirects["/ENCFF003AAA/"] = download_href(3)
+        self.assertEqual(self.resolver.resolve("/ENCFF003AAA/"),
+                         S3 + "/2015/01/01/3/ENCFF003AAA.fastq.gz")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_not_redirected(self):
+        self.assertEqual(self.resolver.resolve("/files/ENCFF000AAA/"),
+                         self.server.url + "files/ENCFF000AAA/")
+
+    def test_missing(self):
+        self.assertRaises(requests.HTTPError, self.resolver.resolve,
+                          "/files/ENCFF999ZZZ/")
+
+    def test_results_are_cached(self):
+        self.resolver.resolve(download_href(1))
+        self.resolver.resolve(download_href(1))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_resolve_all(self):
+        hrefs = [download_href(i) for i in range(16)]
+        start = time.time()
+        urls = self.resolver.resolve_all(hrefs)
+        # 16 requests of 0.1 seconds take 1.6 seconds one at a time
+        self.assertTrue(time.time() - start < 0.8)
+        self.assertEqual(urls, [S3 + "/2015/01/01/%d/ENCFF%03dAAA.fastq.gz"
+                                % (i, i) for i in range(16)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# dcc.reports tests, on reports written by dcc.prevalidate.
+
+import os, sys, json, shutil, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import prevalidate, reports
+
+LINE1 = "chrX\t100\t200\t.\t0\t.\t5.1\t-1\t3.2\t50"
+LINE2 = "chrY\t300\t400\t.\t0\t.\t5.1\t-1\t3.2\t50"
+LINE3 = "chr1\t500\t400\t.\t0\t.\t5.1\t-1\t3.2\t50"
+
+def report(path):
+    errors = [prevalidate.format_error(path, 2, "chrom chrX not found", LINE1),
+              prevalidate.format_error(path, 3, "chrom chrY not found", LINE2),
+              prevalidate.format_error(path, 9, "chromStart 500 after "
+                                       "chromEnd 400", LINE3)]
+    return "".join(error + "\n" for error in errors) + \
+        prevalidate.error_count(errors)
+
+class TestErrorCount(unittest.TestCase):
+    def test_error_count(self):
+        self.assertEqual(reports.error_count("Error count 0\n"), 0)
+        self.assertEqual(reports.error_count("reading x\nError count 12\n"),
+                         12)
+        self.assertEqual(reports.error_count("Not validated yet"), None)
+        self.assertEqual(reports.error_count(None), None)
+
+    def test_is_valid(self):
+        self.assertTrue(reports.is_valid("Error count 0\n"))
+        self.assertTrue(reports.is_valid("Error count 0"))
+        self.assertFalse(reports.is_valid("Error count 10\n"))
+        self.assertFalse(reports.is_valid("Not validated yet"))
+
+    def test_error_class(self):
+        self.assertEqual(reports.error_class("chrom chrX not found", LINE1),
+                         "chrom <value> not found")
+        self.assertEqual(reports.error_class("chromStart 500 after chromEnd "
+                                             "400", LINE3),
+                         "chromStart N after chromEnd N")
+        self.assertEqual(reports.error_class("expecting 10 words, found 9"),
+                         "expecting N words, found N")
+
+class TestParse(unittest.TestCase):
+    def test_parse_report(self):
+        count, classes, errors = reports.parse_report(report("x.bed"),
+                                                      max_errors=2)
+        self.assertEqual(count, 3)
+        self.assertEqual(classes, {"chrom <value> not found": 2,
+                                   "chromStart N after chromEnd N": 1})
+        self.assertEqual(errors, [
+            {"line": 2, "message": "chrom chrX not found", "text": LINE1},
+            {"line": 3, "message": "chrom chrY not found", "text": LINE2}])
+
+    def test_other_lines(self):
+        count, classes, errors = reports.parse_report(
+            "Error in header: no version 2\nsome warning\n")
+        self.assertEqual(count, None)
+        self.assertEqual(classes, {"Error in header: no version N": 1})
+
+    def test_parse(self):
+        record = reports.parse("x.bed", "Error count 3\n", report("x.bed"),
+                               file_size=10 * 1024 * 1024, seconds=2)
+        self.assertEqual((record["status"], record["error_count"],
+                          record["mb_per_second"]), ("invalid", 3, 5.0))
+        record = reports.parse("y.bed", "Error count 0\n", "Error count 0\n")
+        self.assertEqual((record["status"], record["error_classes"]),
+                         ("valid", {}))
+        record = reports.parse("z.bed", "Not validated yet")
+        self.assertEqual((record["status"], record["error_count"]),
+                         ("not validated", None))
+
+class TestSummary(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.summary = reports.summarize([
+            reports.parse("y.bed", "Error count 0\n", None, 100, 1.0),
+            reports.parse("x.bed", "Error count 3\n", report("x.bed"), 300,
+                          1.0),
+            reports.parse("w.bed", "Error count 1\n",
+                          prevalidate.format_error("w.bed", 1, "chrom chrZ "
+                                                   "not found", "chrZ\t1\t2") +
+                          "\nError count 1\n", 100, 2.0)])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_summarize(self):
+        self.assertEqual(self.summary["files"], 3)
+        self.assertEqual(self.summary["statuses"], {"valid": 1, "invalid": 2})
+        self.assertEqual(self.summary["error_classes"],
+                         {"chrom <value> not found": 3,
+                          "chromStart N after chromEnd N": 1})
+        self.assertEqual((self.summary["file_size"], self.summary["seconds"]),
+                         (500, 4.0))
+
+    def test_write(self):
+        path = os.path.join(self.dir, "summary")
+        reports.write_json(path + ".json", self.summary)
+        with open(path + ".json") as f:
+            self.assertEqual(json.load(f)["files"], 3)
+        reports.write_tsv(path + ".tsv", self.summary)
+        with open(path + ".tsv") as f:
+            lines = [line.split("\t") for line in f.read().splitlines()]
+        self.assertEqual(lines[0], reports.TSV_COLUMNS)
+        self.assertEqual([line[0] for line in lines[1:]],
+                         ["w.bed", "x.bed", "y.bed"])
+        self.assertEqual(lines[2][3], "chrom <value> not found (2); "
+                         "chromStart N after chromEnd N (1)")
+        self.assertEqual(lines[2][4], "line 2: chrom chrX not found")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# dcc.resultcache tests, with a DNAnexus project folder stood in for by a
+# dictionary.
+
+import os, sys, time, shutil, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import resultcache
+
+class FakeClient:
+    """In-memory stand-in for DxpyClient."""
+
+    def __init__(self):
+        self.files = {}  # id -> (folder, name, created, data)
+        self.created = 0
+
+    def find(self, folder, name):
+        for file_id, (f, n, created, data) in self.files.items():
+            if (f, n) == (folder, name):
+                return file_id
+        return None
+
+    def read(self, file_id):
+        return self.files[file_id][3]
+
+    def upload(self, folder, name, data):
+        self.created += 1
+        self.files["file-%d" % self.created] = (folder, name, self.created,
+                                                data)
+
+    def list(self, folder):
+        return [(created, file_id)
+                for file_id, (f, n, created, data) in self.files.items()
+                if f == folder]
+
+    def remove(self, file_ids):
+        for file_id in file_ids:
+            del self.files[file_id]
+
+class BrokenStore:
+    def get(self, key):
+        raise IOError("no access")
+
+    def put(self, key, data):
+        raise IOError("no access")
+
+class TestKey(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.sizes = os.path.join(self.dir, "chrom.sizes")
+        with open(self.sizes, 'w') as f:
+            f.write("chr1\t1000\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_key(self):
+        argv = ['-type=bed6+', '-chromInfo=%s' % self.sizes]
+        key = resultcache.validation_key("a" * 32, argv)
+        self.assertEqual(key, resultcache.validation_key("a" * 32, argv))
+        self.assertNotEqual(key, resultcache.validation_key("b" * 32, argv))
+        self.assertNotEqual(key, resultcache.validation_key(
+            "a" * 32, ['-type=bed3+', '-chromInfo=%s' % self.sizes]))
+
+    def test_referenced_files(self):
+        argv = ['-chromInfo=%s' % self.sizes]
+        key = resultcache.validation_key("a" * 32, argv)
+        # The same contents elsewhere are the same key
+        other = os.path.join(self.dir, "other.sizes")
+        shutil.copy(self.sizes, other)
+        self.assertEqual(key, resultcache.validation_key(
+            "a" * 32, ['-chromInfo=%s' % other]))
+        with open(self.sizes, 'a') as f:
+            f.write("chr2\t500\n")
+        self.assertNotEqual(key, resultcache.validation_key("a" * 32, argv))
+
+class TestStores(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_local_store(self):
+        store = resultcache.LocalStore(os.path.join(self.dir, "cache"),
+                                       max_entries=2)
+        self.assertEqual(store.get("a"), None)
+        store.put("a", "1")
+        store.put("b", "2")
+        past = time.time() - 100
+        os.utime(os.path.join(store.directory, "b.json"), (past, past))
+        os.utime(os.path.join(store.directory, "a.json"), (past - 1, past - 1))
+        self.assertEqual(store.get("a"), "1")  # now the most recently used
+        store.put("c", "3")
+        self.assertEqual(store.get("b"), None)
+        self.assertEqual((store.get("a"), store.get("c")), ("1", "3"))
+
+    def test_dx_store(self):
+        client = FakeClient()
+        store = resultcache.DXStore(client, "/validation_cache",
+                                    max_entries=2, evict_fraction=1)
+        self.assertEqual(store.get("a"), None)
+        for key in "abc":
+            store.put(key, key.upper())
+        self.assertEqual(store.get("a"), None)
+        self.assertEqual((store.get("b"), store.get("c")), ("B", "C"))
+        self.assertEqual(len(client.files), 2)
+
+    def test_dx_store_no_listing(self):
+        client = FakeClient()
+        def list(folder):
+            raise AssertionError("listed the folder")
+        client.list = list
+        store = resultcache.DXStore(client, "/validation_cache",
+                                    max_entries=2, evict_fraction=0)
+        for key in "abc":
+            store.put(key, key.upper())
+        self.assertEqual(store.get("a"), "A")
+        self.assertEqual(len(client.files), 3)
+
+class TestValidationCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ENCFF000AAA.bed")
+        self.runs = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def run_validator(self, valid="Error count 1\n"):
+        self.runs += 1
+        with open(self.path + ".report", 'w') as f:
+            f.write("Error [file=x, line=1]: bad\n" + valid)
+        return valid
+
+    def test_hit(self):
+        cache = resultcache.ValidationCache(
+            resultcache.DXStore(FakeClient(), "/validation_cache"))
+        argv = ['validateFiles', '-type=bed6+']
+        self.assertEqual(cache.validate("a" * 32, argv, self.path,
+                                        self.run_validator), "Error count 1\n")
+        os.remove(self.path + ".report")
+        self.assertEqual(cache.validate("a" * 32, argv, self.path,
+                                        self.run_validator), "Error count 1\n")
+        self.assertEqual(self.runs, 1)
+        with open(self.path + ".report") as f:
+            self.assertEqual(f.read(), "Error [file=x, line=1]: bad\n"
+                             "Error count 1\n")
+        cache.validate("b" * 32, argv, self.path, self.run_validator)
+        self.assertEqual(self.runs, 2)
+
+    def test_failed_run_not_cached(self):
+        cache = resultcache.ValidationCache(
+            resultcache.LocalStore(os.path.join(self.dir, "cache")))
+        for valid in ("Not validated yet",
+                      "Pre-validation failed\nError count 1\n"):
+            for i in range(2):
+                self.assertEqual(cache.validate(
+                    "a" * 32, ['validateFiles'], self.path,
+                    lambda: self.run_validator(valid)), valid)
+        self.assertEqual(self.runs, 4)
+
+    def test_unavailable_store(self):
+        cache = resultcache.ValidationCache(BrokenStore())
+        self.assertEqual(cache.validate("a" * 32, ['validateFiles'],
+                                        self.path, self.run_validator),
+                         "Error count 1\n")
+        self.assertEqual(self.runs, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# dcc.scan tests.
+
+import os, sys, gzip, shutil, hashlib, tempfile, unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import scan
+
+BED = "".join("chr1\t%d\t%d\tpeak%d\t0\t+\n" % (i, i + 100, i)
+              for i in range(0, 2000000, 100))
+
+def gzipped(data):
+    buf = StringIO()
+    gz = gzip.GzipFile(fileobj=buf, mode='wb')
+    gz.write(data)
+    gz.close()
+    return buf.getvalue()
+
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def scan(self, data, **kwargs):
+        kwargs.setdefault("block_size", 4096)
+        return scan.scan(self.write("ENCFF000AAA.bed.gz", data), **kwargs)
+
+    def test_plain(self):
+        result = scan.scan(self.write("ENCFF000AAA.bed", BED),
+                           block_size=4096)
+        self.assertEqual(result, {"md5sum": hashlib.md5(BED).hexdigest(),
+                                  "file_size": len(BED), "lines": 20000,
+                                  "data_size": len(BED)})
+
+    def test_gzip(self):
+        data = gzipped(BED)
+        result = self.scan(data)
+        self.assertEqual(result, {"md5sum": hashlib.md5(data).hexdigest(),
+                                  "file_size": len(data), "lines": 20000,
+                                  "data_size": len(BED), "members": 1})
+
+    def test_members(self):
+        data = gzipped(BED[:1000]) + gzipped("") + gzipped(BED[1000:])
+        result = self.scan(data)
+        self.assertEqual((result["members"], result["lines"]), (3, 20000))
+        # A member ending at the end of a block
+        data = gzipped(BED[:1000])
+        result = self.scan(data + gzipped(BED[1000:]), block_size=len(data))
+        self.assertEqual((result["members"], result["lines"]), (2, 20000))
+
+    def test_truncated(self):
+        data = gzipped(BED)
+        self.assertRaises(scan.ScanError, self.scan, data[:len(data) // 2])
+        # Only the trailer missing
+        self.assertRaises(scan.ScanError, self.scan, data[:-8])
+
+    def test_corrupt(self):
+        data = gzipped(BED)
+        # Wrong CRC
+        data = data[:-8] + chr(ord(data[-8]) ^ 1) + data[-7:]
+        self.assertRaises(scan.ScanError, self.scan, data)
+
+    def test_trailing_garbage(self):
+        self.assertRaises(scan.ScanError, self.scan, gzipped(BED) + "junk")
+
+    def test_compress(self):
+        path = self.write("ENCFF000AAA.bed", BED)
+        result = scan.scan(path, compress_to=path + ".gz", block_size=4096)
+        with open(path + ".gz", 'rb') as f:
+            data = f.read()
+        self.assertEqual(result, {"md5sum": hashlib.md5(data).hexdigest(),
+                                  "file_size": len(data), "lines": 20000,
+                                  "data_size": len(BED)})
+        self.assertEqual(gzip.GzipFile(path + ".gz").read(), BED)
+        self.assertEqual(scan.scan(path + ".gz")["lines"], 20000)
+
+    def test_compress_repeatable(self):
+        path = self.write("ENCFF000AAA.bed", BED)
+        for threads in (1, 2):
+            results = []
+            for i in range(2):
+                results.append(scan.scan(path, compress_to=path + ".gz",
+                                         block_size=4096, threads=threads))
+                with open(path + ".gz", 'rb') as f:
+                    # No mtime in the header
+                    self.assertEqual(f.read(8)[4:], "\0\0\0\0")
+            self.assertEqual(results[0], results[1])
+
+if __name__ == '__main__':
+    unittest.main()
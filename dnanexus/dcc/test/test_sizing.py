@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# dcc.sizing tests.
+
+import os, sys, json, shutil, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from dcc import sizing
+from dcc.sizing import GB
+
+class TestPolicy(unittest.TestCase):
+    def setUp(self):
+        self.policy = sizing.Policy()
+
+    def test_by_size(self):
+        self.assertEqual(self.policy.instance_type("tsv", 50 * 1024),
+                         "mem1_ssd1_x2")
+        self.assertEqual(self.policy.instance_type("fastq", 5 * GB),
+                         "mem1_ssd1_x4")
+        self.assertEqual(self.policy.instance_type("fastq", 100 * GB),
+                         "mem1_ssd2_x8")
+        self.assertEqual(self.policy.instance_type("fastq", 400 * GB),
+                         "mem3_hdd2_x8")
+
+    def test_by_format(self):
+        self.assertEqual(self.policy.instance_type("bam", 40 * GB),
+                         "mem3_hdd2_x4")
+        self.assertEqual(self.policy.instance_type("bed", 40 * GB),
+                         "mem1_ssd1_x8")
+
+    def test_sizing(self):
+        chosen = self.policy.choose("bigWig", 2 * GB)
+        self.assertEqual((chosen.instance_type, chosen.disk, chosen.threads),
+                         ("mem1_ssd1_x4", 6 * GB, 4))
+
+    def test_batch(self):
+        # The bam rule's instance type has more memory than the others'
+        chosen = self.policy.choose_batch(["bed", "bam", "tsv"], GB)
+        self.assertEqual((chosen.instance_type, chosen.disk, chosen.threads),
+                         ("mem3_hdd2_x2", 3 * GB, 2))
+        chosen = self.policy.choose_batch(["bed", "tsv"], 2 * GB)
+        self.assertEqual(chosen.instance_type, "mem1_ssd1_x4")
+        policy = sizing.Policy([sizing.Rule("mem1_ssd1_x2", ["bam"])])
+        self.assertEqual(policy.choose_batch(["bed"], GB), None)
+        self.assertEqual(policy.choose_batch(["bed", "bam"], GB).instance_type,
+                         "mem1_ssd1_x2")
+
+    def test_disk(self):
+        # 60 GB is under the x8 rule's size limit but needs more disk
+        policy = sizing.Policy([sizing.Rule("mem1_ssd1_x8", max_size=100 * GB),
+                                sizing.Rule("mem1_ssd2_x8")])
+        self.assertEqual(policy.instance_type("bed", 60 * GB), "mem1_ssd2_x8")
+        self.assertEqual(policy.instance_type("bed", 50 * GB), "mem1_ssd1_x8")
+
+    def test_too_big(self):
+        policy = sizing.Policy([sizing.Rule("mem1_ssd1_x2", max_size=GB),
+                                sizing.Rule("mem1_ssd1_x4", max_size=2 * GB)])
+        self.assertEqual(policy.instance_type("bed", 10 * GB),
+                         "mem1_ssd1_x4")
+
+    def test_unknown(self):
+        self.assertEqual(self.policy.choose("bed", None), None)
+        policy = sizing.Policy([sizing.Rule("mem1_ssd1_x2", ["bam"])])
+        self.assertEqual(policy.choose("bed", GB), None)
+        self.assertRaises(sizing.SizingError, sizing.Policy,
+                          [sizing.Rule("mem9_x99")])
+
+class TestLoad(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "sizing.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_missing(self):
+        self.assertEqual(sizing.load(self.path).instance_type("tsv", 1),
+                         "mem1_ssd1_x2")
+
+    def test_load(self):
+        with open(self.path, 'w') as f:
+            json.dump({"instance_types": {"mem2_ssd1_x2": [2, 7.5, 32]},
+                       "rules": [{"instance_type": "mem2_ssd1_x2",
+                                  "formats": ["tsv"], "max_size": GB},
+                                 {"instance_type": "mem1_ssd1_x4"}]}, f)
+        policy = sizing.load(self.path)
+        self.assertEqual(policy.instance_type("tsv", 1), "mem2_ssd1_x2")
+        self.assertEqual(policy.instance_type("bam", 1), "mem1_ssd1_x4")
+
+    def test_invalid(self):
+        with open(self.path, 'w') as f:
+            json.dump({"rules": [{"formats": ["tsv"]}]}, f)
+        self.assertRaises(sizing.SizingError, sizing.load, self.path)
+        with open(self.path, 'w') as f:
+            f.write("{")
+        self.assertRaises(sizing.SizingError, sizing.load, self.path)
+
+if __name__ == '__main__':
+    unittest.main()
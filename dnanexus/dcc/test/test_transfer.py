@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# dcc.transfer tests, with LocalSink standing in for DXSink.
+
+import os, sys, time, shutil, hashlib, tempfile, threading, subprocess
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import requests
+
+from dcc import encoded, transfer
+from fake_encoded import FakeEncoded
+
+DATA = "".join(chr(i % 251) for i in range(100000))
+MD5 = hashlib.md5(DATA).hexdigest()
+
+class RecordingSink:
+    """Records the chunks written to it."""
+
+    def __init__(self):
+        self.data = []
+        self.closed = self.aborted = False
+
+    def write(self, data):
+        self.data.append(data)
+
+    def close(self):
+        self.closed = True
+        return "".join(self.data)
+
+    def abort(self):
+        self.aborted = True
+
+class TestCopy(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ENCFF000AAA.fastq.gz")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_copy(self):
+        sink = RecordingSink()
+        results, md5, size = transfer.copy(
+            transfer.iter_file(StringIO(DATA), 1000),
+            [transfer.LocalSink(self.path), sink], md5sum=MD5)
+        self.assertEqual((results, md5, size), ([self.path, DATA], MD5,
+                                                  len(DATA)))
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+
+    def test_md5_mismatch(self):
+        sink = RecordingSink()
+        local = transfer.LocalSink(self.path)
+        self.assertRaises(transfer.TransferError, transfer.copy,
+                          transfer.iter_file(StringIO(DATA)), [local, sink],
+                          md5sum="0" * 32)
+        self.assertTrue(sink.aborted)
+        self.assertFalse(sink.closed)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_source_error(self):
+        def chunks():
+            yield "abc"
+            raise IOError("connection reset")
+        sink = RecordingSink()
+        self.assertRaises(IOError, transfer.copy, chunks(), [sink])
+        self.assertTrue(sink.aborted)
+
+    def test_read_ahead_is_bounded(self):
+        # The sink only takes a chunk once a write is allowed
+        allowed = threading.Semaphore(0)
+        read = [0]
+        class SlowSink(RecordingSink):
+            def write(self, data):
+                allowed.acquire()
+                RecordingSink.write(self, data)
+        def chunks():
+            for i in range(100):
+                read[0] += 1
+                yield "x" * 10
+        sink = SlowSink()
+        thread = threading.Thread(target=transfer.copy, args=(
+            chunks(), [sink]), kwargs={"buffer_size": 40, "chunk_size": 10})
+        thread.start()
+        for i in range(10):
+            allowed.release()
+        while len(sink.data) < 10:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        # Four chunks queued, one being put and one in the sink
+        self.assertTrue(read[0] <= 10 + 6, read[0])
+        for i in range(90):
+            allowed.release()
+        thread.join()
+        self.assertEqual(len(sink.data), 100)
+
+    def test_command(self):
+        results, md5, size = transfer.copy(
+            transfer.iter_command(["printf", "abc"]), [RecordingSink()])
+        self.assertEqual(results, ["abc"])
+        self.assertRaises(subprocess.CalledProcessError, transfer.copy,
+                          transfer.iter_command(["false"]), [RecordingSink()])
+
+class TestURL(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeEncoded().start()
+        self.server.files["/ENCFF000AAA.fastq.gz"] = DATA
+        self.session = encoded.EncodedSession(retries=0)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_url(self):
+        results, md5, size = transfer.copy(
+            transfer.iter_source(self.server.url + "ENCFF000AAA.fastq.gz",
+                                 self.session), [RecordingSink()])
+        self.assertEqual((results, md5), ([DATA], MD5))
+
+    def test_missing(self):
+        sink = RecordingSink()
+        self.assertRaises(requests.HTTPError, transfer.copy,
+                          transfer.iter_url(self.server.url + "missing",
+                                            self.session), [sink])
+        self.assertTrue(sink.aborted)
+
+if __name__ == '__main__':
+    unittest.main()
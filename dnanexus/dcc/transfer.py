@@ -0,0 +1,178 @@
+# Streaming copies from a source to one or more sinks.
+#
+# A reader thread pulls chunks from the source into a bounded queue while
+# the calling thread writes them to every sink and updates the MD5, so
+# the download and the upload overlap and at most buffer_size bytes are
+# held between them. Nothing is staged on local disk unless a LocalSink
+# is one of the sinks.
+
+import os
+import sys
+import hashlib
+import threading
+import subprocess
+import Queue
+
+import encoded
+
+__all__ = ["DEFAULT_BUFFER_SIZE", "CHUNK_SIZE", "DX_PART_SIZE",
+           "TransferError", "DXSink", "LocalSink", "iter_file", "iter_url",
+           "iter_command", "iter_source", "copy"]
+
+# Bytes read ahead of the sinks at most
+DEFAULT_BUFFER_SIZE = 256 * 1024 * 1024
+CHUNK_SIZE = 4 * 1024 * 1024
+# Size of the parts DXSink uploads
+DX_PART_SIZE = 64 * 1024 * 1024
+
+class TransferError(Exception):
+    """A copy did not match its expected MD5 checksum."""
+    pass
+
+class DXSink:
+    """Writes to a new DNAnexus file, uploaded in parts as it is written.
+
+    close() returns the closed dxpy.DXFile; abort() removes it.
+    """
+
+    def __init__(self, name, project, folder, properties=None,
+                 part_size=DX_PART_SIZE):
+        import dxpy
+        self.dx_file = dxpy.new_dxfile(mode='w', name=name, project=project,
+                                       folder=folder, properties=properties,
+                                       write_buffer_size=part_size)
+
+    def write(self, data):
+        self.dx_file.write(data)
+
+    def close(self):
+        self.dx_file.close(block=True)
+        return self.dx_file
+
+    def abort(self):
+        self.dx_file.remove()
+
+class LocalSink:
+    """Writes to a local file; the stand-in for DXSink in tests, and a way
+    to keep a local copy while uploading. close() returns the path."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+
+    def write(self, data):
+        self._file.write(data)
+
+    def close(self):
+        self._file.close()
+        return self.path
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def iter_file(f, chunk_size=CHUNK_SIZE):
+    """Yields the contents of an open file in chunks."""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+def iter_url(url, session=None, chunk_size=CHUNK_SIZE):
+    """Yields the body of an HTTP GET of url in chunks."""
+    if session is None:
+        session = encoded.EncodedSession()
+    response = session.get(url, stream=True)
+    try:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size):
+            yield chunk
+    finally:
+        response.close()
+
+def iter_command(args, chunk_size=CHUNK_SIZE):
+    """Yields the standard output of a command in chunks.
+
+    Raises subprocess.CalledProcessError if the command fails.
+    """
+    process = subprocess.Popen(args, stdout=subprocess.PIPE)
+    try:
+        for chunk in iter_file(process.stdout, chunk_size):
+            yield chunk
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.wait()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args)
+
+def iter_source(url, session=None, chunk_size=CHUNK_SIZE):
+    """Yields the contents of an s3:// (read with aws s3 cp) or http(s)
+    URL in chunks."""
+    if url.startswith('s3://'):
+        return iter_command(['aws', 's3', 'cp', url, '-', '--quiet'],
+                            chunk_size)
+    return iter_url(url, session, chunk_size)
+
+def copy(chunks, sinks, md5sum=None, buffer_size=DEFAULT_BUFFER_SIZE,
+         chunk_size=CHUNK_SIZE):
+    """Writes the chunks to every sink, reading ahead of the writes by at
+    most buffer_size bytes.
+
+    Returns (results, md5, size), where results are the values returned
+    by closing the sinks. If reading or writing fails, or md5sum is given
+    and does not match, the sinks are aborted and the error is raised
+    (TransferError for an MD5 mismatch).
+    """
+    queue = Queue.Queue(max(1, buffer_size // chunk_size))
+    stop = threading.Event()
+
+    def read():
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    return
+                queue.put(chunk)
+            queue.put(None)
+        except:
+            queue.put(sys.exc_info())
+
+    reader = threading.Thread(target=read)
+    reader.daemon = True
+    reader.start()
+
+    md5 = hashlib.md5()
+    size = 0
+    try:
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            if isinstance(item, tuple):
+                raise item[0], item[1], item[2]
+            md5.update(item)
+            size += len(item)
+            for sink in sinks:
+                sink.write(item)
+        if md5sum and md5.hexdigest() != md5sum:
+            raise TransferError("MD5 is %s, expected %s" %
+                                (md5.hexdigest(), md5sum))
+        results = [sink.close() for sink in sinks]
+    except:
+        exc_info = sys.exc_info()
+        stop.set()
+        # Unblock the reader so that it sees stop
+        while reader.is_alive():
+            try:
+                queue.get(timeout=0.1)
+            except Queue.Empty:
+                pass
+        for sink in sinks:
+            try:
+                sink.abort()
+            except Exception:
+                pass
+        raise exc_info[0], exc_info[1], exc_info[2]
+    return results, md5.hexdigest(), size
@@ -5,6 +5,7 @@ import argparse
 import re
 import json
 from dxencode import dxencode as dxencode
+from dcc import encoded
 import get_fastqc
 
 PROJECT_DEFAULT = 'dna-me-pipeline'
@@ -69,11 +70,11 @@ def get_bismark_stats(experiment, project):
 
 (AUTHID,AUTHPW,SERVER) = dxencode.processkey('default')
 
-def process_exp(acc, project, skipfq):
+def process_exp(acc, project, skipfq, exp=None):
 
     fqc_metrics = {}
 
-    expr = get_fastqc.get_exp_time(acc, project, skip=skipfq)
+    expr = get_fastqc.get_exp_time(acc, project, skip=skipfq, exp=exp)
     if not skipfq:
         fqc_metrics[expr['accession']] = {}
         for fq in [ f for f in expr['files'] if f['file_format'] == 'fastq' ]:
@@ -90,6 +91,7 @@ def main():
                             required=False)
 
     args = argparser.parse_args()
+    get_fastqc.setup_cache(args)
 
     project = dxencode.get_project(args.project)
     print "\t".join(['Experiment','Replicate']+labels+["lambda "+l for l in labels]+['Estimated Coverage'])
@@ -99,13 +101,13 @@ def main():
         assay = args.assay or "OBI:0001863"
         query = '/search/?type=experiment&assay_term_id=%s&award.rfa=ENCODE3&limit=all&frame=embedded&files.file_format=fastq' % assay
 
-        res = dxencode.encoded_get(SERVER+query, AUTHID=AUTHID, AUTHPW=AUTHPW)
+        res = encoded.encoded_get(SERVER+query, AUTHID=AUTHID, AUTHPW=AUTHPW)
         exps = res.json()['@graph']
 
         for exp in exps:
             acc = exp['accession']
             if len(exp['replicates']) > 0:
-               process_exp(acc, project, skipfq=args.skipfq)
+               process_exp(acc, project, skipfq=args.skipfq, exp=exp)
 
 
 if __name__ == '__main__':
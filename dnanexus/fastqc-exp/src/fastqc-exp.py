@@ -16,10 +16,14 @@
 import sys, os, subprocess, json, requests, shlex, urlparse, logging
 import dxpy
 
+from dcc import encoded, redirects, sizing, transfer
+
 KEYFILE = 'keypairs.json'
 DEFAULT_SERVER = 'https://www.encodeproject.org'
 S3_SERVER='s3://encode-files/'
 ROOT_FOLDER='/runs'
+# Instance types for subjobs by file size
+SIZING = sizing.load((os.environ.get('DX_FS_ROOT') or "")+"/opt/data/sizing.json")
 
 logger = logging.getLogger("Applet")
 
@@ -46,12 +50,8 @@ def processkey(key):
     return (AUTHID,AUTHPW,SERVER)
 
 def encoded_get(url, AUTHID=None, AUTHPW=None):
-    HEADERS = {'content-type': 'application/json'}
-    if AUTHID and AUTHPW:
-        response = requests.get(url, auth=(AUTHID,AUTHPW), headers=HEADERS)
-    else:
-        response = requests.get(url, headers=HEADERS)
-    return response
+    # Shared keep-alive session, cached if dcc.encoded.set_cache() was called
+    return encoded.encoded_get(url, AUTHID, AUTHPW)
 
 def find_or_create_folder(project, sub_folder, root_folder='/'):
     folder = root_folder+sub_folder
@@ -61,28 +61,21 @@ def find_or_create_folder(project, sub_folder, root_folder='/'):
     else:
         return project.new_folder(folder)
 
-def get_bucket(SERVER, AUTHID, AUTHPW, f_obj):
+def get_bucket(SERVER, AUTHID, AUTHPW, f_obj, resolver=None):
 
-    #make the URL that will get redirected - get it from the file object's href property
-    encode_url = urlparse.urljoin(SERVER,f_obj.get('href'))
-    logger.debug(encode_url)
-
-    #stream=True avoids actually downloading the file, but it evaluates the redirection
-    r = requests.get(encode_url, auth=(AUTHID,AUTHPW), headers={'content-type': 'application/json'}, allow_redirects=True, stream=True)
+    #find where the file object's href property redirects to, without
+    #following the redirection itself
+    if resolver is None:
+        resolver = redirects.RedirectResolver(encoded.get_session(AUTHID, AUTHPW), SERVER)
     try:
-        r.raise_for_status
-    except:
+        s3_url = resolver.resolve(f_obj.get('href'))
+    except requests.RequestException:
         logger.error('%s href does not resolve' %(f_obj.get('accession')))
         sys.exit()
-    logger.debug(r)
 
     #this is the actual S3 https URL after redirection
-    s3_url = r.url
     logger.debug(s3_url)
 
-    #release the connection
-    r.close()
-
     #split up the url into components
     o = urlparse.urlparse(s3_url)
 
@@ -113,7 +106,7 @@ def noop(fastq):
     }
 
 @dxpy.entry_point("process")
-def process(filename, bucket_url, project, folder, skipvalidate=False):
+def process(filename, bucket_url, project, folder, skipvalidate=False, stream=True):
     # Change the following to process whatever input this stage
     # receives.  You may also want to copy and paste the logic to download
     # and upload files here as well if this stage receives file input
@@ -126,10 +119,24 @@ def process(filename, bucket_url, project, folder, skipvalidate=False):
                            name=filename, return_handler=False) )
 
     if not test or len(test) == 0:
-        #cp the file from the bucket
-        subprocess.check_call(shlex.split('aws s3 cp %s . --quiet' %(bucket_url)), stderr=subprocess.STDOUT)
-        subprocess.check_call(shlex.split('ls -l %s' %(filename)))
-        dx_file = dxpy.upload_local_file(filename, project=project, folder=folder)
+        dx_file = None
+        if stream:
+            #upload while reading from the bucket, keeping a local copy for FastQC
+            #(transfer.copy aborts the sinks if it fails)
+            try:
+                sinks = [transfer.DXSink(filename, project, folder)]
+                if not skipvalidate:
+                    sinks.append(transfer.LocalSink(filename))
+                results, md5, size = transfer.copy(transfer.iter_source(bucket_url), sinks)
+                dx_file = results[0]
+                logger.debug("Streamed %d bytes, md5 %s" % (size, md5))
+            except Exception, e:
+                logger.warning("Streaming failed (%s).  Reverting to copy and upload" % e)
+        if dx_file is None:
+            #cp the file from the bucket
+            subprocess.check_call(shlex.split('aws s3 cp %s . --quiet' %(bucket_url)), stderr=subprocess.STDOUT)
+            subprocess.check_call(shlex.split('ls -l %s' %(filename)))
+            dx_file = dxpy.upload_local_file(filename, project=project, folder=folder)
 
     else:
         dxpy.download_dxfile(test[0]['id'], filename)
@@ -169,7 +176,7 @@ def process(filename, bucket_url, project, folder, skipvalidate=False):
     }
 
 @dxpy.entry_point("main")
-def main(accession, key=None, debug=False, skipvalidate=False):
+def main(accession, key=None, debug=False, skipvalidate=False, stream=True):
 
     # The following line(s) initialize your data object inputs on the platform
     # into dxpy.DXDataObject instances that you can start using immediately.
@@ -220,20 +227,29 @@ def main(accession, key=None, debug=False, skipvalidate=False):
     subjobs = []
     files = exp.get('files')
     if reps and files:
+        # Resolve the S3 locations of all FASTQs concurrently up front;
+        # get_bucket then finds them in the resolver's cache
+        resolver = redirects.RedirectResolver(encoded.get_session(AUTHID, AUTHPW), SERVER)
+        try:
+            resolver.resolve_all([ff.get('href') for ff in files if ff['file_format'] == 'fastq'])
+        except requests.RequestException, e:
+            logger.debug(e)  # get_bucket reports the file that failed
         for ff in files:
             if ff['file_format'] == 'fastq':
                 folder = "%s/rep%s_%s" % (exp_folder,
                     ff['replicate']['biological_replicate_number'],
                     ff['replicate']['technical_replicate_number'])
-                file_name, bucket_url = get_bucket(SERVER, AUTHID, AUTHPW, ff)
+                file_name, bucket_url = get_bucket(SERVER, AUTHID, AUTHPW, ff, resolver)
                 subjob_input = {
                     "filename": file_name,
                     "bucket_url": bucket_url,
                     "project": project.get_id(),
                     "folder": folder,
-                    "skipvalidate": skipvalidate
+                    "skipvalidate": skipvalidate,
+                    "stream": stream
                 }
-                subjobs.append(dxpy.new_dxjob(subjob_input, "process"))
+                instance_type = SIZING.instance_type('fastq', ff.get('file_size'))
+                subjobs.append(dxpy.new_dxjob(subjob_input, "process", instance_type=instance_type))
 
     # The following line creates the job that will perform the
     # "postprocess" step of your app.  We've given it an input field
@@ -281,6 +297,7 @@ def main(accession, key=None, debug=False, skipvalidate=False):
                     "zips": [subjob.get_output_ref("zip") for subjob in subjobs],
         }
 
+    logger.info("ENCODE requests: %s" % encoded.metrics)
 
     return output
 
@@ -16,6 +16,11 @@
 import os, subprocess, shlex, time
 import dxpy
 
+from dcc import sizing
+
+# Instance types for subjobs by file size
+SIZING = sizing.load((os.environ.get('DX_FS_ROOT') or "")+"/opt/data/sizing.json")
+
 @dxpy.entry_point("postprocess")
 def postprocess(reports):
     # Change the following to process whatever input this stage
@@ -28,14 +33,15 @@ def postprocess(reports):
     return reports
 
 @dxpy.entry_point("process")
-def process(fastq):
+def process(fastq, name=None):
     # Change the following to process whatever input this stage
     # receives.  You may also want to copy and paste the logic to download
     # and upload files here as well if this stage receives file input
     # and/or makes file output.
 
     print fastq
-    reads_filename = dxpy.describe(fastq)['name']
+    # main passes the name it described the file for
+    reads_filename = name or dxpy.describe(fastq)['name']
     reads_basename = reads_filename.rstrip('.gz').rstrip('.fq').rstrip('.fastq')
     reads_file = dxpy.download_dxfile(fastq,"fastq.gz")
 
@@ -81,8 +87,10 @@ def main(files):
 
     subjobs = []
     for fastq in files:
-        subjob_input = { "fastq": fastq }
-        subjobs.append(dxpy.new_dxjob(subjob_input, "process"))
+        desc = dxpy.describe(fastq)
+        subjob_input = { "fastq": fastq, "name": desc['name'] }
+        instance_type = SIZING.instance_type('fastq', desc['size'])
+        subjobs.append(dxpy.new_dxjob(subjob_input, "process", instance_type=instance_type))
 
     # The following line creates the job that will perform the
     # "postprocess" step of your app.  We've given it an input field
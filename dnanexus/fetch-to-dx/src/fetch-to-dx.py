@@ -17,8 +17,13 @@ import sys, os, subprocess, json, requests, shlex, urlparse, logging
 from datetime import datetime
 import dxpy
 
+from dcc import download, sizing, transfer
+
 logger = logging.getLogger("Applet")
 
+# Instance types for subjobs by file format and size
+SIZING = sizing.load((os.environ.get('DX_FS_ROOT') or "")+"/opt/data/sizing.json")
+
 @dxpy.entry_point("postprocess")
 def postprocess(reports):
     # Change the following to process whatever input this stage
@@ -40,7 +45,7 @@ def noop(enc_file_name, bucket_url, proj_id, dx_folder, file_acc, dx_file_name,
     }
 
 @dxpy.entry_point("process")
-def process(enc_file_name, bucket_url, proj_id, dx_folder, file_acc, dx_file_name, skipvalidate=False):
+def process(enc_file_name, bucket_url, proj_id, dx_folder, file_acc, dx_file_name, skipvalidate=False, md5sum=None, stream=True):
     # Change the following to process whatever input this stage
     # receives.  You may also want to copy and paste the logic to download
     # and upload files here as well if this stage receives file input
@@ -53,38 +58,56 @@ def process(enc_file_name, bucket_url, proj_id, dx_folder, file_acc, dx_file_nam
                            name=dx_file_name, properties={ "accession": file_acc }, return_handler=False) )
 
     start = datetime.now()
+    fastq = dx_file_name.endswith(".fastq.gz") or dx_file_name.endswith(".fq.gz")
     if not test or len(test) == 0:
-        try:
-            #subprocess.check_call(shlex.split('aws s3 cp %s ./%s --quiet' %(bucket_url,dx_file_name)), stderr=subprocess.STDOUT)
-            subprocess.check_call(shlex.split('aws s3 cp %s ./%s' % (bucket_url,dx_file_name)), stderr=subprocess.STDOUT)
-        except:
+        dx_file = None
+        if stream:
+            # Upload while reading from the bucket, keeping a local copy
+            # only if FastQC will need one
+            try:
+                sinks = [transfer.DXSink(dx_file_name, proj_id, dx_folder, properties={ "accession": file_acc })]
+                if fastq and not skipvalidate:
+                    sinks.append(transfer.LocalSink(dx_file_name))
+                results, md5, size = transfer.copy(transfer.iter_source(bucket_url), sinks, md5sum=md5sum)
+                dx_file = results[0]
+                duration = datetime.now() - start
+                print "* Streamed %d bytes to dx project in %.2f seconds" % (size, duration.seconds)
+            except Exception, e:
+                print "* Streaming failed (%s).  Reverting to copy and upload" % e
+                start = datetime.now()
+        if dx_file is None:
             try:
-                print "* s3 cp failed.  Reverting to 'wget'"
-                web_url = "https://www.encodeproject.org/files/%s/@@download/%s" % (file_acc,enc_file_name)
-                subprocess.check_call(shlex.split('wget %s -O %s --quiet' % (web_url,dx_file_name) ), stderr=subprocess.STDOUT)
+                #subprocess.check_call(shlex.split('aws s3 cp %s ./%s --quiet' %(bucket_url,dx_file_name)), stderr=subprocess.STDOUT)
+                subprocess.check_call(shlex.split('aws s3 cp %s ./%s' % (bucket_url,dx_file_name)), stderr=subprocess.STDOUT)
             except:
-                print "* ERROR: Upload failed"
-                sys.exit(1)  # Better to fail than to return empty handed.
-                #return {
-                #    "file": None,
-                #    "report": None,
-                #    "summary": None,
-                #    "zip": None
-                #}
-        end = datetime.now()
-        duration = end - start
-        start = end
-        print "* copied to dx local in %.2f seconds" % duration.seconds
-
-        subprocess.check_call(shlex.split('ls -l %s' %(dx_file_name)))
-
-        # Make sure folder exists before copying!
-        project = dxpy.DXProject(proj_id)  ## should be default
-
-        dx_file = dxpy.upload_local_file(dx_file_name, project=proj_id, folder=dx_folder, properties={ "accession": file_acc })
-        end = datetime.now()
-        duration = end - start
-        print "* Uploaded to dx project in %.2f seconds" % duration.seconds
+                try:
+                    print "* s3 cp failed.  Reverting to ranged download"
+                    web_url = "https://www.encodeproject.org/files/%s/@@download/%s" % (file_acc,enc_file_name)
+                    # Parallel ranged requests, resumed if the file is partly there
+                    download.download(web_url, dx_file_name, md5sum=md5sum)
+                except:
+                    print "* ERROR: Upload failed"
+                    sys.exit(1)  # Better to fail than to return empty handed.
+                    #return {
+                    #    "file": None,
+                    #    "report": None,
+                    #    "summary": None,
+                    #    "zip": None
+                    #}
+            end = datetime.now()
+            duration = end - start
+            start = end
+            print "* copied to dx local in %.2f seconds" % duration.seconds
+
+            subprocess.check_call(shlex.split('ls -l %s' %(dx_file_name)))
+
+            # Make sure folder exists before copying!
+            project = dxpy.DXProject(proj_id)  ## should be default
+
+            dx_file = dxpy.upload_local_file(dx_file_name, project=proj_id, folder=dx_folder, properties={ "accession": file_acc })
+            end = datetime.now()
+            duration = end - start
+            print "* Uploaded to dx project in %.2f seconds" % duration.seconds
 
     else:
         dxpy.download_dxfile(test[0]['id'], dx_file_name)
@@ -93,7 +116,7 @@ def process(enc_file_name, bucket_url, proj_id, dx_folder, file_acc, dx_file_nam
         duration = end - start
         print "* Downloaded already existing file from in %.2f seconds" % duration.seconds
 
-    if skipvalidate or not (dx_file_name.endswith(".fastq.gz") or dx_file_name.endswith(".fq.gz")):
+    if skipvalidate or not fastq:
         return {
             "file": dx_file,
             "report": None,
@@ -126,7 +149,7 @@ def process(enc_file_name, bucket_url, proj_id, dx_folder, file_acc, dx_file_nam
     }
 
 @dxpy.entry_point("main")
-def main(exp_acc, files_to_fetch=None, skipvalidate=True, key='www', debug=False):
+def main(exp_acc, files_to_fetch=None, skipvalidate=True, key='www', debug=False, stream=True):
 
     # Splits the work into parallel tasks: one for each file to fetch.
 
@@ -145,7 +168,7 @@ def main(exp_acc, files_to_fetch=None, skipvalidate=True, key='www', debug=False
         file_objs = json.loads(files_to_fetch.encode('ascii')) # Expect [ {},{},{},... ]
         logger.debug(file_objs)
 
-    # f_obj = { "accession": ,"dx_folder": ,"dx_file_name": ,"enc_file_name": ,"bucket_url": }
+    # f_obj = { "accession": ,"dx_folder": ,"dx_file_name": ,"enc_file_name": ,"bucket_url": [,"md5sum": ][,"file_format": ,"file_size": ] }
 
     subjobs = []
     if file_objs:
@@ -166,9 +189,14 @@ def main(exp_acc, files_to_fetch=None, skipvalidate=True, key='www', debug=False
                 "dx_folder": f_obj["dx_folder"],
                 "file_acc": f_obj["accession"],
                 "dx_file_name": f_obj["dx_file_name"],
-                "skipvalidate": skipvalidate_this
+                "skipvalidate": skipvalidate_this,
+                "stream": stream
             }
-            subjobs.append(dxpy.new_dxjob(subjob_input, "process"))
+            if f_obj.get("md5sum"):
+                subjob_input["md5sum"] = f_obj["md5sum"]
+            # Without a file_size the subjob runs on the default instance type
+            instance_type = SIZING.instance_type(f_obj.get("file_format"), f_obj.get("file_size"))
+            subjobs.append(dxpy.new_dxjob(subjob_input, "process", instance_type=instance_type))
             #subjobs.append(dxpy.new_dxjob(subjob_input, "noop"))
 
     # This does not wait for subjob completion as I thought.
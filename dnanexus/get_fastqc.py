@@ -5,6 +5,7 @@ import argparse
 import re
 import json
 from dxencode import dxencode as dxencode
+from dcc import cache, encoded
 
 PROJECT_DEFAULT = 'long-rna-seq-pipeline'
 RESULT_FOLDER_DEFAULT = '/runs'
@@ -43,8 +44,24 @@ def get_args():
                     default=RESULT_FOLDER_DEFAULT,
                     required=False)
 
+    ap.add_argument('--cache-ttl',
+                    help="Seconds to reuse cached ENCODE objects before checking for changes (default: %d)" % cache.DEFAULT_TTL,
+                    type=int,
+                    default=cache.DEFAULT_TTL,
+                    required=False)
+
+    ap.add_argument('--no-cache',
+                    help="Do not cache ENCODE objects in '%s'" % cache.DEFAULT_CACHE_PATH,
+                    action='store_true',
+                    required=False)
+
     return ap
 
+def setup_cache(args):
+    '''Caches ENCODE objects between runs unless --no-cache was given.'''
+    if not args.no_cache:
+        encoded.set_cache(cache.ResponseCache(ttl=args.cache_ttl))
+
 def get_fastqc(accession, project):
     summary_fn = accession+"_summary.txt"
     report_fn = accession+"_data.txt"
@@ -92,16 +109,18 @@ def get_analysis_time(accession, repstr, project):
     #print start, finish, finish-start, (finish-start)/1000.0
     return (finish-start)/1000.0 # covert to secs.
 
-def get_exp_time(accession, project, skip=False):
+def get_exp_time(accession, project, skip=False, exp=None):
 
-        expr = dxencode.encoded_get(SERVER+accession, AUTHID=AUTHID, AUTHPW=AUTHPW)
-        try:
-            expr.raise_for_status()
-        except:
-            print "ERROR: Could not find %s in db" % accession
-            return
+        # exp may be passed in when it was already found by a search
+        if exp is None:
+            expr = encoded.encoded_get(SERVER+accession, AUTHID=AUTHID, AUTHPW=AUTHPW)
+            try:
+                expr.raise_for_status()
+            except:
+                print "ERROR: Could not find %s in db" % accession
+                return
 
-        exp = expr.json()
+            exp = expr.json()
 
         if skip:
             return exp
@@ -137,11 +156,12 @@ def get_exp_time(accession, project, skip=False):
 def main():
     argparser = get_args()
     args = argparser.parse_args()
+    setup_cache(args)
 
     project = dxencode.get_project(args.project)
 
     if args.file:
-        getr = dxencode.encoded_get(SERVER+args.file, AUTHID=AUTHID, AUTHPW=AUTHPW)
+        getr = encoded.encoded_get(SERVER+args.file, AUTHID=AUTHID, AUTHPW=AUTHPW)
         try:
             getr.raise_for_status()
         except:
@@ -156,7 +176,7 @@ def main():
         assay = args.assay or "OBI:0001271"
         query = '/search/?type=experiment&assay_term_id=%s&award.rfa=ENCODE3&limit=all&frame=embedded&replicates.library.biosample.donor.organism.name=mouse&files.file_format=fastq' % assay
 
-        res = dxencode.encoded_get(SERVER+query, AUTHID=AUTHID, AUTHPW=AUTHPW)
+        res = encoded.encoded_get(SERVER+query, AUTHID=AUTHID, AUTHPW=AUTHPW)
         exps = res.json()['@graph']
 
         for exp in exps:
@@ -172,7 +192,8 @@ def main():
                         print "Skipping %s as single-cell (%s %s)" % (acc, exp['replicates'][0]['library'].get('nucleic_acid_starting_quantity_units', ""), ncells)
                         #print json.dumps(exp['replicates'][0]['library'], sort_keys=True, indent=4, separators=(',',': '))
                         continue
-            get_exp_time(acc, project)
+            # The search results are already embedded experiments
+            get_exp_time(acc, project, exp=exp)
 
 
 if __name__ == '__main__':
@@ -13,18 +13,33 @@
 # DNAnexus Python Bindings (dxpy) documentation:
 #   http://autodoc.dnanexus.com/bindings/python/current/
 
-import os, subprocess, shlex, time
+import os, subprocess, shlex, time, multiprocessing
+from multiprocessing.pool import ThreadPool
 import dxpy
-import requests
 import json
-import re
+
+from dcc import bedvalidate, binpack, budget, encoded, metadata, prevalidate, reports, resultcache, sizing
 
 HEADERS = {'content-type': 'application/json'}
 SERVER = 'https://www.encodeproject.org/'
 S3_SERVER='s3://encode-files/'
+METADATA_THREADS = 8
+# Validate bed-family text files in Python on every core, not validateFiles.
+# Off until dcc.bedvalidate has been checked against validateFiles on real
+# submissions, since its result decides what is posted
+NATIVE_BED_VALIDATION = False
+# Results of earlier validations, by file MD5 and validator arguments
+VALIDATION_CACHE_FOLDER = '/validation_cache'
+# Small files are validated together, up to JOB_BYTES and JOB_FILES a job,
+# BATCH_THREADS at a time; bigger ones get a job each
+JOB_BYTES = binpack.DEFAULT_JOB_BYTES
+JOB_FILES = binpack.DEFAULT_JOB_FILES
+BATCH_THREADS = multiprocessing.cpu_count()
 
 root_dir = os.environ.get('DX_FS_ROOT') or ""
 DATA = root_dir+"/opt/data/"
+# Instance types for subjobs by file format and size
+SIZING = sizing.load(DATA+"sizing.json")
 
 auth = {}
 try:
@@ -63,8 +78,17 @@ validate_map = {
     'CEL': None,
 }
 
+def flatten(outputs):
+    flat = []
+    for output in outputs:
+        if isinstance(output, list):
+            flat.extend(output)
+        else:
+            flat.append(output)
+    return flat
+
 @dxpy.entry_point("postprocess")
-def postprocess(report, valid):
+def postprocess(report, valid, records=None, indexes=None):
     # Change the following to process whatever input this stage
     # receives.  You may also want to copy and paste the logic to download
     # and upload files here as well if this stage receives file input
@@ -72,20 +96,84 @@ def postprocess(report, valid):
 
     #for output in reports:
     #   pass
+    # process_batch jobs return lists, one entry per file
+    report = flatten(report)
+    valid = flatten(valid)
+    records = flatten(records or [])
+    if indexes:
+        # Back in the order of the input files, which batching changed
+        indexes = flatten(indexes)
+        order = sorted(range(len(indexes)), key=lambda i: indexes[i])
+        report = [report[i] for i in order]
+        valid = [valid[i] for i in order]
+        records = [records[i] for i in order]
+    # One summary of every file's errors, as JSON and as a table
+    summary = reports.summarize(records)
+    print "Validated %d files: %s" % (summary["files"], summary["statuses"])
+    reports.write_json("validation_summary.json", summary)
+    reports.write_tsv("validation_summary.tsv", summary)
     return {
         "report": report,
-        "validation": valid
+        "validation": valid,
+        "summary": dxpy.upload_local_file("validation_summary.json"),
+        "summary_table": dxpy.upload_local_file("validation_summary.tsv")
     }
 
 @dxpy.entry_point("process")
-def process(file_obj, file_meta):
+def process(file_obj, file_meta, index=None, stop_early=False, threads=None):
     # Change the following to process whatever input this stage
     # receives.  You may also want to copy and paste the logic to download
     # and upload files here as well if this stage receives file input
     # and/or makes file output.
 
+    output = validate_file(file_obj, file_meta,
+                           processes=threads or bedvalidate.DEFAULT_PROCESSES,
+                           stop_early=stop_early)
+    output["index"] = index
+    return output
+
+@dxpy.entry_point("process_batch")
+def process_batch(files, threads=None):
+    # files is a list of {"file_obj": ..., "file_meta": ..., "index": ...,
+    # "stop_early": ...}, validated threads (by default BATCH_THREADS) at a
+    # time in this one job. The threads already use every core, so
+    # bedvalidate runs in each without a pool
+    pool = ThreadPool(min(threads or BATCH_THREADS, len(files)))
+    try:
+        results = pool.map(lambda f: validate_file(f["file_obj"], f["file_meta"],
+                                                   processes=1,
+                                                   stop_early=f.get("stop_early", False)),
+                           files)
+    finally:
+        pool.terminate()
+    return {
+        "report": [result["report"] for result in results],
+        "validation": [result["validation"] for result in results],
+        "record": [result["record"] for result in results],
+        "index": [f.get("index") for f in files]
+    }
+
+def new_subjob(fn_input, fn_name, job_sizing):
+    """Launches fn_name on the instance type of job_sizing, telling it how
+    many threads to use, or on the applet's default if job_sizing is None."""
+    if job_sizing is None:
+        return dxpy.new_dxjob(fn_input, fn_name)
+    print "%s on %s: %d threads, %.1f GB of disk needed" % (
+        fn_name, job_sizing.instance_type, job_sizing.threads,
+        job_sizing.disk / float(sizing.GB))
+    return dxpy.new_dxjob(dict(fn_input, threads=job_sizing.threads), fn_name,
+                          instance_type=job_sizing.instance_type)
+
+def validate_file(file_obj, file_meta, processes=bedvalidate.DEFAULT_PROCESSES,
+                  stop_early=False):
     print file_obj
     print file_meta
+    # Stop, with an "Aborted ..." result, at an error in the first lines;
+    # otherwise only where validateFiles stops itself
+    if stop_early:
+        error_budget = budget.DEFAULT_BUDGET
+    else:
+        error_budget = budget.ErrorBudget()
     filename = dxpy.describe(file_obj)['name']
     basename = filename.rstrip('.gz')
     dx_file = dxpy.download_dxfile(file_obj, filename)
@@ -94,37 +182,70 @@ def process(file_obj, file_meta):
     validate_args = validate_map.get(file_meta['file_format'])
     assembly = file_meta.get('assembly')
     if assembly:
-        chromInfo = ['-chromInfo=%s/%s/chrom.sizes' % (encValData, assembly)]
+        chrom_sizes = '%s/%s/chrom.sizes' % (encValData, assembly)
     else:
-        chromInfo = ['-chromInfo=%s/hg19/chrom.sizes' % encValData]
+        chrom_sizes = '%s/hg19/chrom.sizes' % encValData
+    chromInfo = ['-chromInfo=%s' % chrom_sizes]
 
     print subprocess.check_output(['ls','-l'])
     valid = "Not validated yet"
+    start = time.time()
     if validate_args is not None:
-        print("Validating file.")
-        validation_command = ['validateFiles'] + ['-verbose=2'] + validate_args + chromInfo + ['-doReport'] + [filename]
-        try:
-            print " ".join(validation_command)
-            valid = subprocess.check_output(validation_command)
-        except subprocess.CalledProcessError as e:
-            pass
-            #valid = "Process Error"
-            print(e.output)
-            #raise
+        # Skipped altogether if this file was validated the same way before
+        cache = resultcache.ValidationCache(resultcache.DXStore(
+            resultcache.DxpyClient(dxpy.PROJECT_CONTEXT_ID), VALIDATION_CACHE_FOLDER))
+        if NATIVE_BED_VALIDATION and bedvalidate.supports(validate_args):
+            validation_command = ['bedvalidate'] + validate_args + chromInfo
+        else:
+            validation_command = ['validateFiles'] + ['-verbose=2'] + validate_args + chromInfo + ['-doReport']
+
+        def run():
+            if validation_command[0] == 'bedvalidate':
+                print "Validating with bedvalidate."
+                return bedvalidate.validate_file(filename, validate_args, chrom_sizes,
+                                                 processes=processes,
+                                                 max_errors=error_budget.max_errors or
+                                                 bedvalidate.DEFAULT_MAX_ERRORS)
+            # Files whose first lines are already wrong fail without
+            # validateFiles, labelled so the result is not cached as its own
+            errors = prevalidate.check(filename, validate_args, chrom_sizes)
+            if errors:
+                print "Pre-validation failed"
+                return prevalidate.failed_result(filename, errors)
+            print("Validating file.")
+            try:
+                print " ".join(validation_command + [filename])
+                return budget.check_output(validation_command + [filename], error_budget,
+                                           "%s.report" % filename)
+            except subprocess.CalledProcessError as e:
+                #valid = "Process Error"
+                print(e.output)
+                #raise
+                return valid
+
+        valid = cache.validate(file_meta['md5sum'], validation_command, filename, run)
+
+    seconds = time.time() - start
 
     print valid
     print subprocess.check_output(['ls','-l'])
+    report_text = None
+    if os.path.exists("%s.report" % filename):
+        with open("%s.report" % filename) as f:
+            report_text = f.read()
+    record = reports.parse(filename, valid, report_text,
+                           os.path.getsize(filename), seconds)
     print "Upload result"
     report_dxfile = dxpy.upload_local_file("%s.report" % filename)
     print report_dxfile
-    ## is_valid == 'Error count 0'
     return {
         "report": report_dxfile,
-        "validation": valid
+        "validation": valid,
+        "record": record
     }
 
 @dxpy.entry_point("main")
-def main(files):
+def main(files, stop_early=False):
 
     # The following line(s) initialize your data object inputs on the platform
     # into dxpy.DXDataObject instances that you can start using immediately.
@@ -141,25 +262,53 @@ def main(files):
     # following generates 10 subjobs running with the same dummy
     # input.
 
+    # Files are described concurrently and their ENCODE metadata is found
+    # with batched searches; each big file's subjob is launched as soon as
+    # its metadata (and that of the files before it) has arrived, and the
+    # small files are then packed into as few jobs as fit JOB_BYTES each
+    session = encoded.new_session(auth['AUTHID'], auth['AUTHPW'],
+                                  pool_size=METADATA_THREADS)
+    sizes = {}
+    def describe(file_obj):
+        desc = dxpy.describe(file_obj)
+        sizes[desc['id']] = desc['size']
+        return desc
+
     subjobs = []
-    for file_obj in files:
+    small_files = []
+    for index, (file_obj, filename, file_meta) in enumerate(metadata.fetch_file_metadata(
+            files, describe, session, SERVER, threads=METADATA_THREADS)):
 
-        filename = dxpy.describe(file_obj)['name']
-        encff = re.compile('ENCFF[0-9]{3}[A-Z]{3}')
-        try:
-            file_acc = encff.match(filename).group()
-        except:
+        if metadata.file_accession(filename) is None:
             print "Filename %s is not an ENCODE file" % filename
             exit(0)
-
-        file_meta = requests.get(SERVER+'/'+file_acc+'/?frame=embedded', \
-            auth=(auth['AUTHID'],auth['AUTHPW']), headers=HEADERS).json()
+        if file_meta is None:
+            print "Could not get ENCODE metadata for %s" % filename
+            exit(1)
 
         subjob_input = {
             "file_obj": file_obj,
-            "file_meta": file_meta
+            "file_meta": file_meta,
+            "index": index,
+            "stop_early": stop_early
         }
-        subjobs.append(dxpy.new_dxjob(subjob_input, "process"))
+        size = sizes[dxpy.DXFile(file_obj).get_id()]
+        if size >= JOB_BYTES:
+            subjobs.append(new_subjob(subjob_input, "process",
+                                      SIZING.choose(file_meta['file_format'], size)))
+        else:
+            small_files.append((size, subjob_input))
+
+    for batch in binpack.first_fit_decreasing(small_files, JOB_BYTES, JOB_FILES):
+        print "Validating %d files in one job" % len(batch)
+        # Sized for all its files, by the rules of every format in it
+        batch_size = sum(sizes[dxpy.DXFile(f["file_obj"]).get_id()] for f in batch)
+        job_sizing = SIZING.choose_batch([f["file_meta"]['file_format'] for f in batch],
+                                         batch_size)
+        if len(batch) == 1:
+            subjobs.append(new_subjob(batch[0], "process", job_sizing))
+        else:
+            subjobs.append(new_subjob({"files": batch}, "process_batch", job_sizing))
 
     # The following line creates the job that will perform the
     # "postprocess" step of your app.  We've given it an input field
@@ -183,7 +332,9 @@ def main(files):
 
     postprocess_job = dxpy.new_dxjob(fn_input={
                                     "report": [subjob.get_output_ref("report") for subjob in subjobs],
-                                    "valid": [subjob.get_output_ref("validation") for subjob in subjobs]
+                                    "valid": [subjob.get_output_ref("validation") for subjob in subjobs],
+                                    "records": [subjob.get_output_ref("record") for subjob in subjobs],
+                                    "indexes": [subjob.get_output_ref("index") for subjob in subjobs]
                                     },
                                      fn_name="postprocess",
                                      depends_on=subjobs)
@@ -207,11 +358,14 @@ def main(files):
     validate_reports.append(postprocess_job.get_output_ref("report"))
     validations.append(postprocess_job.get_output_ref("validation"))
     output = {}
+    print "ENCODE requests: %s" % encoded.metrics
     print validate_reports
     print validations
 #    output["FastQC_reports"] = [ dxpy.dxlink(item)  for item in FastQC_reports]
     output["validate_reports"] = validate_reports
     output["validate_errors"] = validations
+    output["validation_summary"] = postprocess_job.get_output_ref("summary")
+    output["validation_summary_table"] = postprocess_job.get_output_ref("summary_table")
 
     return output
 
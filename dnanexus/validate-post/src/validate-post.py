@@ -13,7 +13,7 @@
 # DNAnexus Python Bindings (dxpy) documentation:
 #   http://autodoc.dnanexus.com/bindings/python/current/
 
-import sys, os, subprocess, json, requests, shlex, urlparse, logging
+import sys, os, subprocess, json, requests, shlex, urlparse, logging, multiprocessing
 from datetime import datetime
 import dxpy
 
@@ -25,8 +25,17 @@ print subprocess.check_output(['ls','dxencode','-l']) # should contain keypairs
 from dxencode import dx as dx
 from dxencode import encd as encd
 
+from dcc import bedvalidate, budget, prevalidate, reports, resultcache, scan
+
 logger = logging.getLogger("Applet")
 
+# Validate bed-family text files in Python on every core, not validateFiles.
+# Off until dcc.bedvalidate has been checked against validateFiles on real
+# submissions, since its result decides what is posted
+NATIVE_BED_VALIDATION = False
+# Results of earlier validations, by file MD5 and validator arguments
+VALIDATION_CACHE_FOLDER = '/validation_cache'
+
 '''
         {
             "dataset": "ENCSR000ACY",
@@ -69,37 +78,62 @@ validate_map = {
     'CEL': None,
 }
 
-def validate(filename, file_meta):
+def validate(filename, file_meta, error_budget=None):
     # Change the following to process whatever input this stage
     # receives.  You may also want to copy and paste the logic to download
     # and upload files here as well if this stage receives file input
     # and/or makes file output.
 
     logger.debug(file_meta)
+    if error_budget is None:
+        error_budget = budget.ErrorBudget()
 
     logger.debug("Run Validate Files on %s" % filename)
     validate_args = validate_map.get(file_meta['file_format'])
     assembly = file_meta.get('assembly')
 
     if file_meta['file_format'] == 'bam' and file_meta.get('output_type','') == 'transcriptome alignments':
-        chromInfo = ['-chromInfo=%s/%s/%s/chrom.sizes' % (encValData, assembly, file_meta['genome_annotation'])]
+        chrom_sizes = '%s/%s/%s/chrom.sizes' % (encValData, assembly, file_meta['genome_annotation'])
     elif assembly:
-        chromInfo = ['-chromInfo=%s/%s/chrom.sizes' % (encValData, assembly)]
+        chrom_sizes = '%s/%s/chrom.sizes' % (encValData, assembly)
     else:
         # not sure this is a sensible default
-        chromInfo = ['-chromInfo=%s/hg19/chrom.sizes' % encValData]
+        chrom_sizes = '%s/hg19/chrom.sizes' % encValData
+    chromInfo = ['-chromInfo=%s' % chrom_sizes]
 
     print subprocess.check_output(['ls','-l'])
     valid = "Not validated yet"
     if validate_args is not None:
-        logger.debug(("Validating file."))
-        validation_command = ['validateFiles'] + validate_args + chromInfo + ['-doReport'] + [filename]
-        try:
-            logger.debug( " ".join(validation_command) )
-            valid = subprocess.check_output(validation_command)
-        except subprocess.CalledProcessError as e:
-            pass
-            logger.debug((e.output))
+        # Skipped altogether if this file was validated the same way before
+        cache = resultcache.ValidationCache(resultcache.DXStore(
+            resultcache.DxpyClient(dxpy.PROJECT_CONTEXT_ID), VALIDATION_CACHE_FOLDER))
+        if NATIVE_BED_VALIDATION and bedvalidate.supports(validate_args):
+            validation_command = ['bedvalidate'] + validate_args + chromInfo
+        else:
+            validation_command = ['validateFiles'] + validate_args + chromInfo + ['-doReport']
+
+        def run():
+            if validation_command[0] == 'bedvalidate':
+                logger.debug("Validating with bedvalidate.")
+                return bedvalidate.validate_file(filename, validate_args, chrom_sizes,
+                                                 max_errors=error_budget.max_errors or
+                                                 bedvalidate.DEFAULT_MAX_ERRORS)
+            # Files whose first lines are already wrong fail without
+            # validateFiles, labelled so the result is not cached as its own
+            errors = prevalidate.check(filename, validate_args, chrom_sizes)
+            if errors:
+                logger.info("* Pre-validation failed: %s" % errors[0])
+                return prevalidate.failed_result(filename, errors)
+            logger.debug(("Validating file."))
+            try:
+                logger.debug( " ".join(validation_command + [filename]) )
+                return budget.check_output(validation_command + [filename], error_budget,
+                                           "%s.report" % filename)
+            except subprocess.CalledProcessError as e:
+                logger.debug((e.output))
+                return valid
+
+        valid = cache.validate(file_meta['md5sum'], validation_command, filename, run)
 
     else:
         return {
@@ -107,6 +141,11 @@ def validate(filename, file_meta):
         }
 
     logger.debug(valid)
+    if os.path.exists("%s.report" % filename):
+        with open("%s.report" % filename) as f:
+            record = reports.parse(filename, valid, f.read())
+        for error_class, count in sorted(record["error_classes"].items()):
+            logger.info("* %d error(s): %s" % (count, error_class))
     print subprocess.check_output(['ls','-l'])
     logger.debug("Upload result")
     report_dxfile = dxpy.upload_local_file("%s.report" % filename)
@@ -118,7 +157,7 @@ def validate(filename, file_meta):
     }
 
 @dxpy.entry_point("main")
-def main(pipe_file, file_meta, key=None, debug=False, skipvalidate=True):
+def main(pipe_file, file_meta, key=None, debug=False, skipvalidate=True, stop_early=False):
 
     # The following line(s) initialize your data object inputs on the platform
     # into dxpy.DXDataObject instances that you can start using immediately.
@@ -154,14 +193,27 @@ def main(pipe_file, file_meta, key=None, debug=False, skipvalidate=True):
     duration = end - start
     logger.info("* Download in %.2f seconds" % duration.seconds)
 
-    if filename.endswith('.bed') or filename.endswith('.gff'):
-        subprocess.check_call(['gzip',filename])
-        filename = filename + '.gz'
+    # One read to compress (if needed), checksum, test gzip and count lines
+    start = datetime.now()
+    try:
+        if filename.endswith('.bed') or filename.endswith('.gff'):
+            # Compressed in blocks on every core, as a multi-member gzip
+            scanned = scan.scan(filename, compress_to=filename + '.gz', threads=multiprocessing.cpu_count())
+            os.remove(filename)
+            filename = filename + '.gz'
+        else:
+            scanned = scan.scan(filename)
+    except scan.ScanError as e:
+        logger.info("* File invalid: %s" % e)
+        return { 'validation': str(e), 'accession': "NOT POSTED" }
+    end = datetime.now()
+    duration = end - start
+    logger.info("* Scanned %d lines in %.2f seconds" % (scanned['lines'], duration.seconds))
 
     # gathering metadata
     file_meta['submitted_file_name'] = "%s/%s" % (folder, filename)
-    file_meta['md5sum'] = dx.calc_md5(filename).hexdigest()
-    file_meta['file_size'] = os.path.getsize(filename)
+    file_meta['md5sum'] = scanned['md5sum']
+    file_meta['file_size'] = scanned['file_size']
     if "aliases" not in file_meta:
         file_meta["aliases"] = []
     file_meta["aliases"].append("dnanexus:"+fid)
@@ -171,14 +223,20 @@ def main(pipe_file, file_meta, key=None, debug=False, skipvalidate=True):
     if not skipvalidate:
         logger.info("* Validating: %s (%s)" % (filename, folder))
         start = datetime.now()
-        v = validate(filename, file_meta)
+        # Stop, with an "Aborted ..." result, at an error in the first
+        # lines; otherwise only where validateFiles stops itself
+        if stop_early:
+            error_budget = budget.DEFAULT_BUDGET
+        else:
+            error_budget = budget.ErrorBudget()
+        v = validate(filename, file_meta, error_budget)
         end = datetime.now()
         duration = end - start
         logger.info("* Validated in %.2f seconds" % duration.seconds)
     else:
         v = { 'validation': 'Not Run' }
 
-    if v['validation'] == "Error count 0\n" or v['validation'].find('Not Run') == 0:   ## yes with CR
+    if reports.is_valid(v['validation']) or v['validation'].find('Not Run') == 0:
     
         logger.info("* Posting file and metadata to ENCODEd...")
         f_obj = encd.post_file(filename, file_meta, SERVER, AUTHID, AUTHPW)